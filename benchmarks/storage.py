@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Compare the storage backends on a synthetic list.
+
+Usage: python benchmarks/storage.py [entries]
+
+For every backend (see malpy3.storage), the list is written once, then
+read back, queried, searched by title and merged, reporting the time
+taken, the peak memory allocated while reading (tracemalloc) and the size
+on disk.
+"""
+
+# stdlib
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# self-package
+from malpy3 import storage  # noqa: E402
+from malpy3.query import Query  # noqa: E402
+
+STATUSES = ["watching", "completed", "on_hold", "dropped", "plan_to_watch"]
+QUERY = "score>=8 and status=completed and tag:isekai"
+FIND = "^title 9.* ga$"
+
+
+def synthetic_list(n, seed=0):
+    """A list of `n` entries shaped like MyAnimeList.list results."""
+    rng = random.Random(seed)
+    entries = dict()
+    for i in range(1, n + 1):
+        total = rng.choice([12, 13, 24, 26, 0])
+        entries[i] = {
+            "id": i,
+            "title": "Title {} {}".format(i, rng.choice(["no", "wa", "ga"])),
+            "total_episodes": total,
+            "episode": rng.randint(0, total),
+            "status": rng.choice(STATUSES),
+            "media_type": rng.choice(["tv", "movie", "ova"]),
+            "score": rng.randint(0, 10),
+            "is_rewatching": False,
+            "updated_at": "2020-05-0{}T10:00:00+00:00".format(i % 9 + 1),
+            "alternative_titles": ["Alt {}".format(i)],
+            "start_date": "20{:02d}-04-01".format(i % 20),
+            "end_date": "NA",
+            "tags": rng.choice([[], ["isekai"], ["isekai", "comedy"]]),
+        }
+    return entries
+
+
+def timed(func, repeat=5):
+    """Best time of `repeat` calls, in milliseconds, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def peak_memory(func):
+    """Peak memory allocated by a call, in KiB."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main(n=10000):
+    entries = synthetic_list(n)
+    query = Query(QUERY)
+    name = "lists/anime"
+    print("{} entries, query: {}, find: {}".format(n, QUERY, FIND))
+    print(
+        "{:<10} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10} {:>9}".format(
+            "backend",
+            "write ms",
+            "read ms",
+            "query ms",
+            "find ms",
+            "merge ms",
+            "read KiB",
+            "disk KiB",
+        )
+    )
+    with tempfile.TemporaryDirectory() as root:
+        for backend_name, cls in storage.BACKENDS.items():
+            backend = cls(Path(root))
+            write, _ = timed(lambda: backend.write(name, entries), repeat=1)
+            read, result = timed(lambda: backend.read(name))
+            assert len(result) == n
+            query_time, _ = timed(lambda: backend.query(name, query))
+            find, _ = timed(lambda: backend.find(name, FIND))
+            merge, _ = timed(
+                lambda: backend.merge(name, {1: {"score": 1}}), repeat=1
+            )
+            memory = peak_memory(lambda: backend.read(name))
+            path = backend.path(name)
+            # count the SQLite write-ahead log too
+            size = (
+                sum(
+                    os.path.getsize(str(p))
+                    for p in path.parent.glob(path.name + "*")
+                    if not p.name.endswith(".lock")
+                )
+                / 1024
+            )
+            print(
+                "{:<10} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} "
+                "{:>10.0f} {:>9.0f}".format(
+                    backend_name,
+                    write,
+                    read,
+                    query_time,
+                    find,
+                    merge,
+                    memory,
+                    size,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
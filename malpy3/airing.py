@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Airing schedule of the shows being watched.
+
+The start date, ``broadcast`` slot and episode count of every watched show
+are kept in a small schedule file. Only shows still airing get their
+details refreshed (once a day), so ``mal airing`` can tell which shows have
+new episodes for the whole list in one pass, usually without any request.
+"""
+
+# stdlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+# self-package
+from malpy3 import setup
+from malpy3 import details
+from malpy3.utils import atomic_write, file_lock
+
+SCHEDULE_PATH = setup.DATA_PATH / "airing.json"
+# airing shows are refreshed after this many seconds
+REFRESH = 24 * 60 * 60
+# MAL broadcast times are in Japan time
+JST = timezone(timedelta(hours=9))
+DAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def load(path=SCHEDULE_PATH):
+    """
+    Read the schedule.
+
+    Returns:
+        Dictionary of id -> schedule entry.
+    """
+    try:
+        with path.open() as f:
+            return {int(k): v for k, v in json.load(f).items()}
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def _schedule_entry(data):
+    return {
+        "title": data.get("title"),
+        "status": data.get("status"),
+        "start_date": data.get("start_date"),
+        "num_episodes": data.get("num_episodes") or 0,
+        "broadcast": data.get("broadcast") or {},
+        "refreshed": time.time(),
+    }
+
+
+def refresh(mal, ids, path=SCHEDULE_PATH):
+    """
+    Make sure the schedule of the given shows is up to date.
+
+    Shows missing from the schedule or still airing and not refreshed
+    for a day have their details fetched (concurrently). Finished shows
+    are never fetched again.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        ids: ids of the shows of interest.
+
+    Returns:
+        Dictionary of id -> schedule entry.
+    """
+    schedule = load(path)
+    now = time.time()
+    stale = [
+        _id
+        for _id in ids
+        if _id not in schedule
+        or (
+            schedule[_id]["status"] != "finished_airing"
+            and now - schedule[_id]["refreshed"] > REFRESH
+        )
+    ]
+    if stale:
+        found = details.fetch(mal, stale, "anime", ttl=REFRESH)
+        with file_lock(path):
+            schedule = load(path)
+            for _id, data in found.items():
+                schedule[_id] = _schedule_entry(data)
+            atomic_write(path, json.dumps(schedule))
+    return schedule
+
+
+def first_broadcast(entry):
+    """
+    Date and time the first episode aired.
+
+    Returns:
+        Aware datetime or None if unknown.
+    """
+    try:
+        start = datetime.strptime(entry["start_date"], "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    hour, minute = 0, 0
+    start_time = entry["broadcast"].get("start_time")
+    if start_time:
+        hour, minute = (int(x) for x in start_time.split(":"))
+    day = entry["broadcast"].get("day_of_the_week")
+    if day in DAYS:
+        # the first episode airs on the broadcast weekday on/after start
+        start += timedelta(days=(DAYS.index(day) - start.weekday()) % 7)
+    return start.replace(hour=hour, minute=minute, tzinfo=JST)
+
+
+def aired(entry, now=None):
+    """
+    Number of episodes aired so far and date of the next one.
+
+    Parameters:
+        entry: schedule entry.
+        now: aware datetime (default: current time).
+
+    Returns:
+        (episodes aired, next episode datetime or None).
+    """
+    total = entry["num_episodes"]
+    if entry["status"] == "finished_airing":
+        return total, None
+
+    first = first_broadcast(entry)
+    if first is None:
+        return 0, None
+    now = now or datetime.now(JST)
+    if now < first:
+        return 0, first
+
+    weeks = (now - first) // timedelta(weeks=1)
+    episodes = weeks + 1
+    if total:
+        episodes = min(episodes, total)
+    next_episode = None
+    if not total or episodes < total:
+        next_episode = first + timedelta(weeks=weeks + 1)
+    return episodes, next_episode
+
+
+def available(entries, schedule, now=None):
+    """
+    Compare what aired with what was watched for every entry.
+
+    Parameters:
+        entries: iterable of parsed anime fields (the watching list).
+        schedule: Dictionary returned by refresh.
+        now: aware datetime (default: current time).
+
+    Returns:
+        List of dicts with id, title, watched, aired, total, new and next,
+        shows with new episodes first.
+    """
+    now = now or datetime.now(JST)
+    result = []
+    for entry in entries:
+        scheduled = schedule.get(entry["id"])
+        if scheduled is None:
+            continue
+        episodes, next_episode = aired(scheduled, now)
+        watched = entry.get("episode") or 0
+        result.append(
+            {
+                "id": entry["id"],
+                "title": entry["title"],
+                "watched": watched,
+                "aired": episodes,
+                "total": scheduled["num_episodes"],
+                "new": max(episodes - watched, 0),
+                "next": next_episode,
+            }
+        )
+    result.sort(key=lambda r: (-r["new"], r["next"] or now))
+    return result
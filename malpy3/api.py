@@ -3,19 +3,43 @@
 #
 
 # stdlib
-import re
 from xml.etree import cElementTree as ET
 from datetime import datetime
 
 # 3rd party
 import requests
-from decorating import animated
 
 # self-package
 from malpy3.utils import checked_connection, checked_regex, checked_cancer
+from malpy3.fuzzy import match as fuzzy_match
+from malpy3 import catalogue
+from malpy3.progress import activity
+from malpy3.transfer import ACCEPT_ENCODING, TransferStats
+from malpy3 import journal
 from malpy3 import setup
+from malpy3 import snapshot
 
-config = setup.get_config()
+# most entries MAL returns for a single list request
+LIST_PAGE_SIZE = 1000
+# results per search request when paging through results
+SEARCH_PAGE_SIZE = 50
+# most search results ever fetched, whatever the limit
+SEARCH_CAP = 500
+
+
+class SearchError(Exception):
+    """A search request failed, args: the HTTP status code."""
+
+
+class Reply(object):
+    """Minimal stand-in for requests.Response built from local data."""
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
 
 
 class MyAnimeList(object):
@@ -24,42 +48,82 @@ class MyAnimeList(object):
     base_url = "https://api.myanimelist.net/v2"
     mal_client_id = "6114d00ca681b7701d1e15fe11a4987e"
     user_agent = "NineAnimator/2 CFNetwork/976 Darwin/18.2.0"
+    # True when working from the local list copy (see malpy3.offline)
+    offline = False
 
     def __init__(
         self,
         access_token,
         refresh_token,
-        date_format=config["config"]["date_format"],
+        date_format=None,
     ):
         self.access_token = access_token
         self.refresh_token = refresh_token
-        self.date_format = date_format
+        self.date_format = date_format or setup.date_format()
+        # keep-alive connections are reused between calls, and every
+        # request carries the same minimal headers
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {self.access_token}",
+                "Accept": "application/json",
+                "Accept-Encoding": ACCEPT_ENCODING,
+                "User-Agent": self.user_agent,
+                "X-MAL-Client-ID": self.mal_client_id,
+            }
+        )
+        self.transfer = TransferStats()
+        self.session.hooks["response"].append(self.transfer.record)
 
-    @checked_connection
-    @animated("validating login")
-    def validate_login(self):
+    def _request(self, method, path, **kwargs):
+        """
+        Send a request to the API.
+
+        Parameters:
+            method: HTTP method.
+            path: path of the endpoint, relative to base_url.
+            kwargs: passed to requests (params, data...).
+
+        Returns:
+            Response object.
+        """
+        return self.session.request(method, self.base_url + path, **kwargs)
+
+    @activity("validating login")
+    def _validate_login(self):
         """
         Verify successful login to myanimelist profile.
 
+        Raises ConnectionError if MAL can't be reached.
+
         Returns:
             Response status code.
 
         """
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/x-www-form-urlencoded",
-        }
-        r = requests.get(self.base_url + "/users/@me", headers=headers)
+        r = self._request("GET", "/users/@me")
 
         return r.status_code
 
+    @checked_connection
+    def validate_login(self):
+        """
+        Verify successful login to myanimelist profile.
+
+        Returns:
+            Response status code.
+
+        """
+        return self._validate_login()
+
     @classmethod
-    def login(cls, config):
+    def login(cls, config, fallback=False):
         """
         Create an instante of MyAnimeList and log it in.
 
         Parameters:
             config: Dictionary  with configuration options.
+            fallback: raise ConnectionError when MAL can't be reached,
+                so the caller can work offline, instead of exiting.
 
         Return:
             MyAnimeList instance.
@@ -70,8 +134,9 @@ class MyAnimeList(object):
 
         mal = cls(access_token, refresh_token, date_format)
 
+        validate = mal._validate_login if fallback else mal.validate_login
         # 401 = unauthorized
-        if mal.validate_login() == 401:
+        if validate() == 401:
             return None
 
         return mal
@@ -100,7 +165,7 @@ class MyAnimeList(object):
 
     @checked_cancer
     @checked_connection
-    @animated("searching in database")
+    @activity("searching in database")
     def search(self, query, limit=20, category="anime"):
         """
         Search myanimelist database for anime/manga.
@@ -114,6 +179,7 @@ class MyAnimeList(object):
             Response object.
         """
         fields = [
+            "alternative_titles",
             "anime_statistics",
             "end_date",
             "genres",
@@ -126,95 +192,152 @@ class MyAnimeList(object):
             "synopsis",
             "title",
         ]
-        headers = {
-            "Authorization": f"Bearer: {self.access_token}",
-            "Accept": "application/json",
-            "User-Agent": f"{self.user_agent}",
-            "X-MAL-Client-ID": "6114d00ca681b7701d1e15fe11a4987e",
-        }
 
         payload = dict(q=query, limit=limit, fields=",".join(fields))
 
-        if category == "anime":
-            search_url = self.base_url + "/anime"
-        elif category == "manga":
-            search_url = self.base_url + "/manga"
-
-        r = requests.get(
-            search_url,
-            params=payload,
-            headers=headers,
-        )
+        r = self._request("GET", f"/{category}", params=payload)
 
         if r.status_code == 204:
             return []
 
+        if r.status_code == 200:
+            catalogue.add(
+                (e.get("node") for e in r.json().get("data", [])), category
+            )
+        return r
+
+    def search_pages(
+        self, query, limit=20, category="anime", page_size=SEARCH_PAGE_SIZE
+    ):
+        """
+        Search myanimelist database page by page, following paging.next.
+
+        Pages are only requested as the generator is consumed, see
+        malpy3.pool.prefetch to get the next one in the background.
+
+        Parameters:
+            query: regex pattern to search.
+            limit: Number of returned results (at most SEARCH_CAP).
+            category: Category to search in: Anime or Manga
+            page_size: Number of results per request.
+
+        Yields:
+            Lists of results (nodes of the response).
+
+        Raises:
+            SearchError when MAL answers a page with an error.
+        """
+        limit = min(int(limit), SEARCH_CAP)
+        r = self.search(query, limit=min(limit, page_size), category=category)
+        found = 0
+        # [] when nothing was found (204), None past the API
+        while r is not None and not isinstance(r, list):
+            if r.status_code != 200:
+                raise SearchError(r.status_code)
+            data = r.json()
+            nodes = [e["node"] for e in data.get("data", [])]
+            nodes = nodes[: limit - found]
+            if not nodes:
+                return
+            found += len(nodes)
+            yield nodes
+
+            next_url = (data.get("paging") or {}).get("next")
+            if found >= limit or not next_url:
+                return
+            r = self._search_next(next_url, category)
+
+    @checked_cancer
+    @checked_connection
+    def _search_next(self, url, category="anime"):
+        """
+        Request the next page of a search (see search_pages).
+
+        Returns:
+            Response object, None if the url isn't part of the API.
+        """
+        if not url.startswith(self.base_url):
+            return None
+        r = self._request("GET", url[len(self.base_url) :])
+        if r.status_code == 200:
+            catalogue.add(
+                (e.get("node") for e in r.json().get("data", [])), category
+            )
         return r
 
     @checked_cancer
     @checked_connection
-    @animated("preparing animes/manga")
+    @activity("preparing animes/manga")
     def list(self, status="", limit=100, extra=False, category="anime"):
         """
         Get Anime and Manga from myanimelist profile.
 
+        Lists longer than LIST_PAGE_SIZE are fetched page by page,
+        following paging.next. Fetching the whole list (no status and
+        no limit) replaces the local copy, removing the entries deleted
+        on MAL since.
+
         Parameters:
             status: status to filter results
-            limit: Number of returned results.
+            limit: Number of returned results (None for the whole list).
             extra: Extra anime/manga information.
             category: Category to search in: Anime or Manga.
 
         Returns:
             Dictionary of parsed anime/manga fields.
         """
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Accept": "application/json",
-            "User-Agent": self.user_agent,
-            "X-MAL-Client-ID": self.mal_client_id,
-        }
-
         anime_fields = [
+            "alternative_titles",
             "end_date",
             "media_type",
             "num_episodes",
             "start_date",
-            "my_list_status{score,num_episodes_watched,is_rewatching,status,tags}",
+            "my_list_status{score,num_episodes_watched,is_rewatching,status,tags,updated_at}",
         ]
         manga_fields = [
+            "alternative_titles",
             "authors",
             "end_date",
             "media_type",
             "num_chapters",
             "num_volumes",
             "start_date",
-            "my_list_status{score,num_chapters_read,is_rereading,num_volumes_read,status,tags}",
+            "my_list_status{score,num_chapters_read,is_rereading,num_volumes_read,status,tags,updated_at}",
         ]
 
         if category == "anime":
             ep_chap = "num_episodes_watched"
             fields = anime_fields
-            list_url = self.base_url + "/users/@me/animelist"
+            list_path = "/users/@me/animelist"
             total_ep_chap = "num_episodes"
             re_watch_read = "is_rewatching"
 
         elif category == "manga":
             ep_chap = "num_chapters_read"
             fields = manga_fields
-            list_url = self.base_url + "/users/@me/mangalist"
+            list_path = "/users/@me/mangalist"
             total_ep_chap = "num_chapters"
             re_watch_read = "is_rereading"
 
-        payload = dict(status=status, limit=limit, fields=",".join(fields))
+        page_size = LIST_PAGE_SIZE
+        if limit is not None:
+            page_size = min(int(limit), LIST_PAGE_SIZE)
+        payload = dict(status=status, limit=page_size, fields=",".join(fields))
 
-        r = requests.get(
-            list_url,
-            params=payload,
-            headers=headers,
-        )
+        r = self._request("GET", list_path, params=payload)
         result = dict()
-        raw_entry = r.json()["data"]
+        raw_entry = []
+        while True:
+            data = r.json()
+            raw_entry += data["data"]
+            next_url = (data.get("paging") or {}).get("next")
+            if limit is not None and len(raw_entry) >= int(limit):
+                raw_entry = raw_entry[: int(limit)]
+                break
+            if not next_url or not next_url.startswith(self.base_url):
+                next_url = None
+                break
+            r = self._request("GET", next_url[len(self.base_url) :])
 
         # anime information
         for entry in raw_entry:
@@ -234,6 +357,10 @@ class MyAnimeList(object):
                     "media_type": anime_node.get("media_type"),
                     "score": my_list_status.get("score"),
                     "is_rewatching": my_list_status.get(f"{re_watch_read}"),
+                    "updated_at": my_list_status.get("updated_at"),
+                    "alternative_titles": self._alt_titles(
+                        anime_node.get("alternative_titles")
+                    ),
                 }
 
                 # add extra info about anime if needed
@@ -243,12 +370,30 @@ class MyAnimeList(object):
                             anime_node.get("start_date")
                         ),
                         "end_date": self._fdate(anime_node.get("end_date")),
-                        "tags": anime_node.get("tags"),
+                        "tags": my_list_status.get("tags"),
                     }
                     result[entry_id].update(extra_info)
 
+        # keep a local copy for offline use
+        complete = not status and next_url is None
+        if snapshot.save(result, category, complete=complete):
+            catalogue.add_list(result, category)
+        journal.observe(result.values(), category)
         return result
 
+    @staticmethod
+    def _alt_titles(alternative_titles):
+        """Flatten the alternative_titles field into a list of titles."""
+        if not alternative_titles:
+            return []
+        titles = list(alternative_titles.get("synonyms") or [])
+        titles += [
+            alternative_titles.get(lang)
+            for lang in ("en", "ja")
+            if alternative_titles.get(lang)
+        ]
+        return titles
+
     def _fdate(self, date, api_format="%Y-%m-%d"):
         """
         Format date based on the user config format
@@ -265,9 +410,15 @@ class MyAnimeList(object):
         return datetime.strptime(date, api_format).strftime(self.date_format)
 
     @checked_regex
-    @animated("matching animes/manga")
+    @activity("matching animes/manga")
     def find(
-        self, regex, status="", limit=None, extra=False, category="anime"
+        self,
+        regex,
+        status="",
+        limit=None,
+        extra=False,
+        category="anime",
+        fuzzy=False,
     ):
         """
         Get anime/manga from user's profile.
@@ -278,24 +429,23 @@ class MyAnimeList(object):
             limit: Number of returned results.
             extra: Extra anime/manga information.
             category: Category to search in: Anime or Manga.
+            fuzzy: rank matches and fall back to the closest titles
+                when the regex matches nothing (see malpy3.fuzzy).
 
         Returns:
             List of parsed anime/manga fields.
         """
-        result = []
-        for value in self.list(
+        entries = self.list(
             status=status,
             limit=limit,
             extra=extra,
             category=category,
-        ).values():
-            if re.search(regex, value["title"], re.I):
-                result.append(value)
-        return result
+        ).values()
+        return fuzzy_match(regex, entries, fuzzy=fuzzy)
 
     @checked_cancer
     @checked_connection
-    @animated("updating")
+    @activity("updating")
     def update(self, item_id, entry=None):
         """
         Update anime/manga.
@@ -315,20 +465,12 @@ class MyAnimeList(object):
         else:
             root = "anime"
 
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Accept": "application/json",
-            "User-Agent": self.user_agent,
-            "X-MAL-Client-ID": self.mal_client_id,
-        }
-
         payload = entry
-        r = requests.patch(
-            self.base_url + f"/{root}/{item_id}/my_list_status",
-            data=payload,
-            headers=headers,
+        r = self._request(
+            "PATCH", f"/{root}/{item_id}/my_list_status", data=payload
         )
+        if r.status_code == 200:
+            journal.record_update(item_id, payload, root)
         return r.status_code
 
     @checked_connection
@@ -344,16 +486,73 @@ class MyAnimeList(object):
         ]
 
         payload = dict(fields=",".join(fields))
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/x-www-form-urlencoded",
-        }
 
-        r = requests.get(
-            self.base_url + "/users/@me", params=payload, headers=headers
+        r = self._request("GET", "/users/@me", params=payload)
+        return r
+
+    # fields asked for when browsing the catalogue
+    catalogue_fields = [
+        "alternative_titles",
+        "end_date",
+        "mean",
+        "media_type",
+        "num_chapters",
+        "num_episodes",
+        "start_date",
+        "status",
+    ]
+
+    @checked_connection
+    def season(self, year, season, limit=100, offset=0):
+        """
+        Get a page of the anime of a season.
+
+        Parameters:
+            year: year of the season.
+            season: winter, spring, summer or fall.
+            limit: Number of returned results (max 500).
+            offset: index of the first result.
+
+        Returns:
+            Response object.
+        """
+        fields = [f for f in self.catalogue_fields if f != "num_chapters"]
+        payload = dict(
+            limit=limit,
+            offset=offset,
+            sort="anime_num_list_users",
+            fields=",".join(fields),
+        )
+        r = self._request(
+            "GET", f"/anime/season/{year}/{season}", params=payload
         )
         return r
 
+    @checked_connection
+    def ranking(
+        self, ranking_type="all", limit=100, offset=0, category="anime"
+    ):
+        """
+        Get a page of the anime/manga ranking.
+
+        Parameters:
+            ranking_type: all, airing, upcoming, tv, movie, bypopularity...
+            limit: Number of returned results (max 500).
+            offset: index of the first result.
+            category: Category to rank: Anime or Manga.
+
+        Returns:
+            Response object.
+        """
+        payload = dict(
+            ranking_type=ranking_type,
+            limit=limit,
+            offset=offset,
+            fields=",".join(self.catalogue_fields),
+        )
+        r = self._request("GET", f"/{category}/ranking", params=payload)
+        return r
+
     @checked_connection
     def get_anime_details(self, _id, entry=None):
         """
@@ -399,22 +598,11 @@ class MyAnimeList(object):
             "title",
             "updated_at",
         ]
-        if entry.get("media_type") == "manga":
-            info_url = self.base_url + f"/manga/{_id}"
-        else:
-            info_url = self.base_url + f"/anime/{_id}"
+        category = "manga" if entry.get("media_type") == "manga" else "anime"
 
         payload = dict(fields=",".join(fields))
-        headers = {
-            "Authorization": f"Bearer: {self.access_token}",
-            "Accept": "application/json",
-            "User-Agent": self.user_agent,
-            "X-MAL-Client-ID": self.mal_client_id,
-        }
 
-        r = requests.get(
-            info_url,
-            params=payload,
-            headers=headers,
-        )
+        r = self._request("GET", f"/{category}/{_id}", params=payload)
+        if r.status_code == 200:
+            catalogue.add([r.json()], category)
         return r
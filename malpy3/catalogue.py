@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Local index of the MAL catalogue.
+
+Every anime/manga seen in a search, a details lookup or a list download is
+remembered (title, alternative titles, id, episodes/chapters, airing
+status and dates) in the storage backend (see :mod:`malpy3.storage`), so
+``mal search --local``, offline searches and ``mal add --regex`` can be
+answered without asking MAL.
+
+New entries are kept in memory and written in one merge when the command
+exits (or every ``FLUSH_EVERY`` entries), instead of rewriting the whole
+catalogue for every response of a crawl or a details lookup.
+"""
+
+# stdlib
+import atexit
+import threading
+
+# self-package
+from malpy3 import storage
+from malpy3.fuzzy import TrigramIndex, entry_titles, similarity
+
+# fields of an API node worth keeping
+FIELDS = [
+    "id",
+    "title",
+    "num_episodes",
+    "num_chapters",
+    "status",
+    "start_date",
+    "end_date",
+]
+# entries kept in memory before being written to the storage
+FLUSH_EVERY = 1000
+
+# category -> {id: entry} not written yet, see add and flush
+_buffer = dict()
+# category -> (entries, TrigramIndex of them), see _index
+_indexes = dict()
+_lock = threading.Lock()
+
+
+def _name(category):
+    return "catalogue/{}".format(category)
+
+
+def load(category="anime"):
+    """
+    Read the catalogue of a category.
+
+    Returns:
+        Dictionary of id -> catalogue entry.
+    """
+    with _lock:
+        entries = storage.backend().read(_name(category))
+        for entry_id, entry in _buffer.get(category, dict()).items():
+            merged = dict(entries.get(entry_id) or dict())
+            merged.update(entry)
+            entries[entry_id] = merged
+    return entries
+
+
+def flush(category=None):
+    """
+    Write the buffered entries to the storage.
+
+    Parameters:
+        category: Category to write: anime or manga (None for both).
+    """
+    with _lock:
+        for name in [category] if category else list(_buffer):
+            entries = _buffer.pop(name, None)
+            if entries:
+                storage.backend().merge(_name(name), entries)
+
+
+atexit.register(flush)
+
+
+def _entry(node):
+    """Keep the interesting fields of an API node."""
+    entry = {f: node[f] for f in FIELDS if node.get(f) is not None}
+    alternative_titles = node.get("alternative_titles")
+    if isinstance(alternative_titles, dict):
+        titles = list(alternative_titles.get("synonyms") or [])
+        titles += [
+            alternative_titles[lang]
+            for lang in ("en", "ja")
+            if alternative_titles.get(lang)
+        ]
+        entry["alternative_titles"] = titles
+    elif alternative_titles:
+        entry["alternative_titles"] = list(alternative_titles)
+    return entry
+
+
+def add(nodes, category="anime"):
+    """
+    Remember catalogue entries (written by flush).
+
+    Parameters:
+        nodes: iterable of API nodes (dicts with at least id and title).
+        category: Category of the entries: anime or manga.
+    """
+    entries = [_entry(node) for node in nodes if node and node.get("id")]
+    if not entries:
+        return
+
+    with _lock:
+        buffered = _buffer.setdefault(category, dict())
+        for entry in entries:
+            buffered.setdefault(int(entry["id"]), dict()).update(entry)
+        full = len(buffered) >= FLUSH_EVERY
+    if full:
+        flush(category)
+
+
+def add_list(entries, category="anime"):
+    """
+    Remember the entries of a downloaded user list.
+
+    Parameters:
+        entries: Dictionary of id -> parsed anime/manga fields.
+        category: Category of the entries: anime or manga.
+    """
+    total = "num_chapters" if category == "manga" else "num_episodes"
+    add(
+        (
+            {
+                "id": entry["id"],
+                "title": entry["title"],
+                total: entry.get("total_episodes"),
+                "alternative_titles": entry.get("alternative_titles"),
+            }
+            for entry in entries.values()
+        ),
+        category,
+    )
+
+
+def _index(entries, category="anime"):
+    """Trigram index of the catalogue, only rebuilt when it changed."""
+    with _lock:
+        cached = _indexes.get(category)
+    if cached is None or cached[0] != entries:
+        cached = (entries, TrigramIndex(entries))
+        with _lock:
+            _indexes[category] = cached
+    return cached[1]
+
+
+def search(query, category="anime", limit=20):
+    """
+    Search the local catalogue.
+
+    Titles starting with the query come first, followed by titles
+    containing it and finally by fuzzy matches.
+
+    Parameters:
+        query: text to look for.
+        category: Category to search in: anime or manga.
+        limit: Number of returned results.
+
+    Returns:
+        List of catalogue entries, best first.
+    """
+    limit = int(limit)
+    entries = list(load(category).values())
+    query = query.lower().strip()
+    if not query:
+        return []
+
+    def rank(entry):
+        titles = [t.lower() for t in entry_titles(entry)]
+        if any(t.startswith(query) for t in titles):
+            return 0
+        if any(query in t for t in titles):
+            return 1
+        return None
+
+    direct = [(rank(e), e) for e in entries]
+    direct = [
+        (r, -similarity(query, e), e) for r, e in direct if r is not None
+    ]
+    direct.sort(key=lambda r: r[:2])
+    result = [e for _, _, e in direct]
+
+    if len(result) < limit:
+        seen = {e["id"] for e in result}
+        result += [
+            e
+            for _, e in _index(entries, category).search(query)
+            if e["id"] not in seen
+        ]
+    return result[:limit]
@@ -4,24 +4,67 @@
 
 # stdlib
 import sys
+import atexit
 import signal
 import argparse
 
+# 3rd party
+from requests.exceptions import ConnectionError
+
 # self-package
 import malpy3
 from malpy3.api import MyAnimeList
+from malpy3.offline import OfflineMyAnimeList
 from malpy3.utils import killed
 from malpy3 import color
 from malpy3 import login
 from malpy3 import commands
+from malpy3 import daemon
+from malpy3 import core
+from malpy3 import pending
+from malpy3 import progress
 from malpy3 import setup
 
-import decorating
-
 # catch if the user presses Ctrl+c and exit a special message
 signal.signal(signal.SIGINT, lambda x, y: killed())
 
 
+def add_bulk_arguments(parser, action):
+    """Add the options selecting many entries to drop/edit."""
+    parser.add_argument(
+        "--all",
+        "-a",
+        action="store_true",
+        help="{} every match instead of selecting one".format(action),
+    )
+    parser.add_argument(
+        "--from-status",
+        metavar="status",
+        choices=[
+            "watching",
+            "reading",
+            "completed",
+            "on hold",
+            "dropped",
+            "plan to watch",
+            "plan to read",
+        ],
+        help="with --all, only entries with this status: [%(choices)s]",
+    )
+    parser.add_argument(
+        "--older-than",
+        metavar="days",
+        type=int,
+        help="with --all, only entries not updated for this many days",
+    )
+    parser.add_argument(
+        "--yes",
+        "-y",
+        action="store_true",
+        help="with --all, don't ask for confirmation",
+    )
+
+
 def create_parser():
     parser = argparse.ArgumentParser(
         prog="mal", description="MyAnimeList command line client."
@@ -32,6 +75,16 @@ def create_parser():
         action="store_true",
         help="show the version of malpy3",
     )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="work from the local copy of the list, queueing changes",
+    )
+    parser.add_argument(
+        "--transfer-stats",
+        action="store_true",
+        help="print the bytes received per API endpoint when done",
+    )
     subparsers = parser.add_subparsers(
         dest="command",
         help="commands",
@@ -49,15 +102,22 @@ def create_parser():
         "-c",
         default="anime",
         metavar="category",
-        choices=["anime", "manga"],
+        choices=["anime", "manga", "all"],
         help="Category to search: [%(choices)s]",
     )
+    parser_search.add_argument(
+        "--also",
+        action="append",
+        metavar="query",
+        help="search this variant of the title too (e.g. in English), "
+        "can be repeated",
+    )
     parser_search.add_argument(
         "-l",
         "--limit",
         default=30,
         metavar="limit",
-        help="limit number of results (default: %(default)s).",
+        help="limit number of results (default: %(default)s, at most 500).",
     )
     parser_search.add_argument(
         "--extend",
@@ -65,6 +125,17 @@ def create_parser():
         action="store_true",  # defaults to false
         help="display extra information about anime/manga",
     )
+    parser_search.add_argument(
+        "--local",
+        action="store_true",
+        help="only search titles seen before, without contacting MAL",
+    )
+    parser_search.add_argument(
+        "--pager",
+        "-p",
+        action="store_true",
+        help="show the output through $PAGER",
+    )
     parser_search.set_defaults(func=commands.search)
 
     # Parser for "list" command
@@ -107,7 +178,27 @@ def create_parser():
         "--extend",
         "-e",
         action="store_true",  # defaults to False
-        help="display extra info [start/finish dates, tags]",
+        help="display extra info [start/finish dates, tags, genres, "
+        "mean score, studios, airing status]",
+    )
+    parser_list.add_argument(
+        "--pager",
+        "-p",
+        action="store_true",
+        help="show the output through $PAGER",
+    )
+    parser_list.add_argument(
+        "--where",
+        "-w",
+        metavar="expression",
+        help="filter expression, e.g. "
+        "'score>=8 and status=completed and tag:isekai'",
+    )
+    parser_list.add_argument(
+        "--sort",
+        "-s",
+        metavar="field",
+        help="sort by this field, --sort=-field for descending order",
     )
     parser_list.set_defaults(func=commands.list)
     # Parser for "filter" command
@@ -142,6 +233,25 @@ def create_parser():
         action="store_true",
         help="display all available information on anime/manga",
     )
+    parser_filter.add_argument(
+        "--pager",
+        "-p",
+        action="store_true",
+        help="show the output through $PAGER",
+    )
+    parser_filter.add_argument(
+        "--where",
+        "-w",
+        metavar="expression",
+        help="filter expression, e.g. "
+        "'score>=8 and status=completed and tag:isekai'",
+    )
+    parser_filter.add_argument(
+        "--sort",
+        "-s",
+        metavar="field",
+        help="sort by this field, --sort=-field for descending order",
+    )
     parser_filter.set_defaults(func=commands.filter)
 
     # Parser for "increase" command
@@ -223,14 +333,91 @@ def create_parser():
         choices=["anime", "manga"],
         help="Category to decrease episodes/chapters: [%(choices)s]",
     )
+    add_bulk_arguments(parser_drop, "drop")
     parser_drop.set_defaults(func=commands.drop)
 
     # Parser for "stats" command
     parser_stats = subparsers.add_parser(
-        "stats", help="Show user's anime watch stats"
+        "stats", help="Show user's anime/manga stats"
+    )
+    parser_stats.add_argument(
+        "--cat",
+        "-c",
+        default="anime",
+        metavar="category",
+        choices=["anime", "manga", "all"],
+        help="Category to show: [%(choices)s] (default: %(default)s)",
+    )
+    parser_stats.add_argument(
+        "--local",
+        action="store_true",
+        help="compute detailed stats from the local copy of the list",
+    )
+    parser_stats.add_argument(
+        "--sync",
+        action="store_true",
+        help="with --local, download the list first",
+    )
+    parser_stats.add_argument(
+        "--as-of",
+        metavar="date",
+        help="stats of the list as it was at a date, from its history",
     )
     parser_stats.set_defaults(func=commands.stats)
 
+    # Parser for "history" command
+    parser_history = subparsers.add_parser(
+        "history", help="show the recorded changes of list entries"
+    )
+    parser_history.add_argument(
+        "regex",
+        nargs="?",
+        default=".+",
+        help="regex pattern to match anime/manga titles",
+    )
+    parser_history.add_argument(
+        "--cat",
+        "-c",
+        default="anime",
+        metavar="category",
+        choices=["anime", "manga"],
+        help="Category to show: [%(choices)s] (default: %(default)s)",
+    )
+    parser_history.add_argument(
+        "--compact",
+        action="store_true",
+        help="merge the old changes of an entry made the same day",
+    )
+    parser_history.add_argument(
+        "--keep-days",
+        type=int,
+        default=90,
+        metavar="days",
+        help="with --compact, changes kept as they are (default: %(default)s)",
+    )
+    parser_history.set_defaults(func=commands.history)
+
+    # Parser for "watchtime" command
+    parser_watchtime = subparsers.add_parser(
+        "watchtime", help="show the time spent watching/reading"
+    )
+    parser_watchtime.add_argument(
+        "--cat",
+        "-c",
+        default="anime",
+        metavar="category",
+        choices=["anime", "manga"],
+        help="Category to show: [%(choices)s] (default: %(default)s)",
+    )
+    parser_watchtime.add_argument(
+        "--weeks",
+        type=int,
+        default=8,
+        metavar="weeks",
+        help="number of weeks to show (default: %(default)s)",
+    )
+    parser_watchtime.set_defaults(func=commands.watchtime)
+
     # Parser for "add" command
     parser_add = subparsers.add_parser(
         "add", help="add an anime/manga to the list"
@@ -277,7 +464,17 @@ def create_parser():
     # Parser for "edit" command
     parser_edit = subparsers.add_parser("edit", help="edit anime/manga")
     parser_edit.add_argument(
-        "regex", help="regex pattern to match anime titles"
+        "regex",
+        nargs="?",
+        default=".+",
+        help="regex pattern to match anime titles",
+    )
+    parser_edit.add_argument(
+        "--many",
+        "-m",
+        metavar="expression",
+        help="edit every entry matching this filter expression "
+        "(see filter --where) in a single editor session",
     )
     parser_edit.add_argument(
         "--score",
@@ -321,8 +518,131 @@ def create_parser():
         metavar="tag",
         help="add these tags to the current ones",
     )
+    add_bulk_arguments(parser_edit, "edit")
     parser_edit.set_defaults(func=commands.edit)
 
+    # Parser for "flush" command
+    parser_flush = subparsers.add_parser(
+        "flush", help="send the updates queued by write_behind"
+    )
+    parser_flush.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=4,
+        metavar="workers",
+        help="number of concurrent requests (default: %(default)s)",
+    )
+    parser_flush.add_argument(
+        "--force",
+        "-f",
+        action="store_true",
+        help="overwrite entries changed on MAL since they were queued",
+    )
+    parser_flush.set_defaults(func=commands.flush)
+
+    # Parser for "recommend" command
+    parser_recommend = subparsers.add_parser(
+        "recommend", help="recommend titles based on your list"
+    )
+    parser_recommend.add_argument(
+        "--cat",
+        "-c",
+        default="anime",
+        metavar="category",
+        choices=["anime", "manga"],
+        help="Category to recommend: [%(choices)s]",
+    )
+    parser_recommend.add_argument(
+        "-l",
+        "--limit",
+        default=20,
+        metavar="limit",
+        help="number of recommendations (default: %(default)s).",
+    )
+    parser_recommend.add_argument(
+        "--sync",
+        action="store_true",
+        help="download the list first instead of using the local copy",
+    )
+    parser_recommend.set_defaults(func=commands.recommend)
+
+    # Parser for "airing" command
+    parser_airing = subparsers.add_parser(
+        "airing", help="show watched anime with new episodes"
+    )
+    parser_airing.add_argument(
+        "--sync",
+        action="store_true",
+        help="download the list first instead of using the local copy",
+    )
+    parser_airing.set_defaults(func=commands.airing)
+
+    # Parser for "crawl" command
+    parser_crawl = subparsers.add_parser(
+        "crawl", help="download a season or a ranking of the catalogue"
+    )
+    crawl_kinds = parser_crawl.add_subparsers(
+        dest="kind", help="what to crawl"
+    )
+    crawl_kinds.required = True
+    parser_crawl_season = crawl_kinds.add_parser(
+        "season", help="anime of a season"
+    )
+    parser_crawl_season.add_argument("year", type=int, help="season year")
+    parser_crawl_season.add_argument(
+        "season",
+        choices=["winter", "spring", "summer", "fall"],
+        help="season: [%(choices)s]",
+    )
+    parser_crawl_ranking = crawl_kinds.add_parser(
+        "ranking", help="anime/manga ranking"
+    )
+    parser_crawl_ranking.add_argument(
+        "ranking_type",
+        nargs="?",
+        default="all",
+        metavar="type",
+        help="ranking type, e.g. all, airing, bypopularity "
+        "(default: %(default)s)",
+    )
+    parser_crawl_ranking.add_argument(
+        "--cat",
+        "-c",
+        default="anime",
+        metavar="category",
+        choices=["anime", "manga"],
+        help="Category to crawl: [%(choices)s]",
+    )
+    for crawl_kind in (parser_crawl_season, parser_crawl_ranking):
+        crawl_kind.add_argument(
+            "--pages",
+            type=int,
+            metavar="pages",
+            help="stop after this many new pages (resume later)",
+        )
+        crawl_kind.add_argument(
+            "--no-details",
+            dest="details",
+            action="store_false",
+            help="don't fetch the details of every entry",
+        )
+    parser_crawl.set_defaults(func=commands.crawl)
+
+    # Parser for "daemon" command
+    parser_daemon = subparsers.add_parser(
+        "daemon", help="keep a logged in session and list in background"
+    )
+    parser_daemon.add_argument(
+        "action",
+        nargs="?",
+        default="run",
+        choices=["run", "stop", "status"],
+        help="run in foreground, stop or check the daemon "
+        "(default: %(default)s)",
+    )
+    parser_daemon.set_defaults(func=commands.daemon)
+
     return parser
 
 
@@ -350,16 +670,54 @@ def main():
         login.create_credentials()
         sys.exit(0)
 
+    if args.command == "daemon" and args.action != "run":
+        commands.daemon(None, args)
+        sys.exit(0)
+
+    # a running daemon already holds a valid session and the list
+    if (
+        args.command in daemon.COMMANDS
+        and not args.offline
+        and not args.transfer_stats
+    ):
+        client = daemon.connect()
+        if client is not None:
+            args.func(client, args)
+            sys.exit(0)
+
     # Check if authorized
     config = login.get_credentials()
     if not config["config"]["animation"]:
-        decorating.animated.enabled = False
+        progress.reporter.enabled = False
+
+    mal_api = None
+    if not args.offline:
+        try:
+            mal_api = MyAnimeList.login(config, fallback=True)
+        except ConnectionError:
+            message = "MAL can't be reached, working offline"
+            print(color.colorize(message, "yellow"), file=sys.stderr)
+            args.offline = True
+
+        if not args.offline and not mal_api:
+            print(color.colorize("Invalid credentials! :(", "red", "bold"))
+            print(
+                color.colorize(
+                    'Tip: Try "mal login" again :D', "white", "bold"
+                )
+            )
+            sys.exit(1)
+
+    if args.offline:
+        mal_api = OfflineMyAnimeList.login(config)
+    elif (
+        args.command != "flush" and pending.untried() and not pending.enabled()
+    ):
+        # replay what was journaled while offline, once
+        core.flush(mal_api)
 
-    mal_api = MyAnimeList.login(config)
-    if not mal_api:
-        print(color.colorize("Invalid credentials! :(", "red", "bold"))
-        print(color.colorize('Tip: Try "mal login" again :D', "white", "bold"))
-        sys.exit(1)
+    if args.transfer_stats and hasattr(mal_api, "transfer"):
+        atexit.register(mal_api.transfer.report)
 
     # Execute sub command
     args.func(mal_api, args)
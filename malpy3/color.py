@@ -6,20 +6,25 @@
 from decorating.color import colorize
 
 
-def score_color(score):
-    """Choose color of output based on how high the score is."""
+def score_color(score, paint=colorize):
+    """Choose color of output based on how high the score is.
+
+    Parameters:
+        score: entry score.
+        paint: function used to colorize (e.g. Renderer.paint).
+    """
     if score == 10:
-        return colorize(score, "green", "bold")
+        return paint(score, "green", "bold")
     if score >= 9:
-        return colorize(score, "cyan", "bold")
+        return paint(score, "cyan", "bold")
     elif score >= 7:
-        return colorize(score, "blue", "bold")
+        return paint(score, "blue", "bold")
     elif score >= 5:
-        return colorize(score, "yellow", "bold")
+        return paint(score, "yellow", "bold")
     elif score >= 1:
-        return colorize(score, "red", "bold")
+        return paint(score, "red", "bold")
     else:
-        return colorize("-", "pink", "bold")
+        return paint("-", "pink", "bold")
 
 
 def procedure_color(increment):
@@ -11,6 +11,7 @@ import sys
 
 # self-package
 from malpy3 import core
+from malpy3 import daemon as _daemon
 from malpy3 import login as _login
 from malpy3 import setup
 
@@ -23,6 +24,9 @@ def search(mal, args):
         extra=args.extend,
         limit=args.limit,
         category=args.cat,
+        pager=args.pager,
+        local=args.local,
+        variants=args.also or (),
     )
 
 
@@ -34,6 +38,9 @@ def filter(mal, args):
         limit=args.limit,
         extra=args.extend,
         category=args.cat,
+        pager=args.pager,
+        where=args.where,
+        sort=args.sort,
     )
 
 
@@ -67,17 +74,59 @@ def list(mal, args):
         limit=args.limit,
         extra=args.extend,
         category=args.cat,
+        pager=args.pager,
+        where=args.where,
+        sort=args.sort,
     )
 
 
 def drop(mal, args):
     """Drop a anime from lists based in a regex expression"""
-    core.drop(mal, args.regex, category=args.cat)
+    if args.all:
+        core.bulk_drop(
+            mal,
+            args.regex,
+            category=args.cat,
+            status=_status(args.from_status),
+            older_than=args.older_than,
+            yes=args.yes,
+        )
+    else:
+        core.drop(mal, args.regex, category=args.cat)
+
+
+def _status(status):
+    """Status as given on the command line to its API name."""
+    return status.replace(" ", "_") if status else status
 
 
 def stats(mal, args):
-    """Show the user's anime watching statistics as presented on MAL."""
-    core.stats(mal)
+    """Show the user's statistics, as presented on MAL or computed locally.
+
+    Manga statistics are always computed from the local manga list."""
+    if args.as_of:
+        categories = ["anime", "manga"] if args.cat == "all" else [args.cat]
+        for category in categories:
+            core.stats_as_of(mal, args.as_of, category=category)
+    elif args.cat == "all":
+        core.combined_stats(mal, local=args.local, sync=args.sync)
+    elif args.cat == "manga" or args.local or mal.offline:
+        core.local_stats(mal, category=args.cat, sync=args.sync)
+    else:
+        core.stats(mal)
+
+
+def history(mal, args):
+    """Show the recorded changes of entries, or compact the history."""
+    if args.compact:
+        core.compact_history(category=args.cat, keep_days=args.keep_days)
+    else:
+        core.history(args.regex.lower(), category=args.cat)
+
+
+def watchtime(mal, args):
+    """Show the time spent watching/reading, from the history."""
+    core.watch_time(mal, category=args.cat, weeks=args.weeks)
 
 
 def add(mal, args):
@@ -97,11 +146,65 @@ def edit(mal, args):
     for field in ["score", "status", "tags", "add_tags"]:
         attr = getattr(args, field)
         if attr is not None:
-            changes[field] = attr.replace(" ", "_")
+            changes[field] = attr
+
+    if "status" in changes:
+        changes["status"] = _status(changes["status"])
+
+    if args.many is not None:
+        core.edit_many(mal, args.regex.lower(), args.many, category=args.cat)
+    elif args.all:
+        core.bulk_edit(
+            mal,
+            args.regex.lower(),
+            changes,
+            category=args.cat,
+            status=_status(args.from_status),
+            older_than=args.older_than,
+            yes=args.yes,
+        )
+    else:
+        core.edit(mal, args.regex.lower(), changes, category=args.cat)
+
+
+def flush(mal, args):
+    """Send the updates waiting in the write-behind queue."""
+    core.flush(mal, workers=args.workers, force=args.force)
+
+
+def recommend(mal, args):
+    """Recommend titles that are not in the list yet."""
+    core.recommend(mal, category=args.cat, limit=args.limit, sync=args.sync)
+
+
+def airing(mal, args):
+    """Show which watched anime have episodes not watched yet."""
+    core.airing(mal, sync=args.sync)
+
+
+def crawl(mal, args):
+    """Download a season or ranking, resuming an interrupted crawl."""
+    core.crawl(
+        mal,
+        args.kind,
+        year=getattr(args, "year", None),
+        season=getattr(args, "season", None),
+        ranking_type=getattr(args, "ranking_type", "all"),
+        category=getattr(args, "cat", "anime"),
+        pages=args.pages,
+        hydrate=args.details,
+    )
 
-    # turn list of tags into a single string if needed
-    for field in ["tags", "add_tags"]:
-        if field in changes.keys():
-            changes[field] = " ".join(changes[field])
 
-    core.edit(mal, args.regex.lower(), changes, category=args.cat)
+def daemon(mal, args):
+    """Run, stop or query the background daemon."""
+    if args.action == "run":
+        _daemon.serve(mal)
+    elif args.action == "stop":
+        client = _daemon.connect()
+        if client is None:
+            print("daemon is not running")
+            sys.exit(1)
+        client.stop()
+    else:
+        _daemon.status()
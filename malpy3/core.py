@@ -3,26 +3,45 @@
 #
 
 # stdlib
-import os
 import sys
 import math
 import html
-import tempfile
 import textwrap
-import subprocess
+from itertools import chain
 from operator import itemgetter
-from datetime import date
+from datetime import date, datetime, timedelta
 
 # self-package
-from malpy3.api import MyAnimeList
+from malpy3.api import MyAnimeList, SearchError
 from malpy3.utils import print_error
+from malpy3.pool import bounded_map, prefetch
+from malpy3.render import Renderer, use_pager
+from malpy3 import airing as _airing
+from malpy3 import catalogue
+from malpy3 import crawl as _crawl
 from malpy3 import color
+from malpy3 import details
+from malpy3 import edits
+from malpy3 import fuzzy
+from malpy3 import journal
+from malpy3 import pending
+from malpy3 import query
+from malpy3 import recommend as _recommend
+from malpy3 import snapshot
+from malpy3 import stats as _stats
+from malpy3 import watchtime as _watchtime
+
+_wrapper = textwrap.TextWrapper(
+    width=70, initial_indent="    ", subsequent_indent="    "
+)
 
 
 def wrap_text(text, width=70):
-    return "\n".join(
-        [textwrap.indent(p, "    ") for p in textwrap.wrap(text, width)]
-    )
+    if width != _wrapper.width:
+        return "\n".join(
+            [textwrap.indent(p, "    ") for p in textwrap.wrap(text, width)]
+        )
+    return _wrapper.fill(text or "")
 
 
 def report_if_fails(response):
@@ -30,10 +49,132 @@ def report_if_fails(response):
         print(color.colorize("Failed with HTTP: {}".format(response), "red"))
 
 
+def find_items(mal, regex, category="anime", **kwargs):
+    """
+    Like MyAnimeList.find, with the queued updates applied.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        regex: regex string to filter anime/manga titles.
+        category: Category to search in: anime or manga.
+        kwargs: passed to MyAnimeList.find.
+
+    Returns:
+        List of parsed anime/manga fields.
+    """
+    items = mal.find(regex, category=category, **kwargs)
+    return pending.overlay(items, category)
+
+
+def filter_items(mal, regex, compiled, status="", category="anime"):
+    """
+    Select the entries matching a regex and a filter expression.
+
+    Offline, the filter is run by the storage (as SQL with the sqlite
+    backend) unless it needs details or updates are queued for the list.
+    Otherwise the whole list is fetched and filtered here.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        regex: regex string to filter anime/manga titles.
+        compiled: malpy3.query.Query instance.
+        status: status to filter results.
+        category: Category to search in: anime or manga.
+
+    Returns:
+        List of parsed anime/manga fields (with the extra ones).
+    """
+    queued = {q["category"] for q in pending.load().values()}
+    if mal.offline and not compiled.needs_details and category not in queued:
+        items = mal.query(regex, compiled, category=category)
+        return [i for i in items if not status or i.get("status") == status]
+
+    items = find_items(
+        mal, regex, status=status, limit=None, extra=True, category=category
+    )
+    if compiled.needs_details:
+        details.hydrate(mal, items, category)
+    return compiled.filter(items)
+
+
+def send_update(mal, item_id, entry, delta=0, base=None, version=None):
+    """
+    Send an update, or queue it when write-behind is enabled or offline.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        item_id: id of anime/manga.
+        entry: dict object to patch/update (with media_type).
+        delta: episodes/chapters increment (for coalescing).
+        base: episodes/chapters before the increment.
+        version: updated_at of the entry the change is based on.
+
+    Returns:
+        Response status code (200 when queued).
+    """
+    if mal.offline or pending.enabled():
+        pending.enqueue(
+            item_id, entry, delta=delta, base=base, version=version
+        )
+        return 200
+    return mal.update(item_id, entry)
+
+
+def flush(mal, workers=4, force=False):
+    """
+    Send the queued updates and report how it went.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        workers: maximum number of concurrent requests.
+        force: overwrite entries changed on MAL since they were queued.
+
+    Returns:
+        None
+    """
+    if mal.offline:
+        print(color.colorize("Can't flush while offline", "red"))
+        return
+
+    results = pending.flush(mal, workers=workers, force=force)
+    if not results:
+        print(color.colorize("Nothing to flush", "cyan"))
+        return
+
+    failed = 0
+    for queued, status_code, error in results:
+        if error is None and status_code == 200:
+            continue
+        failed += 1
+        reason = error if error is not None else "HTTP {}".format(status_code)
+        print(
+            color.colorize(
+                "Failed {category} {id}: {reason}".format(
+                    reason=reason, **queued
+                ),
+                "red",
+            )
+        )
+    if any(isinstance(r[2], pending.Conflict) for r in results):
+        print(
+            color.colorize('Tip: "mal flush --force" overwrites them', "white")
+        )
+    print(
+        "Flushed {} of {} updates".format(
+            color.colorize(str(len(results) - failed), "green"),
+            len(results),
+        )
+    )
+
+
 def select_item(items):
     """
     Select a single item from a list of results.
 
+    Ranked results (see MyAnimeList.find with fuzzy) are shown best first
+    and the first one is taken without asking when it clearly wins. A
+    single approximate match is only taken once confirmed.
+
     Parameters:
         items: List of dictionary items.
 
@@ -42,7 +183,14 @@ def select_item(items):
 
     """
     item = None
-    if len(items) > 1:  # ambigious search results
+    if fuzzy.dominant(items):  # ranked results with a clear winner
+        item = items[0]
+        if item["match_score"] < 1:
+            print(
+                color.colorize("Best match:", "cyan"),
+                color.colorize(item["title"], "yellow"),
+            )
+    elif len(items) > 1:  # ambigious search results
         print(color.colorize("Multiple results:", "cyan"))
         # show user the results and make them choose one
         for index, title in enumerate(map(itemgetter("title"), items)):
@@ -51,6 +199,13 @@ def select_item(items):
         item = items[index]
     elif len(items) == 1:
         item = items[0]
+        if item.get("match_score", 1) < 1:
+            print(
+                color.colorize("Best match:", "cyan"),
+                color.colorize(item["title"], "yellow"),
+            )
+            if not confirm("Is this the one?"):
+                sys.exit(1)
     else:
         print(color.colorize("No matches in list ᕙ(⇀‸↼‶)ᕗ", "red"))
         sys.exit(1)
@@ -58,7 +213,7 @@ def select_item(items):
     return item
 
 
-def start_end(entry, episode, total_episodes):
+def start_end(entry, episode, total_episodes, score=0):
     """
     Fill details of anime if user just started it or finished it.
 
@@ -66,6 +221,7 @@ def start_end(entry, episode, total_episodes):
         entry: anime dictionary
         episode: anime episodes watched / manga chapters read.
         total_episodes: total anime episodes / manga chapters.
+        score: current score, only sent if the user changes it.
 
     Returns:
         Dictionary
@@ -79,7 +235,7 @@ def start_end(entry, episode, total_episodes):
         # set/change score
         user_score = input(
             "Enter new score (leave blank to keep score at {}): ".format(
-                entry.get("score", 0)
+                score or 0
             )
         ).strip()
         if user_score:  # do nothing if blank answer
@@ -122,22 +278,13 @@ def progress_update(mal, regex, inc=1, category="anime"):
     Returns:
         Dictionary object with updated values.
     """
-    items = remove_completed(mal.find(regex, category=category))
+    items = remove_completed(
+        find_items(mal, regex, category=category, fuzzy=True)
+    )
     item = select_item(items)  # also handles ambigious searches
     epi_chap = item["episode"] + inc
 
-    if item["media_type"] == "manga":
-        entry = dict(
-            num_chapters_read=epi_chap,
-            score=item.get("score", 0),
-            media_type="manga",
-        )
-    else:
-        entry = dict(
-            num_watched_episodes=epi_chap,
-            score=item.get("score", 0),
-            media_type="anime",
-        )
+    entry = edits.payload({"progress": epi_chap}, category)
 
     template = {
         "title": color.colorize(item["title"], "yellow", "bold"),
@@ -153,27 +300,126 @@ def progress_update(mal, regex, inc=1, category="anime"):
         )
     )
 
-    entry = start_end(entry, epi_chap, item["total_episodes"])
-    response = mal.update(item["id"], entry)
+    entry = start_end(
+        entry, epi_chap, item["total_episodes"], score=item.get("score")
+    )
+    response = send_update(
+        mal,
+        item["id"],
+        entry,
+        delta=inc,
+        base=item["episode"],
+        version=item.get("updated_at"),
+    )
     report_if_fails(response)
 
 
-def search(mal, regex, limit=20, extra=False, category="anime"):
+# constant of the reciprocal rank fusion merging search results
+RANK_CONSTANT = 60
+UNITS = {
+    "anime": ("Episodes", "num_episodes"),
+    "manga": ("Chapters", "num_chapters"),
+}
+
+
+def search_results(mal, queries, categories, limit=20, local=False):
+    """
+    Run searches concurrently and merge their results.
+
+    Every query is searched in every category at the same time, so it
+    takes as long as the slowest request. Results are de-duplicated by
+    category and id and ranked by reciprocal rank fusion: an entry found
+    high by several searches comes first.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        queries: list of texts to search (variants of the same title).
+        categories: list of categories to search in: anime and/or manga.
+        limit: Number of returned results.
+        local: only search the local catalogue (see malpy3.catalogue)
+
+    Returns:
+        List of entries (nodes of the search response) with their
+        "category", best first.
+    """
+
+    def run(job):
+        query, category = job
+        if local:
+            return catalogue.search(query, category=category, limit=limit)
+        response = mal.search(query, limit=limit, category=category)
+        if isinstance(response, list):  # 204, nothing found
+            return []
+        if response.status_code != 200:
+            raise SearchError(response.status_code)
+        return [e["node"] for e in response.json()["data"]]
+
+    jobs = [(query, category) for category in categories for query in queries]
+    if len(jobs) == 1:
+        outcomes = [(jobs[0], run(jobs[0]), None)]
+    else:
+        outcomes = bounded_map(run, jobs, workers=len(jobs))
+        errors = [error for _, _, error in outcomes if error is not None]
+        if len(errors) == len(jobs):
+            raise errors[0]
+
+    found = dict()
+    scores = dict()
+    for (query, category), nodes, error in outcomes:
+        for rank, node in enumerate(nodes or []):
+            key = (category, node["id"])
+            found.setdefault(key, dict(node, category=category))
+            scores[key] = scores.get(key, 0) + 1 / (RANK_CONSTANT + rank)
+    ranked = sorted(found, key=lambda key: -scores[key])
+    return [found[key] for key in ranked[: int(limit)]]
+
+
+def search(
+    mal,
+    regex,
+    limit=20,
+    extra=False,
+    category="anime",
+    pager=False,
+    local=False,
+    variants=(),
+):
     """
     Search the MAL database for an anime.
 
     Parameters:
         mal: An authenticated MyAnimeList class instance.
         regex: regex to match Anime/Manga title.
-        limit: int to limit result output.
+        limit: int to limit result output (at most api.SEARCH_CAP).
         extra: include additional information
-        category: Category to drop from: Anime or Manga
+        category: Category to search in: anime, manga or all
+        pager: show the results through $PAGER
+        local: only search the local catalogue (see malpy3.catalogue)
+        variants: other texts to search too (e.g. an English title)
 
     Returns:
         None
 
     """
-    result = mal.search(regex, limit=limit, category=category).json()["data"]
+    categories = list(UNITS) if category == "all" else [category]
+    queries = [regex] + list(variants)
+    single = len(categories) * len(queries) == 1
+    if single and not local and hasattr(mal, "search_pages"):
+        # a single search is shown page by page, the next page being
+        # fetched while the current one is written
+        pages = prefetch(
+            [dict(node, category=category) for node in page]
+            for page in mal.search_pages(regex, limit=limit, category=category)
+        )
+    else:
+        pages = iter(
+            [search_results(mal, queries, categories, limit, local=local)]
+        )
+    try:
+        result = next(pages, [])
+    except SearchError as e:
+        print_error("SearchError", "HTTP {}".format(e.args[0]), "reason: MAL")
+        return
     # if no results or only one was found we treat them special
     if len(result) == 0:
         print(color.colorize("No matches in MAL database ᕙ(⇀‸↼‶)ᕗ", "red"))
@@ -181,16 +427,42 @@ def search(mal, regex, limit=20, extra=False, category="anime"):
     if len(result) == 1:
         extra = True  # full info if only one anime was found
 
-    if category == "anime":
-        ep_header = "Episodes"
-        ep = "num_episodes"
-    elif category == "manga":
-        ep_header = "Chapters"
-        ep = "num_chapters"
+    with Renderer(pager=use_pager(pager)) as out:
+        found = 0
+        try:
+            for page in chain([result], pages):
+                for anime in page:
+                    found += 1
+                    _write_search_result(
+                        out, found, anime, extra, category == "all"
+                    )
+                out.flush()  # show each page as soon as it's there
+        except SearchError as e:
+            message = "Stopped, MAL answered HTTP {}".format(e.args[0])
+            out.write(out.paint(message, "red"))
+        out.write(
+            "Found {} {}".format(
+                out.paint(str(found), "cyan", "underline"),
+                "results" if category == "all" else "animes",
+            )
+        )
+
+
+def _write_search_result(out, index, anime, extra=False, category=False):
+    """
+    Write one search result.
 
+    Parameters:
+        out: Renderer to write to.
+        index: position of the result.
+        anime: node of the search response, with its "category".
+        extra: include additional information
+        category: show the category next to the id.
+    """
+    paint = out.paint
     lines = [
-        "{index}: {title}    {id}",
-        f"  {ep_header} " + ": {episodes}",
+        "{index}: {title}    {id}{category}",
+        "  {ep_header}: {episodes}",
         "  Synopsis: {synopsis}",
     ]
     extra_lines = [
@@ -198,46 +470,39 @@ def search(mal, regex, limit=20, extra=False, category="anime"):
         "  Status: {status}",
     ]
 
-    print(
-        "Found",
-        color.colorize(str(len(result)), "cyan", "underline"),
-        "animes:",
-    )
-    for i, _anime in enumerate(result):
-        # replace tags and special html chars (like &mdash;) with actual characters
-        anime = _anime.get("node")
-        synopsis = anime.get("synopsis")
-        if extra:
-            synopsis = "\n" + wrap_text(anime.get("synopsis")) + "\n"
-
-        elif len(synopsis) > 70 and not extra:
-            synopsis = synopsis[:70] + "..."
-
-        # this template/line stuff might need some refactoring
-        template = {
-            "index": str(i + 1),
-            "id": color.colorize(anime.get("id"), "red", "bold"),
-            "title": color.colorize(anime.get("title"), "red", "bold"),
-            "episodes": color.colorize(anime.get(ep), "white", "bold"),
-            "synopsis": synopsis,
-            "start": "NA"
-            if not (
-                anime.get("start_date", None) == "0000-00-00"
-                or anime.get("start_date", None)
-            )
-            else anime.get("start_date"),
-            "end": "NA"
-            if not (
-                anime.get("end_date", None) == "0000-00-00"
-                or anime.get("end_date", None)
-            )
-            else anime.get("end_date"),
-            "status": anime.get("status"),
-        }
-        print("\n".join(line.format_map(template) for line in lines))
-        if extra:
-            print("\n".join(line.format_map(template) for line in extra_lines))
-        print("\n")
+    ep_header, ep = UNITS[anime["category"]]
+    synopsis = anime.get("synopsis") or ""
+    if extra:
+        synopsis = "\n" + wrap_text(synopsis) + "\n"
+
+    elif len(synopsis) > 70:
+        synopsis = synopsis[:70] + "..."
+
+    template = {
+        "index": str(index),
+        "id": paint(anime.get("id"), "red", "bold"),
+        "title": paint(anime.get("title"), "red", "bold"),
+        "category": (
+            paint(" " + anime["category"], "cyan") if category else ""
+        ),
+        "ep_header": ep_header,
+        "episodes": paint(anime.get(ep), "white", "bold"),
+        "synopsis": synopsis,
+        "start": _date_or_na(anime.get("start_date")),
+        "end": _date_or_na(anime.get("end_date")),
+        "status": anime.get("status"),
+    }
+    out.write("\n".join(line.format_map(template) for line in lines))
+    if extra:
+        out.write("\n".join(line.format_map(template) for line in extra_lines))
+    out.write("\n")
+
+
+def _date_or_na(value):
+    """Replace missing/zeroed dates with NA."""
+    if not value or value == "0000-00-00":
+        return "NA"
+    return value
 
 
 def drop(mal, regex, category="anime"):
@@ -252,9 +517,11 @@ def drop(mal, regex, category="anime"):
     Returns: None
 
     """
-    items = remove_completed(mal.find(regex, category=category))
+    items = remove_completed(
+        find_items(mal, regex, category=category, fuzzy=True)
+    )
     item = select_item(items)
-    entry = dict(status="dropped", media_type=item.get("media_type"))
+    entry = edits.payload({"status": "dropped"}, category)
     old_status = item.get("status")
     template = {
         "title": color.colorize(item.get("title"), "yellow", "bold"),
@@ -268,10 +535,134 @@ def drop(mal, regex, category="anime"):
             "{old-status}".format_map(template)
         )
     )
-    response = mal.update(item["id"], entry)
+    response = send_update(
+        mal, item["id"], entry, version=item.get("updated_at")
+    )
     report_if_fails(response)
 
 
+def _updated_before(item, days):
+    """Tell if an entry was last updated more than `days` days ago."""
+    updated_at = item.get("updated_at")
+    if not updated_at:
+        return False
+    updated = datetime.strptime(updated_at[:19], "%Y-%m-%dT%H:%M:%S")
+    return datetime.utcnow() - updated > timedelta(days=days)
+
+
+def select_all(mal, regex, category="anime", status=None, older_than=None):
+    """
+    Select every entry matching a regex and filters, from one list fetch.
+
+    The whole list is fetched with the extra fields, so edits based on
+    the selected entries (tags...) start from their full state.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        regex: regex string to filter anime/manga titles.
+        category: Category to select from: anime or manga.
+        status: only entries with this status.
+        older_than: only entries not updated for this many days.
+
+    Returns:
+        List of parsed anime/manga fields.
+    """
+    items = find_items(mal, regex, category=category, limit=None, extra=True)
+    if status:
+        items = [i for i in items if i.get("status") == status]
+    if older_than is not None:
+        items = [i for i in items if _updated_before(i, older_than)]
+    return items
+
+
+def confirm(question):
+    """Ask a yes/no question, defaulting to no."""
+    return input("{} [y/N] ".format(question)).strip().lower() in ("y", "yes")
+
+
+def apply_updates(mal, updates, workers=4):
+    """
+    Apply many updates concurrently and print a summary per entry.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        updates: list of (item, entry) where entry is the dict to
+            patch/update (with media_type).
+        workers: maximum number of concurrent requests.
+
+    Returns:
+        List of (item, entry) that failed.
+    """
+
+    def send(update):
+        item, entry = update
+        return send_update(
+            mal, item["id"], dict(entry), version=item.get("updated_at")
+        )
+
+    failed = []
+    for update, status_code, error in bounded_map(
+        send, updates, workers=workers, label="sending updates"
+    ):
+        title = update[0]["title"]
+        if error is None and status_code == 200:
+            print(color.colorize("✓", "green"), title)
+            continue
+        failed.append(update)
+        reason = error if error is not None else "HTTP {}".format(status_code)
+        print(color.colorize("✗", "red"), title, color.colorize(reason, "red"))
+
+    print(
+        "Updated {} of {} entries".format(
+            color.colorize(str(len(updates) - len(failed)), "green"),
+            len(updates),
+        )
+    )
+    return failed
+
+
+def bulk_drop(
+    mal, regex, category="anime", status=None, older_than=None, yes=False
+):
+    """
+    Drop every entry matching a regex and filters.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        regex: regex to match Anime/Manga title.
+        category: Category to drop from: Anime or Manga
+        status: only entries with this status.
+        older_than: only entries not updated for this many days.
+        yes: don't ask for confirmation.
+
+    Returns:
+        None
+    """
+    # completed entries are only dropped when asked for explicitly
+    skipped = ("dropped",) if status else ("completed", "dropped")
+    items = [
+        i
+        for i in select_all(mal, regex, category, status, older_than)
+        if i.get("status") not in skipped
+    ]
+    if not items:
+        print(color.colorize("No matches in list ᕙ(⇀‸↼‶)ᕗ", "red"))
+        return
+
+    for item in items:
+        print(
+            "Drop {} ({})".format(
+                color.colorize(item["title"], "yellow", "bold"),
+                item.get("status"),
+            )
+        )
+    if not yes and not confirm("Drop these {} entries?".format(len(items))):
+        return
+
+    entry = dict(status="dropped", media_type=category)
+    apply_updates(mal, [(item, entry) for item in items])
+
+
 def add(mal, regex="", _id=None, status="plan_to_watch", category="anime"):
     """
     Add anime/manga to the user list.
@@ -293,7 +684,11 @@ def add(mal, regex="", _id=None, status="plan_to_watch", category="anime"):
 
     entry = dict(status=status, media_type=category)
 
-    if _id:
+    known = catalogue.load(category)
+    if _id and mal.offline and int(_id) in known:
+        selected = known[int(_id)]
+
+    elif _id:
         sel = mal.get_anime_details(_id, entry=entry)
         if sel.status_code != 200:
             report_if_fails(sel.status_code)
@@ -302,8 +697,15 @@ def add(mal, regex="", _id=None, status="plan_to_watch", category="anime"):
         selected = sel.json()
 
     if regex:
-        response = mal.search(regex, category=category).json()["data"]
-        results = [anime.get("node") for anime in response]
+        # titles seen before don't need a search request
+        results = catalogue.search(regex, category=category)
+        for node in results:
+            node["match_score"] = fuzzy.similarity(regex, node)
+        results.sort(key=itemgetter("match_score"), reverse=True)
+
+        if not fuzzy.dominant(results):
+            response = mal.search(regex, category=category).json()["data"]
+            results = [anime.get("node") for anime in response]
 
         selected = select_item(results)
 
@@ -314,23 +716,83 @@ def add(mal, regex="", _id=None, status="plan_to_watch", category="anime"):
         )
     )
 
-    # mal.update(selected["id"], entry=entry)
-    mal.update(selected["id"], entry=entry)
+    send_update(mal, selected["id"], entry)
 
 
-def stats(mal):
+def crawl(
+    mal,
+    kind,
+    year=None,
+    season=None,
+    ranking_type="all",
+    category="anime",
+    pages=None,
+    hydrate=True,
+):
+    """
+    Download a season or a ranking into the local store.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        kind: "season" or "ranking".
+        year: year of the season.
+        season: winter, spring, summer or fall.
+        ranking_type: type of ranking (all, airing, bypopularity...).
+        category: Category to rank: anime or manga.
+        pages: maximum number of pages to fetch in this run.
+        hydrate: fetch the details of every entry.
+
+    Returns:
+        None
+    """
+    if kind == "season":
+        name = _crawl.crawl_name("season", year, season)
+
+        def fetch_page(offset):
+            return mal.season(
+                year, season, limit=_crawl.PAGE_SIZE, offset=offset
+            )
+
+        category = "anime"
+    else:
+        name = _crawl.crawl_name("ranking", category, ranking_type)
+
+        def fetch_page(offset):
+            return mal.ranking(
+                ranking_type,
+                limit=_crawl.PAGE_SIZE,
+                offset=offset,
+                category=category,
+            )
+
+    stored = _crawl.crawl(
+        mal, fetch_page, name, category=category, pages=pages, hydrate=hydrate
+    )
+    entries = len(_crawl.load(name)["id"])
+    print(
+        "Stored {} entries ({} pages) in {}".format(
+            color.colorize(str(entries), "cyan"),
+            stored,
+            _crawl.CRAWL_PATH / name,
+        )
+    )
+
+
+def stats(mal, response=None):
     """
     Print user's anime stats.
 
     Parameters:
         mal: An authenticated MyAnimeList class instance.
+        response: already fetched get_user_info() data, if any.
 
     Returns:
         None
 
     """
 
-    response = mal.get_user_info().json()
+    if response is None:
+        response = mal.get_user_info().json()
     statistics = response.get("anime_statistics")
 
     line_size = 44 + 2
@@ -418,7 +880,429 @@ def stats(mal):
     print("\n".join(lines))
 
 
-def find(mal, regex, status="", limit=30, extra=False, category="anime"):
+def _local_entries(mal, category="anime", sync=False):
+    """The local copy of a list, downloaded when incomplete or asked to."""
+    entries = snapshot.load(category)
+    if (sync or not snapshot.complete(category)) and not mal.offline:
+        entries = mal.list(limit=None, extra=True, category=category)
+    return entries
+
+
+def recommend(mal, category="anime", limit=20, sync=False):
+    """
+    Print titles recommended from the user's list.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        category: Category to recommend: anime or manga.
+        limit: Number of recommendations.
+        sync: download the list first instead of using the local copy.
+
+    Returns:
+        None
+    """
+    entries = _local_entries(mal, category, sync=sync)
+    found = _recommend.recommend(mal, entries, category, limit=limit)
+    if not found:
+        print(color.colorize("Nothing to recommend yet ᕙ(⇀‸↼‶)ᕗ", "red"))
+        return
+
+    with Renderer() as out:
+        paint = out.paint
+        for index, rec in enumerate(found, start=1):
+            out.write(
+                "{}: {}    {}".format(
+                    index,
+                    paint(rec["title"], "red", "bold"),
+                    paint(rec["id"], "cyan"),
+                )
+            )
+            out.write(
+                "   score {:.2f}, because of: {}".format(
+                    rec["score"], ", ".join(rec["because"])
+                )
+            )
+
+
+def airing(mal, sync=False):
+    """
+    Print which watched shows have new episodes.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        sync: download the list first instead of using the local copy.
+
+    Returns:
+        None
+    """
+    entries = [
+        e
+        for e in _local_entries(mal, "anime", sync=sync).values()
+        if e.get("status") == "watching"
+    ]
+    schedule = _airing.refresh(mal, [e["id"] for e in entries])
+    shows = _airing.available(entries, schedule)
+    if not shows:
+        print(color.colorize("Not watching anything ᕙ(⇀‸↼‶)ᕗ", "red"))
+        return
+
+    date_format = "%a %Y-%m-%d %H:%M"
+    with Renderer() as out:
+        paint = out.paint
+        for show in shows:
+            new = ""
+            if show["new"]:
+                new = paint("{} new".format(show["new"]), "green", "bold")
+            out.write(
+                "{}  {}/{}/{} {}".format(
+                    paint(show["title"], "red", "bold"),
+                    show["watched"],
+                    show["aired"],
+                    show["total"] or "?",
+                    new,
+                )
+            )
+            if show["next"] is not None:
+                next_episode = show["next"].astimezone().strftime(date_format)
+                out.write("   next episode: {}".format(next_episode))
+
+
+def local_stats(mal, category="anime", sync=False, entries=None):
+    """
+    Print statistics computed over the local copy of the list.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        category: Category to compute: anime or manga.
+        sync: download the list first instead of using the local copy.
+        entries: already loaded list entries, if any.
+
+    Returns:
+        None
+    """
+    if entries is None:
+        entries = _local_entries(mal, category, sync=sync)
+
+    result = _stats.compute(
+        _stats.Columns.from_entries(
+            entries.values(),
+            category,
+            date_format=getattr(mal, "date_format", "%Y-%m-%d"),
+        )
+    )
+    render_local_stats(result, category)
+
+
+def combined_stats(mal, local=False, sync=False):
+    """
+    Print anime and manga stats together.
+
+    MAL only summarizes anime statistics, so manga statistics are always
+    computed from the local manga list. The requests needed by both
+    sides (user info and/or list downloads) are sent concurrently.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        local: compute anime stats locally too.
+        sync: download the lists first instead of using the local copies.
+
+    Returns:
+        None
+    """
+    local = local or mal.offline
+    tasks = {"manga": lambda: _local_entries(mal, "manga", sync=sync)}
+    if local:
+        tasks["anime"] = lambda: _local_entries(mal, "anime", sync=sync)
+    else:
+        tasks["anime"] = lambda: mal.get_user_info().json()
+
+    results = dict()
+    for name, result, error in bounded_map(lambda n: tasks[n](), tasks):
+        if error is not None:
+            raise error
+        results[name] = result
+
+    if local:
+        local_stats(mal, "anime", entries=results["anime"])
+    else:
+        stats(mal, response=results["anime"])
+    print()
+    local_stats(mal, "manga", entries=results["manga"])
+
+
+def stats_as_of(mal, when, category="anime"):
+    """
+    Print statistics of the list as it was at some date.
+
+    The list is rebuilt from the history journal (see malpy3.journal),
+    the fields it doesn't record come from the local copy of the list.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        when: date like 2024-05-01 (the end of that day is used).
+        category: Category to compute: anime or manga.
+
+    Returns:
+        None
+    """
+    try:
+        moment = journal.parse_date(
+            when, getattr(mal, "date_format", "%Y-%m-%d")
+        )
+    except ValueError as e:
+        print_error("DateError", str(e), "reason: you")
+        return
+
+    first = journal.Journal(category).first()
+    if first is None or moment < first:
+        print(
+            color.colorize(
+                "No {} history before {} (recorded since {})".format(
+                    category, when, first.date() if first else "never"
+                ),
+                "red",
+            )
+        )
+        return
+
+    entries = journal.entries_at(moment, category, snapshot.load(category))
+    print(color.colorize("As of {}".format(moment.strftime("%c")), "cyan"))
+    local_stats(mal, category, entries=entries)
+
+
+def history(regex, category="anime"):
+    """
+    Print the recorded changes of the entries matching a regex.
+
+    Parameters:
+        regex: regex to match anime/manga titles.
+        category: Category of the entries: anime or manga.
+
+    Returns:
+        None
+    """
+    records = journal.Journal(category).history(regex)
+    if not records:
+        print(color.colorize("No history for {}".format(regex), "red"))
+        return
+
+    by_entry = dict()
+    for record in records:
+        by_entry.setdefault(record["id"], []).append(record)
+
+    with Renderer() as out:
+        paint = out.paint
+        for item_id, changes in by_entry.items():
+            title = next(
+                (r["title"] for r in reversed(changes) if r.get("title")),
+                item_id,
+            )
+            out.write(
+                "{}    {}".format(
+                    paint(title, "red", "bold"), paint(item_id, "cyan")
+                )
+            )
+            for record in changes:
+                moment = journal.parse_time(record["at"])
+                out.write(
+                    "  {}  {}".format(
+                        paint(moment.strftime("%Y-%m-%d %H:%M"), "blue"),
+                        _describe(record["before"], record["after"]),
+                    )
+                )
+
+
+def watch_time(mal, category="anime", weeks=8):
+    """
+    Print the time spent watching/reading, from the history journal.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        category: Category to compute: anime or manga.
+        weeks: number of weeks to show.
+
+    Returns:
+        None
+    """
+    totals = _watchtime.update(mal, category)
+    result = _watchtime.summarize(totals, weeks=weeks)
+    if not result["units"]:
+        print(color.colorize("No progress recorded yet", "red"))
+        return
+
+    unit = "chapters" if category == "manga" else "episodes"
+    bar_size = 30
+
+    def hours(minutes):
+        return "{:.1f}h".format(minutes / 60)
+
+    with Renderer() as out:
+        paint = out.paint
+        title = "{} Time".format(
+            "Reading" if category == "manga" else "Watching"
+        )
+        out.write(paint(title, "white", "underline"))
+        out.write(
+            "Total: {} ({} {})    Active days: {}".format(
+                hours(result["minutes"]),
+                result["units"],
+                unit,
+                result["active_days"],
+            )
+        )
+        out.write(
+            "Streak: {} days    Longest: {} days".format(
+                result["current_streak"], result["longest_streak"]
+            )
+        )
+        if result["trend"] is not None:
+            trend = result["trend"]
+            shade = "green" if trend >= 0 else "red"
+            out.write(
+                "Trend: {} {} per week".format(
+                    paint("{:+.0%}".format(trend), shade), unit
+                )
+            )
+
+        def histogram(title, rows):
+            out.write()
+            out.write(paint(title, "white", "underline"))
+            top = max(minutes for _, minutes, _ in rows) or 1
+            for label, minutes, extra in rows:
+                bars = "█" * round(bar_size * minutes / top)
+                out.write(
+                    "  {:>10} {} {}{}".format(
+                        label, paint(bars, "blue"), hours(minutes), extra
+                    )
+                )
+
+        histogram(
+            "Days",
+            [
+                (day.strftime("%a %d"), minutes, "")
+                for day, minutes in result["days"].items()
+            ],
+        )
+        histogram(
+            "Weeks",
+            [
+                (
+                    monday.strftime("%b %d"),
+                    values["minutes"],
+                    " ({} {})".format(values["units"], unit),
+                )
+                for monday, values in result["weeks"].items()
+            ],
+        )
+        genres = list(result["genres"].items())[:10]
+        if genres:
+            histogram(
+                "Top genres",
+                [(name[:10], minutes, "") for name, minutes in genres],
+            )
+
+
+def compact_history(category="anime", keep_days=journal.KEEP_DAYS):
+    """
+    Merge old history records, see malpy3.journal.Journal.compact.
+
+    Parameters:
+        category: Category of the history: anime or manga.
+        keep_days: records younger than this are kept as they are.
+
+    Returns:
+        None
+    """
+    before, after = journal.Journal(category).compact(keep_days)
+    print(
+        "{} history: {} records compacted to {}".format(
+            category.capitalize(), before, after
+        )
+    )
+
+
+def render_local_stats(result, category="anime"):
+    """
+    Print the statistics computed by malpy3.stats.compute.
+
+    Parameters:
+        result: Dictionary returned by malpy3.stats.compute.
+        category: Category of the statistics: anime or manga.
+    """
+    progress_name = "Chapters" if category == "manga" else "Episodes"
+    bar_size = 30
+    with Renderer() as out:
+        paint = out.paint
+        title = "{} Stats".format(category.capitalize())
+        out.write(paint(title, "white", "underline"))
+        out.write(
+            "Entries: {}    Mean Score: {:.2f} ({} scored)".format(
+                result["entries"], result["mean_score"], result["scored"]
+            )
+        )
+        out.write(
+            "{}: {}    Days: {:.1f}    Completion rate: {:.0%}".format(
+                progress_name,
+                result["progress"],
+                result["days"],
+                result["completion_rate"],
+            )
+        )
+
+        out.write()
+        out.write(paint("Status", "white", "underline"))
+        for status, values in result["statuses"].items():
+            out.write(
+                "  {:<15}{:>6} entries{:>8} {}".format(
+                    status.replace("_", " ").capitalize() + ":",
+                    values["entries"],
+                    values["progress"],
+                    progress_name.lower(),
+                )
+            )
+
+        def histogram(title, counts):
+            if not counts:
+                return
+            out.write()
+            out.write(paint(title, "white", "underline"))
+            top = max(counts.values()) or 1
+            for label, count in counts.items():
+                bars = "█" * round(bar_size * count / top)
+                out.write(
+                    "  {:>5} {} {}".format(
+                        str(label), paint(bars, "blue"), count
+                    )
+                )
+
+        histogram("Scores", result["score_distribution"])
+        histogram("Years", result["years"])
+
+        for title in ("genres", "studios"):
+            breakdown = list(result[title].items())[:10]
+            if not breakdown:
+                continue
+            out.write()
+            out.write(paint("Top " + title, "white", "underline"))
+            for name, values in breakdown:
+                out.write(
+                    "  {:<25}{:>6} entries   mean {:.2f}".format(
+                        name, values["entries"], values["mean_score"]
+                    )
+                )
+
+
+def find(
+    mal,
+    regex,
+    status="",
+    limit=30,
+    extra=False,
+    category="anime",
+    pager=False,
+    where=None,
+    sort=None,
+):
     """
     Find all anime in a certain status given a regex.
 
@@ -428,6 +1312,9 @@ def find(mal, regex, status="", limit=30, extra=False, category="anime"):
         limit: int to limit result output.
         extra: include additional information
         category: Category to find from: Anime or Manga
+        pager: show the results through $PAGER
+        where: filter expression (see malpy3.query).
+        sort: field to sort by, prefixed with - for descending order.
 
     Returns: None
 
@@ -437,28 +1324,49 @@ def find(mal, regex, status="", limit=30, extra=False, category="anime"):
     if category == "manga":
         status = status_mapping.get(status, status)
 
-    items = mal.find(
-        regex,
-        status=status,
-        limit=limit,
-        extra=extra,
-        category=category,
-    )
-    if len(items) == 0:
-        print(color.colorize("No matches in list ᕙ(⇀‸↼‶)ᕗ", "red"))
+    date_format = getattr(mal, "date_format", "%Y-%m-%d")
+    try:
+        compiled = query.Query(where or "", date_format=date_format)
+        key, reverse = query.sort_key(
+            sort or "-status", date_format=date_format
+        )
+    except query.QueryError as e:
+        print_error("QueryError", str(e), "reason: you")
         return
 
+    if where:
+        # the filter needs every entry, the limit applies to its result
+        items = filter_items(mal, regex, compiled, status, category)
+    else:
+        items = find_items(
+            mal,
+            regex,
+            status=status,
+            limit=limit,
+            extra=extra,
+            category=category,
+        )
+
     # filter the results if necessary
     if status != "":
         items = [x for x in items if x.get("status") == status]
+    if where and limit:
+        items = sorted(items, key=key, reverse=reverse)[: int(limit)]
 
-    n_items = color.colorize(str(len(items)), "cyan", "underline")
-    print("Matched {} items:".format(n_items))
+    if len(items) == 0:
+        print(color.colorize("No matches in list ᕙ(⇀‸↼‶)ᕗ", "red"))
+        return
 
     # pretty print all the animes found
-    sorted_items = sorted(items, key=itemgetter("status"), reverse=True)
-    for index, item in enumerate(sorted_items):
-        anime_pprint(index + 1, item, extra=extra)
+    sorted_items = sorted(items, key=key, reverse=reverse)
+    if extra:
+        details.hydrate(mal, sorted_items, category)
+
+    with Renderer(pager=use_pager(pager)) as out:
+        n_items = out.paint(str(len(items)), "cyan", "underline")
+        out.write("Matched {} items:".format(n_items))
+        for index, item in enumerate(sorted_items):
+            anime_pprint(index + 1, item, extra=extra, out=out)
 
 
 def edit(mal, regex, changes, category="anime"):
@@ -469,73 +1377,256 @@ def edit(mal, regex, changes, category="anime"):
     Parameters:
         mal: An authenticated MyAnimeList class instance.
         regex: regex string to filter anime/manga titles.
-        changes: Dictionary with fields to update
+        changes: Dictionary with fields to update (score, status, tags
+            and add_tags lists).
         category: Category to edit:  anime or manga
 
     Return:
         None
     """
     # find the correct entry to modify (handles animes not found)
+    item = select_item(
+        find_items(mal, regex, extra=True, category=category, fuzzy=True)
+    )
 
-    entry = select_item(mal.find(regex, extra=True, category=category))
-
-    if not changes:  # open file for user to choose changes manually
-        tmp_path = tempfile.gettempdir() + "/mal_tmp"
-        editor = os.environ.get("EDITOR", "/usr/bin/vi")
-        # write information to tmp file
-        with open(tmp_path, "w") as tmp:
-            tmp.write('# change fields for "{}"\n'.format(entry["title"]))
-            tmp.write("status: {}\n".format(entry["status"]))
-            for field in ["score", "tags"]:
-                tmp.write("{}: {}\n".format(field, entry[field]))
-
-        # open the file with the default editor
-        subprocess.call([editor, tmp_path])
-
-        # read back the data into a dict if any changes were made
-        with open(tmp_path, "r") as tmp:
-            lines = [
-                l
-                for l in tmp.read().split("\n")
-                if l and not l.startswith("#")
-            ]
-
-        # delete tmp file, we don't need it anymore
-        os.remove(tmp_path)
-
-        changes = dict()
-        for field, value in [tuple(l.split(":")) for l in lines]:
-            field, value = field.strip(), value.strip()
-            if field == "status":
-                value = value
-            if str(entry[field]) != value:
-                changes[field] = value
-        if not changes:
+    if changes:
+        before = edits.state(item)
+        diff = edits.diff(before, _with_changes(before, changes))
+        errors = edits.validate(diff, category, item.get("total_episodes"))
+        if errors:
+            print_error("EditError", "; ".join(errors), "reason: you")
             return
+        edited = [(item, diff)] if diff else []
+    else:  # open file for user to choose changes manually
+        edited = edit_in_editor([item], category)
+
+    commit_edits(mal, edited, category)
+
 
-    # change entry
+def _with_changes(state, changes):
+    """State after the changes given on the command line."""
+    state = dict(state)
     for field, new in changes.items():
         if field == "add_tags":
-            if entry.get("tags") is None:
-                entry["tags"] = new
-            else:
-                entry["tags"] += " " + new
+            state["tags"] = state["tags"] + [
+                tag for tag in new if tag not in state["tags"]
+            ]
         else:
-            entry[field] = new
+            state[field] = new
+    return state
 
-    # if the entry didn't have a tag before and none was provived by
-    # the user as a change we need to remove the entry from the dict
-    # to prevent the api from thinking we want to add the 'None' tag
-    if entry.get("tags") is None:
-        entry.pop("tags")
 
-    # send changes back to patch/update
-    changes["media_type"] = category
-    response = mal.update(entry["id"], changes)
-    report_if_fails(response)
+def _describe(before, diff):
+    """Short description of changed fields: score: 7 -> 8, ..."""
+    return ", ".join(
+        (
+            "{}: {} -> {}".format(field, before[field], new)
+            if field in before
+            else "{}: {}".format(field, new)
+        )
+        for field, new in diff.items()
+    )
+
+
+def edit_in_editor(items, category="anime"):
+    """
+    Edit entries in $EDITOR, one block per entry, until they are valid.
+
+    Parameters:
+        items: list of parsed anime/manga fields.
+        category: Category of the entries: anime or manga.
+
+    Returns:
+        List of (item, changed fields) for the entries that changed.
+    """
+    by_id = {item["id"]: item for item in items}
+    text = edits.dump(items)
+    while True:
+        text = edits.open_editor(text)
+        errors = []
+        result = []
+        try:
+            edited = edits.parse(text)
+        except edits.EditError as e:
+            edited, errors = {}, [str(e)]
+
+        for _id, fields in edited.items():
+            item = by_id.get(_id)
+            if item is None:
+                errors.append("[{}] isn't an edited entry".format(_id))
+                continue
+            diff = edits.diff(edits.state(item), fields)
+            unknown = set(fields) - set(edits.FIELDS)
+            problems = edits.validate(
+                dict(diff, **{f: None for f in unknown}),
+                category,
+                item.get("total_episodes"),
+            )
+            errors += ["[{}] {}".format(_id, p) for p in problems]
+            if diff:
+                result.append((item, diff))
+
+        if not errors:
+            return result
+        for error in errors:
+            print(color.colorize(error, "red"))
+        if not confirm("Edit again?"):
+            return []
+        text = "".join("# {}\n".format(e) for e in errors) + text
+
+
+def edit_many(mal, regex, where, category="anime"):
+    """
+    Edit every entry matching a filter in a single editor session.
+
+    The list is fetched once, the matches are dumped in one file (a TOML
+    table per entry) and only the entries changed in the editor are sent.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        regex: regex string to filter anime/manga titles.
+        where: filter expression (see malpy3.query).
+        category: Category to edit: anime or manga.
+
+    Returns:
+        None
+    """
+    try:
+        compiled = query.Query(
+            where, date_format=getattr(mal, "date_format", "%Y-%m-%d")
+        )
+    except query.QueryError as e:
+        print_error("QueryError", str(e), "reason: you")
+        return
+
+    items = filter_items(mal, regex, compiled, category=category)
+    if not items:
+        print(color.colorize("No matches in list ᕙ(⇀‸↼‶)ᕗ", "red"))
+        return
+
+    items.sort(key=itemgetter("title"))
+    edited = edit_in_editor(items, category)
+    for item, diff in edited:
+        print(
+            color.colorize(item["title"], "yellow", "bold"),
+            "({})".format(_describe(edits.state(item), diff)),
+        )
+    if edited and not confirm("Apply these {} changes?".format(len(edited))):
+        return
+
+    commit_edits(mal, edited, category)
 
 
-def anime_pprint(index, item, extra=False):
+def commit_edits(mal, edited, category="anime", workers=4):
+    """
+    Send edited entries as one transaction.
+
+    Only the changed fields of every entry are sent, concurrently. If
+    some updates fail, the ones that went through can be reverted.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        edited: list of (item, changed fields).
+        category: Category of the entries: anime or manga.
+        workers: maximum number of concurrent requests.
+
+    Returns:
+        List of (item, changed fields) that failed.
+    """
+    if not edited:
+        print("Nothing changed")
+        return []
+
+    inverse = dict()
+    updates = []
+    for item, diff in edited:
+        before = edits.state(item)
+        inverse[item["id"]] = {field: before[field] for field in diff}
+        updates.append((item, edits.payload(diff, category)))
+
+    failed = {item["id"] for item, _ in apply_updates(mal, updates, workers)}
+    for item, diff in edited:
+        if item["id"] not in failed:
+            edits.apply(item, diff)
+
+    applied = [item for item, _ in edited if item["id"] not in failed]
+    if failed and applied:
+        print(
+            color.colorize(
+                "{} of {} changes failed".format(len(failed), len(edited)),
+                "red",
+            )
+        )
+        if confirm("Revert the {} applied changes?".format(len(applied))):
+            rollback = [
+                (item, edits.payload(inverse[item["id"]], category))
+                for item in applied
+            ]
+            apply_updates(mal, rollback, workers)
+
+    return [(item, diff) for item, diff in edited if item["id"] in failed]
+
+
+def bulk_edit(
+    mal,
+    regex,
+    changes,
+    category="anime",
+    status=None,
+    older_than=None,
+    yes=False,
+):
+    """
+    Apply the same changes to every entry matching a regex and filters.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        regex: regex string to filter anime/manga titles.
+        changes: Dictionary with fields to update.
+        category: Category to edit: anime or manga.
+        status: only entries with this status.
+        older_than: only entries not updated for this many days.
+        yes: don't ask for confirmation.
+
+    Returns:
+        None
+    """
+    if not changes:
+        print(color.colorize("Nothing to change, give some fields", "red"))
+        return
+    items = select_all(mal, regex, category, status, older_than)
+    if not items:
+        print(color.colorize("No matches in list ᕙ(⇀‸↼‶)ᕗ", "red"))
+        return
+
+    edited = []
+    for item in items:
+        before = edits.state(item)
+        diff = edits.diff(before, _with_changes(before, changes))
+        if diff:
+            edited.append((item, diff))
+            print(
+                color.colorize(item["title"], "yellow", "bold"),
+                "({})".format(_describe(before, diff)),
+            )
+    if not edited:
+        print("All {} matches are up to date".format(len(items)))
+        return
+    errors = {
+        error
+        for item, diff in edited
+        for error in edits.validate(diff, category, item.get("total_episodes"))
+    }
+    if errors:
+        print_error("EditError", "; ".join(sorted(errors)), "reason: you")
+        return
+    if not yes and not confirm("Edit these {} entries?".format(len(edited))):
+        return
+
+    commit_edits(mal, edited, category)
+
+
+def anime_pprint(index, item, extra=False, out=None):
     """
     Pretty print an anime's information.
 
@@ -543,9 +1634,15 @@ def anime_pprint(index, item, extra=False):
         index: Index of object (Used for numbering).
         item : Anime/Manga object
         extra: Print extra information
+        out: Renderer to write to (a new one is used if not given).
 
     Prints formatted colored output.
     """
+    if out is None:
+        with Renderer() as out:
+            return anime_pprint(index, item, extra=extra, out=out)
+
+    paint = out.paint
     if item.get("media_type") == "manga":
         episode_header = "chapters"
         re_read_watch = "#in-rereading"
@@ -553,57 +1650,52 @@ def anime_pprint(index, item, extra=False):
         episode_header = "episoses"
         re_read_watch = "#in-rewatching"
 
-    padding = int(math.log10(index)) + 3
-    remaining_color = (
-        "blue" if item.get("episode") < item.get("total_episodes") else "green"
-    )
-    remaining = "{episode}/{total_episodes}".format_map(item)
+    padding = " " * (int(math.log10(index)) + 3)
+    episode = item.get("episode")
+    total_episodes = item.get("total_episodes")
+    remaining_color = "blue" if episode < total_episodes else "green"
+    remaining = "{}/{}".format(episode, total_episodes)
     in_rewatching = (
-        f"{re_read_watch}" "-{is_rewatching}".format_map(item)
+        "{}-{}".format(re_read_watch, item.get("is_rewatching"))
         if item.get("is_rewatching")
         else ""
     )
-    template = {
-        "index": index,
-        "padding": " " * padding,
-        "status": item.get("status").capitalize(),
-        "title": color.colorize(item.get("title"), "red", "bold"),
-        "remaining": color.colorize(remaining, remaining_color, "bold"),
-        "score": color.score_color(item.get("score")),
-        "rewatching": (color.colorize(in_rewatching, "yellow", "bold")),
-    }
-    # add formating options for extra info
-    if extra:
-        template.update(
-            {
-                "start": item.get("start_date")
-                if item.get("start_date") != "0000-00-00"
-                else "NA",
-                "finish": item.get("end_date")
-                if item["end_date"] != "0000-00-00"
-                else "NA",
-                "tags": item.get("tags"),
-            }
-        )
-
-    message_lines = [
-        "{index}: {title}".format_map(template),
-        (
-            "{padding}{status} at {remaining} "
-            f"{episode_header} "
-            "with score {score} {rewatching}".format_map(template)
-        ),
-    ]
+
+    out.write("{}: {}".format(index, paint(item.get("title"), "red", "bold")))
+    out.write(
+        "{}{} at {} {} with score {} {}".format(
+            padding,
+            item.get("status").capitalize(),
+            paint(remaining, remaining_color, "bold"),
+            episode_header,
+            color.score_color(item.get("score"), paint=paint),
+            paint(in_rewatching, "yellow", "bold"),
+        )
+    )
 
     # the extra information lines
     if extra:
-        message_lines.extend(
-            [
-                "{padding}Started: {start} \t Finished: {finish}".format_map(
-                    template
-                ),
-                "{padding}Tags: {tags}".format_map(template),
-            ]
+        out.write(
+            "{}Started: {} \t Finished: {}".format(
+                padding,
+                _date_or_na(item.get("start_date")),
+                _date_or_na(item.get("end_date")),
+            )
         )
+        out.write("{}Tags: {}".format(padding, item.get("tags")))
+        if "genres" in item:
+            out.write(
+                "{}Mean: {}  Airing: {}".format(
+                    padding,
+                    item.get("mean") or "NA",
+                    item.get("airing_status"),
+                )
+            )
+            out.write(
+                "{}Genres: {}".format(padding, ", ".join(item["genres"]))
+            )
+            out.write(
+                "{}Studios: {}".format(padding, ", ".join(item["studios"]))
+            )
 
-    print("\n".join(message_lines), "\n")
+    out.write()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Bulk download of the MAL catalogue.
+
+``mal crawl season <year> <season>`` and ``mal crawl ranking <type>`` page
+through the season/ranking endpoints, hydrate the details of each page
+concurrently (see :mod:`malpy3.details`) and store every page as a gzipped
+columnar JSON file::
+
+    {"id": [...], "title": [...], "mean": [...], ...}
+
+A page file is only written once the whole page is done, so an
+interrupted crawl resumes from the first missing page.
+"""
+
+# stdlib
+import gzip
+import json
+
+# self-package
+from malpy3 import setup
+from malpy3 import catalogue
+from malpy3 import details
+from malpy3 import progress
+from malpy3.pool import limiter
+from malpy3.utils import atomic_write
+
+CRAWL_PATH = setup.DATA_PATH / "crawl"
+PAGE_SIZE = 100
+
+# columns stored for every crawled entry
+COLUMNS = [
+    "id",
+    "title",
+    "media_type",
+    "status",
+    "num_episodes",
+    "num_chapters",
+    "start_date",
+    "end_date",
+    "mean",
+    "rank",
+    "popularity",
+    "num_list_users",
+    "average_episode_duration",
+    "genres",
+    "studios",
+]
+
+
+def crawl_name(kind, *key):
+    """Directory name of a crawl, e.g. season-2020-fall."""
+    return "-".join(str(k) for k in (kind,) + key)
+
+
+def _page_path(directory, page):
+    return directory / "page-{:05d}.json.gz".format(page)
+
+
+def to_columns(nodes):
+    """
+    Turn a list of API nodes into a dictionary of columns.
+
+    Parameters:
+        nodes: list of dicts (API nodes, optionally with details).
+
+    Returns:
+        Dictionary of column name -> list of values.
+    """
+    columns = {name: [] for name in COLUMNS}
+    for node in nodes:
+        for name in COLUMNS:
+            value = node.get(name)
+            if name in ("genres", "studios"):
+                value = [v["name"] for v in value or []]
+            columns[name].append(value)
+    return columns
+
+
+def _write_page(directory, page, nodes):
+    data = json.dumps(to_columns(nodes)).encode("utf-8")
+    atomic_write(_page_path(directory, page), gzip.compress(data))
+
+
+def load(name):
+    """
+    Read a crawl back.
+
+    Parameters:
+        name: crawl name (see crawl_name).
+
+    Returns:
+        Dictionary of column name -> list of values.
+    """
+    columns = {column: [] for column in COLUMNS}
+    for path in sorted((CRAWL_PATH / name).glob("page-*.json.gz")):
+        with gzip.open(str(path), "rt") as f:
+            page = json.load(f)
+        for column in COLUMNS:
+            columns[column].extend(page.get(column, []))
+    return columns
+
+
+def crawl(mal, fetch_page, name, category="anime", pages=None, hydrate=True):
+    """
+    Page through a catalogue endpoint, resuming where it was left.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        fetch_page: function(offset) returning a Response object.
+        name: crawl name, used as directory (see crawl_name).
+        category: Category of the entries: anime or manga.
+        pages: maximum number of pages to fetch (None for all).
+        hydrate: fetch the details of every entry.
+
+    Returns:
+        Number of pages stored for this crawl.
+    """
+    directory = CRAWL_PATH / name
+    directory.mkdir(parents=True, exist_ok=True)
+    done_marker = directory / "done"
+
+    page = 0
+    fetched = 0
+    with progress.task("crawling " + name, total=pages) as task:
+        while not done_marker.exists():
+            if pages is not None and fetched >= pages:
+                break
+            if _page_path(directory, page).exists():
+                page += 1  # checkpoint from an earlier run
+                continue
+
+            limiter.wait()
+            r = fetch_page(page * PAGE_SIZE)
+            if r.status_code != 200:
+                progress.echo(
+                    "page {}: failed with HTTP {}".format(page, r.status_code)
+                )
+                break
+
+            response = r.json()
+            nodes = [entry["node"] for entry in response.get("data", [])]
+            for entry, node in zip(response.get("data", []), nodes):
+                node.setdefault("rank", entry.get("ranking", {}).get("rank"))
+            catalogue.add(nodes, category)
+
+            if hydrate and nodes:
+                found = details.fetch(mal, [n["id"] for n in nodes], category)
+                for node in nodes:
+                    node.update(found.get(node["id"], {}))
+
+            _write_page(directory, page, nodes)
+            progress.echo("page {}: {} entries".format(page, len(nodes)))
+            page += 1
+            fetched += 1
+            task.advance()
+
+            if not response.get("paging", {}).get("next") or not nodes:
+                done_marker.touch()
+
+    return len(list(directory.glob("page-*.json.gz")))
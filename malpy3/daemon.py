@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Optional background process that keeps a logged in session alive.
+
+``mal daemon`` logs in once, keeps the HTTP connections of its
+:class:`~malpy3.api.MyAnimeList` instance open and holds the user's list in
+memory. Other ``mal`` invocations talk to it through a unix domain socket
+using newline delimited JSON, so they neither validate the login nor
+download the list again.
+"""
+
+# stdlib
+import os
+import sys
+import json
+import time
+import stat
+import socket
+import tempfile
+import threading
+import socketserver
+from pathlib import Path
+
+# 3rd party
+from xdg import XDG_RUNTIME_DIR
+
+# self-package
+from malpy3 import __name__ as APP_NAME
+from malpy3 import catalogue
+from malpy3 import pending
+from malpy3 import progress
+from malpy3 import setup
+from malpy3.api import Reply
+from malpy3.fuzzy import TrigramIndex, match
+from malpy3.utils import print_error
+
+# without XDG_RUNTIME_DIR, a private directory in the shared temp dir
+RUNTIME_PATH = (
+    Path(XDG_RUNTIME_DIR)
+    if XDG_RUNTIME_DIR
+    else Path(tempfile.gettempdir()) / "{}-{}".format(APP_NAME, os.getuid())
+)
+SOCKET_PATH = RUNTIME_PATH / "{}-{}.sock".format(APP_NAME, os.getuid())
+# seconds a downloaded list is served from memory
+LIST_TTL = 300
+# seconds between sends of the write-behind queue
+FLUSH_INTERVAL = 60
+# Service methods a client may call
+RPC_METHODS = {
+    "list",
+    "find",
+    "update",
+    "search",
+    "get_user_info",
+    "get_anime_details",
+    "flush",
+    "invalidate",
+    "ping",
+    "shutdown",
+}
+# commands using only what DaemonClient offers, the others log in
+COMMANDS = {
+    "search",
+    "list",
+    "filter",
+    "increase",
+    "decrease",
+    "drop",
+    "stats",
+    "history",
+    "watchtime",
+    "add",
+    "edit",
+    "recommend",
+    "airing",
+}
+
+
+def _response(r):
+    """Turn a requests.Response (or [] for no content) into a dict."""
+    if isinstance(r, list):
+        return {"status_code": 204, "json": {"data": []}}
+    try:
+        data = r.json()
+    except ValueError:
+        data = None
+    return {"status_code": r.status_code, "json": data}
+
+
+class Service(object):
+    """The calls the daemon answers, backed by a warm list index."""
+
+    def __init__(self, mal, ttl=LIST_TTL):
+        self.mal = mal
+        self.ttl = ttl
+        self._lists = dict()
+        self._index = (None, None)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._flush_forever, daemon=True).start()
+
+    def list(self, status="", limit=100, extra=False, category="anime"):
+        key = (status, limit, extra, category)
+        with self._lock:
+            cached = self._lists.get(key)
+            if cached and time.time() - cached[0] < self.ttl:
+                return cached[1]
+
+        result = self.mal.list(
+            status=status, limit=limit, extra=extra, category=category
+        )
+        with self._lock:
+            self._lists[key] = (time.time(), result)
+        return result
+
+    def find(
+        self,
+        regex,
+        status="",
+        limit=None,
+        extra=False,
+        category="anime",
+        fuzzy=False,
+    ):
+        items = self.list(
+            status=status, limit=limit, extra=extra, category=category
+        )
+        index = None
+        if fuzzy:
+            # the trigram index lives as long as the cached list
+            with self._lock:
+                indexed, index = self._index
+            if indexed is not items:
+                index = TrigramIndex(items.values())
+                with self._lock:
+                    self._index = (items, index)
+        return match(regex, list(items.values()), fuzzy=fuzzy, index=index)
+
+    def update(self, item_id, entry=None):
+        status_code = self.mal.update(item_id, dict(entry))
+        if status_code == 200:
+            self._patch_cache(int(item_id), entry)
+        return status_code
+
+    def _patch_cache(self, item_id, entry):
+        """Reflect a successful update in the cached lists."""
+        fields = {
+            "num_watched_episodes": "episode",
+            "num_chapters_read": "episode",
+            "status": "status",
+            "score": "score",
+            "tags": "tags",
+        }
+        with self._lock:
+            for key, (stamp, items) in list(self._lists.items()):
+                item = items.get(item_id)
+                if item is None:
+                    # new entries and status filters are easier refetched
+                    if entry.get("status"):
+                        del self._lists[key]
+                    continue
+                for field, name in fields.items():
+                    if field in entry:
+                        item[name] = entry[field]
+                if key[0] and item["status"] != key[0]:
+                    del self._lists[key]
+
+    def search(self, query, limit=20, category="anime"):
+        return _response(
+            self.mal.search(query, limit=limit, category=category)
+        )
+
+    def get_user_info(self):
+        return _response(self.mal.get_user_info())
+
+    def get_anime_details(self, _id, entry=None):
+        return _response(self.mal.get_anime_details(_id, entry=entry))
+
+    def flush(self):
+        """Send the write-behind queue, keeping the cached lists in sync."""
+        results = pending.flush(self)
+        return [
+            [queued, status_code, None if error is None else repr(error)]
+            for queued, status_code, error in results
+        ]
+
+    def _flush_forever(self, interval=FLUSH_INTERVAL):
+        while not self._stopped.wait(interval):
+            if pending.load():
+                self.flush()
+            catalogue.flush()
+
+    def invalidate(self):
+        with self._lock:
+            self._lists.clear()
+
+    def ping(self):
+        return "pong"
+
+    def shutdown(self):
+        self._stopped.set()
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+        return "bye"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            service = self.server.service
+            try:
+                request = json.loads(line.decode("utf-8"))
+                if request["method"] not in RPC_METHODS:
+                    raise AttributeError(request["method"])
+                method = getattr(service, request["method"])
+                result = method(
+                    *request.get("args", []), **request.get("kwargs", {})
+                )
+                reply = {"ok": True, "result": result}
+            except (Exception, SystemExit) as e:
+                reply = {"ok": False, "error": repr(e)}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _owned(path):
+    """Tell if a path belongs to the user and isn't a symlink."""
+    try:
+        info = os.lstat(str(path))
+    except FileNotFoundError:
+        return False
+    return info.st_uid == os.getuid() and not stat.S_ISLNK(info.st_mode)
+
+
+def _private_dir(path):
+    """Create a directory only the user can enter, or check it is one."""
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not _owned(path) or os.stat(str(path)).st_mode & 0o077:
+        print_error("DaemonError", "unsafe directory", str(path), kill=True)
+
+
+def serve(mal, path=SOCKET_PATH):
+    """
+    Run the daemon in the foreground until `mal daemon stop`.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        path: unix socket path to listen on.
+    """
+    _private_dir(path.parent)
+    if connect(path) is not None:
+        print_error("DaemonError", "already running", str(path), kill=True)
+    if path.exists():
+        path.unlink()  # stale socket from a killed daemon
+
+    # progress makes no sense without a terminal to draw on
+    progress.reporter.enabled = False
+    # nobody else may connect, not even before the chmod
+    umask = os.umask(0o077)
+    try:
+        server = _Server(str(path), _Handler)
+    finally:
+        os.umask(umask)
+    os.chmod(str(path), 0o600)
+    server.service = Service(mal)
+    server.service.server = server
+    print("listening on {}".format(path))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if path.exists():
+            path.unlink()
+
+
+class DaemonClient(object):
+    """Talks to a running daemon, mimicking the MyAnimeList interface."""
+
+    offline = False
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+        self._lock = threading.Lock()
+        self.date_format = setup.date_format()
+
+    def _call(self, method, *args, **kwargs):
+        request = {"method": method, "args": args, "kwargs": kwargs}
+        with self._lock:
+            self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+            self._file.flush()
+            reply = json.loads(self._file.readline().decode("utf-8"))
+        if not reply["ok"]:
+            print_error("DaemonError", method, reply["error"], kill=True)
+        return reply["result"]
+
+    def list(self, status="", limit=100, extra=False, category="anime"):
+        result = self._call("list", status, limit, extra, category)
+        return {int(k): v for k, v in result.items()}
+
+    def find(
+        self,
+        regex,
+        status="",
+        limit=None,
+        extra=False,
+        category="anime",
+        fuzzy=False,
+    ):
+        return self._call("find", regex, status, limit, extra, category, fuzzy)
+
+    def update(self, item_id, entry=None):
+        return self._call("update", item_id, entry)
+
+    def search(self, query, limit=20, category="anime"):
+        r = self._call("search", query, limit, category)
+        if r["status_code"] == 204:
+            return []
+        return Reply(r["status_code"], r["json"])
+
+    def get_user_info(self):
+        r = self._call("get_user_info")
+        return Reply(r["status_code"], r["json"])
+
+    def get_anime_details(self, _id, entry=None):
+        r = self._call("get_anime_details", _id, entry)
+        return Reply(r["status_code"], r["json"])
+
+    def ping(self):
+        return self._call("ping")
+
+    def stop(self):
+        return self._call("shutdown")
+
+
+def connect(path=SOCKET_PATH):
+    """
+    Connect to a running daemon.
+
+    Only a socket of the user, in a directory of the user, is trusted.
+
+    Returns:
+        DaemonClient instance or None if no daemon is listening.
+    """
+    if not (_owned(path.parent) and _owned(path)):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return DaemonClient(sock)
+
+
+def status(path=SOCKET_PATH):
+    """Print whether a daemon is running."""
+    client = connect(path)
+    if client is None:
+        print("daemon is not running")
+        sys.exit(1)
+    client.ping()
+    print("daemon is running on {}".format(path))
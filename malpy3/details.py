@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Cached anime/manga details.
+
+The list endpoint only gives a few fields per entry, anything richer needs
+one :meth:`MyAnimeList.get_anime_details` request per entry. Responses are
+kept on disk (one JSON file per entry) and the missing ones are fetched
+concurrently, so enriching a long listing costs about one round trip.
+"""
+
+# stdlib
+import os
+import json
+import time
+
+# self-package
+from malpy3 import setup
+from malpy3.pool import bounded_map
+from malpy3.utils import atomic_write
+
+DETAILS_PATH = setup.CACHE_PATH / "details"
+# seconds before cached details are fetched again
+TTL = 7 * 24 * 60 * 60
+# concurrent detail requests
+WORKERS = 8
+
+
+def _path(_id, category):
+    return DETAILS_PATH / category / "{}.json".format(_id)
+
+
+def get(_id, category="anime", ttl=TTL):
+    """
+    Read cached details of an entry.
+
+    Parameters:
+        _id: id of anime/manga.
+        category: Category of the entry: anime or manga.
+        ttl: maximum age in seconds (None for any age).
+
+    Returns:
+        Dictionary with the details or None if missing/expired.
+    """
+    try:
+        with _path(_id, category).open() as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if ttl is not None and time.time() - cached["fetched"] > ttl:
+        return None
+    return cached["data"]
+
+
+def cached_ids(category="anime"):
+    """
+    Ids with details in the cache (of any age).
+
+    Returns:
+        Set of ids.
+    """
+    try:
+        names = os.listdir(str(DETAILS_PATH / category))
+    except FileNotFoundError:
+        return set()
+    return {int(n[:-5]) for n in names if n.endswith(".json")}
+
+
+def put(_id, data, category="anime"):
+    """Store the details of an entry."""
+    cached = {"fetched": time.time(), "data": data}
+    atomic_write(_path(_id, category), json.dumps(cached))
+
+
+def fetch(mal, ids, category="anime", ttl=TTL, workers=WORKERS):
+    """
+    Get details of many entries, requesting only what isn't cached.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        ids: iterable of anime/manga ids.
+        category: Category of the entries: anime or manga.
+        ttl: maximum age in seconds of cached details.
+        workers: maximum number of concurrent requests.
+
+    Returns:
+        Dictionary of id -> details. Entries that couldn't be fetched
+        fall back to stale cached details or are left out.
+    """
+    result = dict()
+    missing = []
+    for _id in ids:
+        data = get(_id, category, ttl=ttl)
+        if data is None:
+            missing.append(_id)
+        else:
+            result[_id] = data
+
+    if missing and not mal.offline:
+        entry = {"media_type": category}
+        responses = bounded_map(
+            lambda _id: mal.get_anime_details(_id, entry=entry),
+            missing,
+            workers=workers,
+            label="fetching details",
+        )
+        for _id, r, error in responses:
+            if error is None and r.status_code == 200:
+                result[_id] = r.json()
+                put(_id, result[_id], category)
+
+    for _id in missing:
+        if _id not in result:
+            stale = get(_id, category, ttl=None)
+            if stale is not None:
+                result[_id] = stale
+
+    return result
+
+
+def hydrate(mal, items, category="anime"):
+    """
+    Add genres, mean score, studios and airing status to list entries.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        items: list of parsed anime/manga fields (see MyAnimeList.list).
+        category: Category of the entries: anime or manga.
+
+    Returns:
+        The same list, updated in place.
+    """
+    found = fetch(mal, [item["id"] for item in items], category)
+    for item in items:
+        data = found.get(item["id"])
+        if data is None:
+            continue
+        item.update(
+            {
+                "genres": [g["name"] for g in data.get("genres", [])],
+                "mean": data.get("mean"),
+                "studios": [s["name"] for s in data.get("studios", [])],
+                "airing_status": data.get("status"),
+            }
+        )
+    return items
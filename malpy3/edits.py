@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Editable state of list entries and the changes between two states.
+
+An entry's editable state is a small dictionary (status, score, progress,
+rewatching and tags). Edits are made on a copy of the state of the list
+as last fetched, and only the fields that differ are sent. The inverse
+of every change is kept so that applied changes can be reverted if others
+fail.
+
+Editor sessions show one TOML table per entry, keyed by id::
+
+    [5114]
+    title = "Fullmetal Alchemist: Brotherhood"
+    status = "completed"
+    score = 10
+    progress = 64
+    rewatching = false
+    tags = ["classic"]
+
+The title is only there for reference; changing it does nothing.
+"""
+
+# stdlib
+import os
+import subprocess
+import tempfile
+
+# 3rd party
+import toml
+
+# self-package
+from malpy3.stats import STATUSES
+
+FIELDS = ["status", "score", "progress", "rewatching", "tags"]
+
+# name of the fields in the PATCH payload, by category
+PAYLOAD_NAMES = {
+    "anime": {
+        "status": "status",
+        "score": "score",
+        "progress": "num_watched_episodes",
+        "rewatching": "is_rewatching",
+        "tags": "tags",
+    },
+    "manga": {
+        "status": "status",
+        "score": "score",
+        "progress": "num_chapters_read",
+        "rewatching": "is_rereading",
+        "tags": "tags",
+    },
+}
+
+
+class EditError(ValueError):
+    """The edited entries are not valid."""
+
+
+def parse_tags(value):
+    """Tags as a list, whatever form they were stored in."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        separator = "," if "," in value else None
+        return [tag.strip() for tag in value.split(separator) if tag.strip()]
+    return [str(tag) for tag in value]
+
+
+def state(item):
+    """
+    Editable state of a list entry.
+
+    Parameters:
+        item: parsed anime/manga fields (see MyAnimeList.list).
+
+    Returns:
+        Dictionary with the FIELDS.
+    """
+    return {
+        "status": item.get("status"),
+        "score": item.get("score") or 0,
+        "progress": item.get("episode") or 0,
+        "rewatching": bool(item.get("is_rewatching")),
+        "tags": parse_tags(item.get("tags")),
+    }
+
+
+def diff(before, after):
+    """
+    Fields changed between two states.
+
+    Returns:
+        Dictionary of field -> new value (empty when nothing changed).
+    """
+    return {
+        field: after[field]
+        for field in FIELDS
+        if field in after and after[field] != before.get(field)
+    }
+
+
+def _integer(value):
+    """Tell if a value is an integer (true/false are not)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate(changes, category="anime", total=None):
+    """
+    Check changed fields.
+
+    Parameters:
+        changes: Dictionary of field -> new value.
+        category: Category of the entry: anime or manga.
+        total: number of episodes/chapters of the entry (0 if unknown).
+
+    Returns:
+        List of error messages (empty when valid).
+    """
+    errors = []
+    for field in changes:
+        if field not in FIELDS:
+            errors.append("unknown field {!r}".format(field))
+    if "status" in changes and changes["status"] not in STATUSES[category]:
+        errors.append(
+            "status must be one of {}".format(", ".join(STATUSES[category]))
+        )
+    score = changes.get("score", 0)
+    if not _integer(score) or not 0 <= score <= 10:
+        errors.append("score must be an integer from 0 to 10")
+    progress = changes.get("progress", 0)
+    if not _integer(progress) or progress < 0:
+        errors.append("progress must be a positive integer")
+    elif total and progress > total:
+        errors.append("progress can't be over {}".format(total))
+    if not isinstance(changes.get("rewatching", False), bool):
+        errors.append("rewatching must be true or false")
+    tags = changes.get("tags", [])
+    if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+        errors.append("tags must be a list of strings")
+    return errors
+
+
+def payload(changes, category="anime"):
+    """
+    PATCH payload of changed fields.
+
+    Parameters:
+        changes: Dictionary of field -> new value.
+        category: Category of the entry: anime or manga.
+
+    Returns:
+        Dictionary to send with send_update (with media_type).
+    """
+    names = PAYLOAD_NAMES[category]
+    entry = dict()
+    for field, value in changes.items():
+        if field == "tags":
+            value = ",".join(value)
+        entry[names[field]] = value
+    entry["media_type"] = category
+    return entry
+
+
+def apply(item, changes):
+    """Update the parsed fields of an entry with changed fields."""
+    names = {"progress": "episode", "rewatching": "is_rewatching"}
+    for field, value in changes.items():
+        item[names.get(field, field)] = value
+    return item
+
+
+def dump(items):
+    """
+    Editor text for entries: one TOML table per entry.
+
+    Parameters:
+        items: list of parsed anime/manga fields.
+
+    Returns:
+        String.
+    """
+    blocks = [
+        "# change the fields below, save and quit the editor.\n"
+        "# entries left unchanged (or removed) are not updated.\n"
+    ]
+    for item in items:
+        table = {"title": item["title"]}
+        table.update(state(item))
+        blocks.append(toml.dumps({str(item["id"]): table}))
+    return "\n".join(blocks)
+
+
+def parse(text):
+    """
+    Read back entries edited in the editor.
+
+    Returns:
+        Dictionary of id -> edited fields (title excluded).
+    """
+    try:
+        tables = toml.loads(text)
+    except toml.TomlDecodeError as e:
+        raise EditError("can't parse the file: {}".format(e))
+
+    edited = dict()
+    for key, table in tables.items():
+        try:
+            _id = int(key)
+        except ValueError:
+            raise EditError("[{}] isn't an entry id".format(key))
+        if not isinstance(table, dict):
+            raise EditError("[{}] must be a table".format(key))
+        table.pop("title", None)
+        edited[_id] = table
+    return edited
+
+
+def open_editor(text):
+    """
+    Let the user edit text with $EDITOR.
+
+    Returns:
+        The text after edition.
+    """
+    editor = os.environ.get("EDITOR", "/usr/bin/vi")
+    fd, tmp_path = tempfile.mkstemp(prefix="mal_", suffix=".toml")
+    try:
+        with os.fdopen(fd, "w") as tmp:
+            tmp.write(text)
+        subprocess.call([editor, tmp_path])
+        with open(tmp_path) as tmp:
+            return tmp.read()
+    finally:
+        os.remove(tmp_path)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Fuzzy title matching.
+
+Titles (and alternative titles) are split into character trigrams and kept
+in an inverted index, so a query is scored against every title of the list
+by counting shared trigrams instead of comparing strings one by one. A typo
+like ``mal inc "shingeki no kyojim"`` still finds the right entry.
+"""
+
+# stdlib
+import re
+from collections import Counter, defaultdict
+
+# results below this similarity are not considered a match
+MIN_SCORE = 0.3
+# the best result is picked without asking when it scores at least
+# DOMINANT_SCORE and beats the second one by DOMINANT_GAP
+DOMINANT_SCORE = 0.5
+DOMINANT_GAP = 0.2
+
+_non_word = re.compile(r"[\W_]+")
+
+
+def trigrams(text):
+    """
+    Split a text into a set of character trigrams.
+
+    Parameters:
+        text: string to split.
+
+    Returns:
+        Set of strings.
+    """
+    grams = set()
+    for word in _non_word.sub(" ", text.lower()).split():
+        word = "  {} ".format(word)
+        grams.update(word[i : i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def entry_titles(entry):
+    """Title followed by the alternative titles of an entry."""
+    return [entry.get("title") or ""] + list(
+        entry.get("alternative_titles") or []
+    )
+
+
+def similarity(query, entry):
+    """
+    Similarity between a query and the closest title of an entry.
+
+    Returns:
+        Dice coefficient of the trigram sets, from 0 to 1.
+    """
+    grams = trigrams(query)
+    best = 0.0
+    for title in entry_titles(entry):
+        other = trigrams(title)
+        if grams or other:
+            score = 2.0 * len(grams & other) / (len(grams) + len(other))
+            best = max(best, score)
+    return best
+
+
+class TrigramIndex(object):
+    """Inverted trigram index over the titles of a list of entries."""
+
+    def __init__(self, entries):
+        """
+        Parameters:
+            entries: list of parsed anime/manga fields.
+        """
+        self.entries = list(entries)
+        self._postings = defaultdict(list)
+        self._sizes = dict()
+        for i, entry in enumerate(self.entries):
+            for j, title in enumerate(entry_titles(entry)):
+                grams = trigrams(title)
+                self._sizes[i, j] = len(grams)
+                for gram in grams:
+                    self._postings[gram].append((i, j))
+
+    def search(self, query, min_score=MIN_SCORE):
+        """
+        Rank entries by similarity of their best title with `query`.
+
+        Parameters:
+            query: text to look for.
+            min_score: minimum similarity (0 to 1) to keep a result.
+
+        Returns:
+            List of (score, entry) sorted from best to worst.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        best = dict()
+        for (i, j), count in shared.items():
+            # Dice coefficient between the two trigram sets
+            score = 2.0 * count / (len(grams) + self._sizes[i, j])
+            if score > best.get(i, 0):
+                best[i] = score
+
+        ranked = [
+            (score, self.entries[i])
+            for i, score in best.items()
+            if score >= min_score
+        ]
+        ranked.sort(key=lambda r: r[0], reverse=True)
+        return ranked
+
+
+def match(regex, entries, fuzzy=False, index=None):
+    """
+    Filter entries by title regex, falling back to fuzzy matching.
+
+    Parameters:
+        regex: regex to filter anime/manga titles.
+        entries: list of parsed anime/manga fields.
+        fuzzy: match the alternative titles too, rank the matches by
+            similarity and, when the regex matches nothing, return the
+            closest titles instead.
+        index: TrigramIndex of `entries` (built if not given).
+
+    Returns:
+        List of parsed anime/manga fields. With `fuzzy` they carry a
+        "match_score" and are sorted from best to worst.
+    """
+    pattern = re.compile(regex, re.I)
+    if not fuzzy:
+        return [e for e in entries if pattern.search(e["title"])]
+
+    hits = [
+        e for e in entries if any(pattern.search(t) for t in entry_titles(e))
+    ]
+
+    if hits:
+        # few candidates left, score them directly
+        ranked = [(similarity(regex, e), e) for e in hits]
+        ranked.sort(key=lambda r: r[0], reverse=True)
+    else:
+        if index is None:
+            index = TrigramIndex(entries)
+        ranked = index.search(regex)
+
+    result = []
+    for score, entry in ranked:
+        entry = dict(entry)
+        entry["match_score"] = round(score, 3)
+        result.append(entry)
+    return result
+
+
+def dominant(items):
+    """
+    Tell if the first of a ranked list clearly is the wanted one.
+
+    Parameters:
+        items: list returned by match with fuzzy=True.
+
+    Returns:
+        Boolean.
+    """
+    if not items or "match_score" not in items[0]:
+        return False
+    top = items[0]["match_score"]
+    second = items[1]["match_score"] if len(items) > 1 else 0
+    return top >= DOMINANT_SCORE and top - second >= DOMINANT_GAP
@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Append-only history of the changes made to the lists.
+
+Every change of an entry's editable fields (see :mod:`malpy3.edits`) is
+appended as one JSON line to ``history/<category>/journal.jsonl``::
+
+    {"seq": 42, "at": "2024-05-01T21:03:11+0200", "id": 5114,
+     "title": "Fullmetal Alchemist: Brotherhood",
+     "before": {"progress": 10}, "after": {"progress": 11}}
+
+Updates sent with ``MyAnimeList.update`` are recorded once MAL accepts
+them, and every list download records what changed since (on the website
+or another device), the first download recording the whole list.
+
+Every ``SNAPSHOT_EVERY`` records, the state of the whole list is saved
+with the offset of the next record in the journal. The state at a given
+time is the latest snapshot taken before it plus the few records that
+follow, so ``mal stats --as-of`` never replays the whole journal.
+:meth:`Journal.compact` merges the old records of an entry made the same
+day into one and rebuilds the snapshots.
+"""
+
+# stdlib
+import re
+import json
+from itertools import chain
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# self-package
+from malpy3 import edits
+from malpy3 import setup
+from malpy3 import snapshot
+from malpy3.utils import atomic_write, file_lock
+
+HISTORY_PATH = setup.DATA_PATH / "history"
+# records between two snapshots
+SNAPSHOT_EVERY = 200
+# records older than this are merged per entry and day by compact()
+KEEP_DAYS = 90
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+
+def _now():
+    return datetime.now(timezone.utc).astimezone()
+
+
+def parse_time(text):
+    """Time of a record."""
+    return datetime.strptime(text, TIME_FORMAT)
+
+
+def parse_date(text, date_format="%Y-%m-%d"):
+    """
+    Read a date given by the user, as the end of that day.
+
+    Parameters:
+        text: date like "2024-05-01", "2024-05-01 18:00" or in the
+            configured date format.
+        date_format: the configured date format.
+
+    Returns:
+        Timezone aware datetime.
+    """
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d", date_format):
+        try:
+            moment = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if "%H" not in fmt:
+            moment = moment.replace(hour=23, minute=59, second=59)
+        return moment.astimezone()
+    raise ValueError("can't read the date {!r}".format(text))
+
+
+def fields_of(entry):
+    """
+    Journaled fields of a parsed list entry.
+
+    Tags are left out when the entry was fetched without them.
+    """
+    fields = edits.state(entry)
+    if "tags" not in entry:
+        fields.pop("tags")
+    return fields
+
+
+def _apply(entries, record):
+    entry = entries.setdefault(record["id"], dict())
+    entry.update(record["after"])
+    if record.get("title"):
+        entry["title"] = record["title"]
+
+
+def _merge(group):
+    """One record equivalent to consecutive records of an entry."""
+    merged = dict(group[-1])
+    before = dict()
+    after = dict()
+    for record in group:
+        for field, value in record["after"].items():
+            if field not in after and field in record["before"]:
+                before[field] = record["before"][field]
+            after[field] = value
+    merged["before"] = before
+    merged["after"] = {
+        field: value
+        for field, value in after.items()
+        if field not in before or before[field] != value
+    }
+    merged["title"] = next(
+        (r["title"] for r in reversed(group) if r.get("title")), None
+    )
+    return merged
+
+
+class Journal(object):
+    """The journal and snapshots of one category."""
+
+    def __init__(self, category="anime", root=None):
+        self.category = category
+        self.root = Path(root or HISTORY_PATH) / category
+        self.path = self.root / "journal.jsonl"
+        self.index_path = self.root / "index.json"
+        self.snapshots = self.root / "snapshots"
+
+    def _index(self):
+        """Snapshots taken, oldest first: [{seq, at, offset, file}]."""
+        try:
+            with self.index_path.open() as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _load_snapshot(self, info):
+        with (self.snapshots / info["file"]).open() as f:
+            data = json.load(f)
+        return {int(k): v for k, v in data["entries"].items()}
+
+    def _write_snapshot(self, entries, record, offset, index):
+        info = {
+            "seq": record["seq"],
+            "at": record["at"],
+            "offset": offset,
+            "file": "{:08d}.json".format(record["seq"]),
+        }
+        data = dict(info, entries=entries)
+        atomic_write(self.snapshots / info["file"], json.dumps(data))
+        index.append(info)
+        atomic_write(self.index_path, json.dumps(index, indent=1))
+
+    def records(self, offset=0, until=None):
+        """
+        Read records from the journal.
+
+        Parameters:
+            offset: byte offset to start from.
+            until: stop at the first record made after this datetime.
+
+        Yields:
+            (record, offset of the next record) tuples.
+        """
+        try:
+            f = self.path.open("rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return  # interrupted write
+                record = json.loads(line.decode("utf-8"))
+                if until is not None and parse_time(record["at"]) > until:
+                    return
+                offset += len(line)
+                yield record, offset
+
+    def state(self, until=None):
+        """
+        State of the list, replayed from the nearest snapshot.
+
+        Parameters:
+            until: datetime to get the state at (None for now).
+
+        Returns:
+            (entries, seq, offset) where entries is a dictionary of
+            id -> {"title", status, score...}, seq the number of the last
+            record applied and offset where the next one starts.
+        """
+        index = self._index()
+        if until is not None:
+            times = [parse_time(info["at"]) for info in index]
+            index = index[: bisect_right(times, until)]
+
+        entries, seq, offset = dict(), 0, 0
+        if index:
+            entries = self._load_snapshot(index[-1])
+            seq, offset = index[-1]["seq"], index[-1]["offset"]
+        for record, offset in self.records(offset, until):
+            _apply(entries, record)
+            seq = record["seq"]
+        return entries, seq, offset
+
+    def first(self):
+        """Time of the first record, None when nothing was recorded."""
+        for record, _ in self.records():
+            return parse_time(record["at"])
+        return None
+
+    def record(self, changes, baseline=None):
+        """
+        Append the changes of entries that differ from their known state.
+
+        Parameters:
+            changes: iterable of (id, title or None, fields) tuples.
+            baseline: function giving the parsed list entry of an id
+                unknown to the journal (or None), recorded first so the
+                change has a "before".
+
+        Returns:
+            List of the records written.
+        """
+        written = []
+        with file_lock(self.path):
+            entries, seq, offset = self.state()
+            index = self._index()
+            last_snapshot = index[-1]["seq"] if index else 0
+            at = _now().strftime(TIME_FORMAT)
+
+            def append(item_id, title, fields):
+                known = entries.get(item_id, dict())
+                after = edits.diff(known, fields)
+                if not after:
+                    return
+                record = {
+                    "seq": seq + len(written) + 1,
+                    "at": at,
+                    "id": item_id,
+                    "title": title or known.get("title"),
+                    "before": {f: known[f] for f in after if f in known},
+                    "after": after,
+                }
+                _apply(entries, record)
+                written.append(record)
+
+            for item_id, title, fields in changes:
+                if item_id not in entries and baseline is not None:
+                    entry = baseline(item_id)
+                    if entry:
+                        append(item_id, entry.get("title"), fields_of(entry))
+                append(item_id, title, fields)
+            if not written:
+                return written
+
+            data = "".join(
+                json.dumps(record, sort_keys=True) + "\n" for record in written
+            ).encode("utf-8")
+            self.root.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                if f.tell() != offset:
+                    f.truncate(offset)  # drop an interrupted write
+                f.write(data)
+            if written[-1]["seq"] - last_snapshot >= SNAPSHOT_EVERY:
+                self._write_snapshot(
+                    entries, written[-1], offset + len(data), index
+                )
+        return written
+
+    def history(self, regex=None, ids=None):
+        """
+        Records of the entries whose title match a regex or with an id.
+
+        The whole journal is read: an entry's history can start anywhere.
+
+        Returns:
+            List of records, oldest first.
+        """
+        pattern = re.compile(regex, re.I) if regex else None
+        ids = set(ids or ())
+        titles = dict()
+        found = []
+        for record, _ in self.records():
+            if record.get("title"):
+                titles[record["id"]] = record["title"]
+            if record["id"] not in ids:
+                title = titles.get(record["id"])
+                if not (pattern and title and pattern.search(title)):
+                    continue
+                ids.add(record["id"])
+            found.append(record)
+        return found
+
+    def compact(self, keep_days=KEEP_DAYS):
+        """
+        Merge old records and rebuild the snapshots.
+
+        Records older than `keep_days` are merged per entry and day,
+        changes cancelling out are dropped.
+
+        Returns:
+            (records before, records after) tuple.
+        """
+        cutoff = _now() - timedelta(days=keep_days)
+        with file_lock(self.path):
+            records = [record for record, _ in self.records()]
+            groups = dict()
+            for record in records:
+                moment = parse_time(record["at"])
+                if moment < cutoff:
+                    key = (record["id"], moment.date())
+                    groups.setdefault(key, []).append(record)
+            # a merged record takes the place of the last one it merges
+            last = {id(group[-1]): group for group in groups.values()}
+            merged = set(map(id, chain(*groups.values())))
+
+            compacted = []
+            for record in records:
+                if id(record) in last:
+                    record = _merge(last[id(record)])
+                    if not record["after"]:
+                        continue
+                elif id(record) in merged:
+                    continue
+                compacted.append(dict(record, seq=len(compacted) + 1))
+
+            for path in self.snapshots.glob("*.json"):
+                path.unlink()
+            atomic_write(self.index_path, "[]")
+            lines = [json.dumps(r, sort_keys=True) + "\n" for r in compacted]
+            atomic_write(self.path, "".join(lines))
+
+            entries, index, offset = dict(), [], 0
+            for record, line in zip(compacted, lines):
+                _apply(entries, record)
+                offset += len(line.encode("utf-8"))
+                if record["seq"] % SNAPSHOT_EVERY == 0:
+                    self._write_snapshot(entries, record, offset, index)
+        return len(records), len(compacted)
+
+
+def record_update(item_id, payload, category="anime"):
+    """
+    Record an update accepted by MAL.
+
+    Parameters:
+        item_id: id of anime/manga.
+        payload: fields sent in the PATCH (see edits.payload).
+        category: Category of the entry: anime or manga.
+
+    Returns:
+        List of the records written.
+    """
+    names = {v: k for k, v in edits.PAYLOAD_NAMES[category].items()}
+    fields = {
+        names[name]: value for name, value in payload.items() if name in names
+    }
+    if "tags" in fields:
+        fields["tags"] = edits.parse_tags(fields["tags"])
+    if not fields:
+        return []
+
+    return Journal(category).record(
+        [(int(item_id), None, fields)],
+        baseline=lambda item_id: snapshot.load(category).get(item_id),
+    )
+
+
+def observe(entries, category="anime"):
+    """
+    Record what changed in downloaded list entries since last seen.
+
+    Parameters:
+        entries: iterable of parsed anime/manga fields.
+        category: Category of the entries: anime or manga.
+
+    Returns:
+        List of the records written.
+    """
+    return Journal(category).record(
+        (entry["id"], entry.get("title"), fields_of(entry))
+        for entry in entries
+    )
+
+
+def entries_at(moment, category="anime", current=None):
+    """
+    The list as it was at some time.
+
+    Parameters:
+        moment: timezone aware datetime.
+        category: Category of the list: anime or manga.
+        current: current list entries, to fill the fields not journaled
+            (total episodes, dates...).
+
+    Returns:
+        Dictionary of id -> parsed anime/manga fields.
+    """
+    state, _, _ = Journal(category).state(until=moment)
+    current = current or dict()
+    entries = dict()
+    for item_id, fields in state.items():
+        entry = dict(current.get(item_id) or {"id": item_id})
+        changes = {f: v for f, v in fields.items() if f in edits.FIELDS}
+        edits.apply(entry, changes)
+        entry.setdefault("title", fields.get("title"))
+        entries[item_id] = entry
+    return entries
@@ -3,12 +3,8 @@
 #
 
 # stdlib
-from os import makedirs
 from getpass import getpass
 
-# 3rd party
-import toml
-
 # self-package
 from malpy3.api import MyAnimeList
 from malpy3 import color
@@ -32,10 +28,6 @@ def create_credentials():
     print(login_header)
 
     config = setup.get_config()
-    if not config["config"]["animation"]:
-        config["config"]["animation"] = "True"
-    elif not config["config"]["date_format"]:
-        config["config"]["date_format"] = "%Y-%m-%d"
 
     username = input("Username: ")
     password = getpass()
@@ -46,9 +38,11 @@ def create_credentials():
 
     # confirm that account credentials are correct by trying to log in
     if MyAnimeList.login(config):
-        # account is ok, create a config file
-        toml.dump(config, setup.CONFIG_PATH.open("w"))
-        print(successful, "saved in {}".format(setup.CONFIG_PATH))
+        # account is ok, keep the tokens for the next runs
+        setup.save_tokens(
+            config["login"]["access_token"], config["login"]["refresh_token"]
+        )
+        print(successful, "saved in {}".format(setup.TOKENS_PATH))
     else:
         print(invalid)
         config = create_credentials()
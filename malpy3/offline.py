@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Working without a connection to MAL.
+
+:class:`OfflineMyAnimeList` answers reads from the local copy of the list
+(:mod:`malpy3.snapshot`) and journals every update in the write-behind
+queue (:mod:`malpy3.pending`) together with the ``updated_at`` of the
+entry it was based on. Once MAL is reachable again the journal is replayed
+and entries changed on the server in the meantime are reported as
+conflicts instead of being overwritten.
+"""
+
+# self-package
+from malpy3.api import MyAnimeList, Reply
+from malpy3.fuzzy import match as fuzzy_match
+from malpy3.utils import checked_regex, print_error
+from malpy3 import catalogue
+from malpy3 import snapshot
+
+
+class OfflineMyAnimeList(MyAnimeList):
+    """MyAnimeList look-alike backed by the local list copy."""
+
+    offline = True
+
+    @classmethod
+    def login(cls, config):
+        """Create an instance without contacting MAL."""
+        return cls(
+            config["login"]["access_token"],
+            config["login"]["refresh_token"],
+            config["config"]["date_format"],
+        )
+
+    def list(self, status="", limit=100, extra=False, category="anime"):
+        """
+        Get Anime and Manga from the local copy of the list.
+
+        Parameters:
+            status: status to filter results
+            limit: Number of returned results.
+            extra: Extra anime/manga information.
+            category: Category to search in: Anime or Manga.
+
+        Returns:
+            Dictionary of parsed anime/manga fields.
+        """
+        result = dict()
+        for entry_id, entry in snapshot.load(category).items():
+            if status and entry.get("status") != status:
+                continue
+            result[entry_id] = self._with_defaults(entry, extra)
+            if limit and len(result) >= int(limit):
+                break
+        return result
+
+    @staticmethod
+    def _with_defaults(entry, extra=False):
+        """Fill the fields a list request would have given."""
+        if extra:
+            entry.setdefault("start_date", "NA")
+            entry.setdefault("end_date", "NA")
+            entry.setdefault("tags", None)
+        return entry
+
+    @checked_regex
+    def find(
+        self,
+        regex,
+        status="",
+        limit=None,
+        extra=False,
+        category="anime",
+        fuzzy=False,
+    ):
+        """
+        Get anime/manga from the local copy of the list.
+
+        Only the entries matching the regex are read (see snapshot.find),
+        the whole list is only needed for a fuzzy search matching nothing.
+
+        Parameters:
+            regex: regex to filter anime/manga titles.
+            status: status to filter results.
+            limit: Number of returned results.
+            extra: Extra anime/manga information.
+            category: Category to search in: Anime or Manga.
+            fuzzy: rank matches and fall back to the closest titles.
+
+        Returns:
+            List of parsed anime/manga fields.
+        """
+        hits = snapshot.find(
+            regex, category, status, limit, alternatives=fuzzy
+        )
+        if not hits and fuzzy:
+            return super().find(
+                regex, status, limit, extra, category, fuzzy=True
+            )
+        hits = [self._with_defaults(entry, extra) for entry in hits]
+        return fuzzy_match(regex, hits, fuzzy=True) if fuzzy else hits
+
+    @checked_regex
+    def query(self, regex, where, category="anime"):
+        """
+        Get anime/manga matching a regex and a filter.
+
+        The filter is run by the storage (see snapshot.query) and the
+        regex over what it returns.
+
+        Parameters:
+            regex: regex to filter anime/manga titles.
+            where: malpy3.query.Query instance.
+            category: Category to search in: Anime or Manga.
+
+        Returns:
+            List of parsed anime/manga fields, with the extra ones.
+        """
+        hits = fuzzy_match(regex, snapshot.query(where, category))
+        return [self._with_defaults(entry, extra=True) for entry in hits]
+
+    def update(self, item_id, entry=None):
+        """Nothing can be sent, core journals updates for offline use."""
+        return self._unavailable("update")
+
+    def search(self, query, limit=20, category="anime"):
+        """Search the local catalogue instead of MAL."""
+        found = catalogue.search(query, category=category, limit=limit)
+        return Reply(200, {"data": [{"node": e} for e in found]})
+
+    def get_user_info(self):
+        return self._unavailable("stats")
+
+    def get_anime_details(self, _id, entry=None):
+        return self._unavailable("details")
+
+    def _unavailable(self, what):
+        print_error("OfflineError", what, "MAL can't be reached", kill=True)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Write-behind queue for list updates.
+
+With ``write_behind = true`` in the config, ``mal inc``/``drop``/``edit``
+don't send a PATCH right away. The change is stored in a small JSON file
+instead, merged with any change already waiting for the same entry:
+fields are last-write-wins and episode/chapter increments are summed.
+``mal flush`` (or a running ``mal daemon``) sends everything later.
+"""
+
+# stdlib
+import json
+
+# self-package
+from malpy3 import setup
+from malpy3.pool import bounded_map
+from malpy3.utils import atomic_write, file_lock
+
+PENDING_PATH = setup.DATA_PATH / "pending.json"
+
+# payload field holding the progress of each category
+PROGRESS_FIELDS = {
+    "anime": "num_watched_episodes",
+    "manga": "num_chapters_read",
+}
+
+
+def enabled():
+    """Tell if updates should be queued instead of sent."""
+    return bool(setup.get_config()["config"].get("write_behind"))
+
+
+def _key(item_id, media_type):
+    category = "manga" if media_type == "manga" else "anime"
+    return "{}:{}".format(category, item_id)
+
+
+def load(path=PENDING_PATH):
+    """
+    Read the queued updates.
+
+    Returns:
+        Dictionary of "category:id" -> queued update.
+    """
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict()
+
+
+def _save(queue, path=PENDING_PATH):
+    atomic_write(path, json.dumps(queue, indent=1, sort_keys=True))
+
+
+def untried(path=PENDING_PATH):
+    """Tell if some queued update was never sent (see flush)."""
+    return any(not queued.get("tried") for queued in load(path).values())
+
+
+def enqueue(
+    item_id, entry, delta=0, base=None, version=None, path=PENDING_PATH
+):
+    """
+    Queue an update, coalescing it with a pending one for the same entry.
+
+    Parameters:
+        item_id: id of anime/manga.
+        entry: dict object to patch/update (with media_type).
+        delta: episodes/chapters increment, summed with queued ones.
+        base: episodes/chapters on the server when `delta` applies.
+        version: updated_at of the entry the change is based on.
+
+    Returns:
+        The merged queued update.
+    """
+    entry = dict(entry)
+    media_type = entry.pop("media_type", "anime")
+    category = "manga" if media_type == "manga" else "anime"
+    key = _key(item_id, media_type)
+
+    with file_lock(path):
+        queue = load(path)
+        queued = queue.setdefault(
+            key,
+            {
+                "id": int(item_id),
+                "category": category,
+                "fields": dict(),
+                "delta": 0,
+                "base": None,
+                "version": version,
+            },
+        )
+        if delta:
+            # the progress is computed from base + delta when flushing
+            entry.pop(PROGRESS_FIELDS[category], None)
+            if queued["base"] is None:
+                queued["base"] = base
+            queued["delta"] += delta
+        elif PROGRESS_FIELDS[category] in entry:
+            # an absolute value replaces any increment
+            queued["delta"] = 0
+            queued["base"] = None
+
+        queued["fields"].update(entry)
+        # a new change is worth another automatic replay
+        queued["tried"] = False
+        _save(queue, path)
+
+    return queued
+
+
+def payload(queued):
+    """Build the PATCH payload of a queued update."""
+    entry = dict(queued["fields"])
+    if queued["delta"] and queued["base"] is not None:
+        entry[PROGRESS_FIELDS[queued["category"]]] = (
+            queued["base"] + queued["delta"]
+        )
+    entry["media_type"] = queued["category"]
+    return entry
+
+
+def overlay(items, category="anime", path=PENDING_PATH):
+    """
+    Apply queued changes to entries fetched from the server in place.
+
+    Parameters:
+        items: list of parsed anime/manga fields (see MyAnimeList.list).
+        category: Category of the entries: anime or manga.
+
+    Returns:
+        The same list.
+    """
+    queue = load(path)
+    if not queue:
+        return items
+
+    progress = PROGRESS_FIELDS[category]
+    for item in items:
+        queued = queue.get(_key(item["id"], category))
+        if queued is None:
+            continue
+        entry = payload(queued)
+        if progress in entry:
+            item["episode"] = entry[progress]
+        for field in ("status", "score", "tags"):
+            if field in entry:
+                item[field] = entry[field]
+        for field in ("is_rewatching", "is_rereading"):
+            if field in entry:
+                item["is_rewatching"] = entry[field]
+    return items
+
+
+class Conflict(Exception):
+    """The entry changed on the server after the update was queued."""
+
+
+def conflicts(mal, queue):
+    """
+    Find queued updates whose entry was modified on the server since.
+
+    The whole list of each category is fetched (page by page), comparing
+    the server's updated_at with the version the update was based on.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        queue: Dictionary of queued updates (see load).
+
+    Returns:
+        Set of queue keys in conflict.
+    """
+    found = set()
+    for category in {q["category"] for q in queue.values() if q["version"]}:
+        server = mal.list(limit=None, category=category)
+        for key, queued in queue.items():
+            if queued["category"] != category or not queued["version"]:
+                continue
+            current = server.get(queued["id"])
+            if current and current.get("updated_at") != queued["version"]:
+                found.add(key)
+    return found
+
+
+def flush(mal, workers=4, force=False, path=PENDING_PATH):
+    """
+    Send all queued updates.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        workers: maximum number of concurrent requests.
+        force: send updates even if they conflict with the server.
+
+    Returns:
+        List of (queued update, status code or None, error) tuples.
+        Conflicting updates stay queued with a Conflict error, the
+        updates that failed are marked as tried.
+    """
+    queue = load(path)
+    if not queue:
+        return []
+    in_conflict = set() if force else conflicts(mal, queue)
+
+    def send(queued):
+        if _key(queued["id"], queued["category"]) in in_conflict:
+            raise Conflict("changed on MAL since it was queued")
+        return mal.update(queued["id"], payload(queued))
+
+    results = bounded_map(
+        send, queue.values(), workers=workers, label="flushing updates"
+    )
+
+    # drop what was sent, unless it changed again while sending
+    with file_lock(path):
+        current = load(path)
+        for queued, status_code, error in results:
+            key = _key(queued["id"], queued["category"])
+            if current.get(key) != queued:
+                continue
+            if error is None and status_code == 200:
+                current.pop(key)
+            else:
+                current[key]["tried"] = True
+        _save(current, path)
+
+    return results
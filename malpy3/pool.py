@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Helpers to send many API requests at once without flooding MAL."""
+
+# stdlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# self-package
+from malpy3 import progress
+
+# how many requests may be in flight at the same time
+MAX_WORKERS = 4
+# requests per second allowed, with short bursts up to BURST
+RATE = 10
+BURST = 20
+
+
+class RateLimiter(object):
+    """Token bucket shared by every thread sending requests."""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+# one bucket per process, so separate pools don't add up
+limiter = RateLimiter()
+
+
+def bounded_map(
+    func, items, workers=MAX_WORKERS, rate_limiter=limiter, label=None
+):
+    """
+    Call `func` on every item using a bounded thread pool.
+
+    Parameters:
+        func: function taking a single item.
+        items: iterable of items.
+        workers: maximum number of concurrent calls.
+        rate_limiter: RateLimiter to respect (None to disable).
+        label: report the calls as a progress task with this label.
+
+    Returns:
+        List of (item, result, error) tuples in the same order as `items`.
+        Exactly one of result/error is meaningful.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    task = progress.task(label, total=len(items)) if label else None
+
+    def call(item):
+        try:
+            if rate_limiter is not None:
+                rate_limiter.wait()
+            result = item, func(item), None
+        except (Exception, SystemExit) as error:
+            # checked_* decorators exit on failure, keep the others going
+            result = item, None, error
+        if task is not None:
+            task.advance(failed=result[2] is not None)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+            return list(pool.map(call, items))
+    finally:
+        if task is not None:
+            progress.reporter.finish(task)
+
+
+def prefetch(iterable):
+    """
+    Iterate while the next item is computed in a background thread.
+
+    Used to fetch the next page of results while the current one is
+    shown. Exceptions are raised when the failing item is reached.
+
+    Parameters:
+        iterable: iterable whose items are slow to get (e.g. requests).
+
+    Yields:
+        The items of `iterable`.
+    """
+    iterator = iter(iterable)
+    done = object()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(next, iterator, done)
+        while True:
+            item = future.result()
+            if item is done:
+                return
+            future = pool.submit(next, iterator, done)
+            yield item
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Progress reporting, kept off the request path.
+
+Code doing work only opens a :class:`Task` and bumps its counters, which
+takes a lock for a few instructions and never touches the terminal. A
+single background thread redraws one status line (spinner, items done,
+items/sec, ETA) every ``INTERVAL`` seconds while any task is open, and
+clears it as soon as the last task ends, so the line is gone before
+errors or results are printed. Nested tasks (a request made while
+fetching a batch) only count: the line describes the outermost task.
+
+Nothing is drawn when stdout/stderr aren't terminals or with
+``animation = false`` in the config.
+"""
+
+# stdlib
+import sys
+import time
+import threading
+from functools import wraps
+
+# self-package
+from malpy3 import color
+
+SPINNER = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+# seconds between redraws
+INTERVAL = 0.1
+# don't draw tasks finishing faster than this, to avoid flicker
+DELAY = 0.2
+
+
+def is_tty():
+    """Tell if progress can be drawn (stdout and stderr are terminals)."""
+    return sys.stdout.isatty() and sys.stderr.isatty()
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return "{}s".format(seconds)
+    if seconds < 3600:
+        return "{}m{:02d}s".format(*divmod(seconds, 60))
+    return "{}h{:02d}m".format(seconds // 3600, seconds % 3600 // 60)
+
+
+class Task(object):
+    """Counters of one operation, see Reporter.task."""
+
+    def __init__(self, reporter, label, total=None):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._reporter = reporter
+
+    def advance(self, n=1, failed=False):
+        """Count `n` more items done (and failed)."""
+        with self._reporter.lock:
+            self.done += n
+            if failed:
+                self.failed += n
+
+    def rate(self):
+        """Items done per second."""
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Seconds left, None when unknown."""
+        rate = self.rate()
+        if not self.total or not rate:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    def describe(self, frame=0):
+        """One line describing the task."""
+        spinner = SPINNER[frame % len(SPINNER)]
+        parts = [color.colorize(spinner, "cyan"), self.label]
+        if self.total is not None or self.done:
+            count = str(self.done)
+            if self.total is not None:
+                count += "/{}".format(self.total)
+            parts.append(count)
+            parts.append("· {:.1f}/s".format(self.rate()))
+            eta = self.eta()
+            if eta is not None:
+                parts.append("· ETA {}".format(_duration(eta)))
+        else:
+            elapsed = time.monotonic() - self.started
+            parts.append("({})".format(_duration(elapsed)))
+        if self.failed:
+            parts.append(
+                color.colorize("· {} failed".format(self.failed), "red")
+            )
+        return " ".join(parts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._reporter.finish(self)
+
+
+class Reporter(object):
+    """Draws the open tasks on a single status line."""
+
+    def __init__(self, stream=None, enabled=None):
+        self.stream = stream or sys.stderr
+        self.enabled = is_tty() if enabled is None else enabled
+        self.lock = threading.RLock()
+        self.tasks = []
+        self._thread = None
+        self._frame = 0
+        self._drawn = False
+
+    def task(self, label, total=None):
+        """
+        Open a task, to be used as a context manager.
+
+        Parameters:
+            label: what is being done.
+            total: number of items to do (None if unknown).
+
+        Returns:
+            Task instance.
+        """
+        task = Task(self, label, total)
+        with self.lock:
+            self.tasks.append(task)
+            if self.enabled and self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return task
+
+    def finish(self, task):
+        """Close a task, clearing the line when it was the last one."""
+        with self.lock:
+            if task in self.tasks:
+                self.tasks.remove(task)
+            if not self.tasks:
+                self.clear()
+
+    def clear(self):
+        """Erase the status line."""
+        with self.lock:
+            if self._drawn:
+                self.stream.write("\r\x1b[K")
+                self.stream.flush()
+                self._drawn = False
+
+    def _run(self):
+        while True:
+            time.sleep(INTERVAL)
+            with self.lock:
+                if not self.tasks or not self.enabled:
+                    self.clear()
+                    self._thread = None
+                    return
+                task = self.tasks[0]
+                if time.monotonic() - task.started < DELAY:
+                    continue
+                self._frame += 1
+                self.stream.write("\r\x1b[K" + task.describe(self._frame))
+                self.stream.flush()
+                self._drawn = True
+
+
+# one status line per process
+reporter = Reporter()
+
+
+def task(label, total=None):
+    """Open a task on the process reporter (see Reporter.task)."""
+    return reporter.task(label, total)
+
+
+def echo(*args, **kwargs):
+    """print() without mixing the text with the status line."""
+    with reporter.lock:
+        reporter.clear()
+        print(*args, **kwargs)
+
+
+def activity(label):
+    """Decorator reporting a function call as a task while it runs."""
+
+    def decorator(func):
+        @wraps(func)  # keeps the wrapped function's name and docstring intact
+        def wrapper(*args, **kwargs):
+            with reporter.task(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Filter expressions over list entries.
+
+A query such as::
+
+    score>=8 and status=completed and tag:isekai and start_date>=2015
+
+is parsed once into a predicate (a tree of closures) that is then applied
+to every entry in a single pass. Supported syntax:
+
+- comparisons ``field op value`` with ``=``, ``!=``, ``>``, ``>=``, ``<``,
+  ``<=`` and ``~`` (regex search);
+- ``field:value`` to test membership in list fields (tags, genres,
+  studios) or substring in text fields;
+- ``and``, ``or``, ``not`` and parentheses;
+- values quoted with ``"`` or ``'`` when they contain spaces or symbols.
+
+Dates compare on the given precision, so ``start_date>=2015`` and
+``start_date<2015-04`` work as expected.
+"""
+
+# stdlib
+import re
+from datetime import datetime
+
+FIELD_ALIASES = {
+    "progress": "episode",
+    "episodes": "episode",
+    "chapter": "episode",
+    "chapters": "episode",
+    "total": "total_episodes",
+    "tag": "tags",
+    "genre": "genres",
+    "studio": "studios",
+    "type": "media_type",
+    "rewatching": "is_rewatching",
+}
+NUMERIC_FIELDS = {"id", "score", "episode", "total_episodes", "mean"}
+DATE_FIELDS = {"start_date", "end_date", "updated_at"}
+LIST_FIELDS = {"tags", "genres", "studios", "alternative_titles"}
+# fields only available after details.hydrate
+DETAIL_FIELDS = {"genres", "studios", "mean", "airing_status"}
+# fields stored as columns by storage backends able to run SQL
+SQL_FIELDS = {"id", "score", "episode", "total_episodes", "status"}
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<paren>[()])
+        |(?P<quoted>"(?:[^"\\]|\\.)*"|'[^']*')
+        |(?P<op>>=|<=|!=|=|>|<|~|:)
+        |(?P<word>[^\s()<>=!~:"']+)
+    )""",
+    re.VERBOSE,
+)
+_KEYWORDS = {"and", "or", "not"}
+
+
+class QueryError(ValueError):
+    """The filter expression can't be parsed."""
+
+
+def field_name(name):
+    """Canonical name of a field (resolving aliases)."""
+    name = name.lower()
+    return FIELD_ALIASES.get(name, name)
+
+
+def tokenize(text):
+    """
+    Split a filter expression in tokens.
+
+    Returns:
+        List of (kind, value) tuples, kind being paren, op, word or value
+        (for quoted strings).
+    """
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise QueryError("unexpected {!r}".format(text[position:]))
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "quoted":
+            kind, value = "value", value[1:-1].replace('\\"', '"')
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser(object):
+    """Recursive descent parser building the predicate."""
+
+    def __init__(self, tokens, date_format):
+        self.tokens = tokens
+        self.position = 0
+        self.date_format = date_format
+        self.fields = set()
+        # predicate -> (clause, params, exact) for the translatable parts
+        self.sql = dict()
+
+    def translated(self, predicate, clause, params, exact=True):
+        self.sql[predicate] = (clause, list(params), exact)
+        return predicate
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == "word" and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        predicate = self.or_expr()
+        if self.position != len(self.tokens):
+            raise QueryError("unexpected {!r}".format(self.peek()[1]))
+        return predicate
+
+    def or_expr(self):
+        terms = [self.and_expr()]
+        while self.keyword("or"):
+            terms.append(self.and_expr())
+        if len(terms) == 1:
+            return terms[0]
+        predicate = lambda entry: any(term(entry) for term in terms)
+        if all(term in self.sql for term in terms):
+            parts = [self.sql[term] for term in terms]
+            return self.translated(
+                predicate,
+                "(" + " OR ".join(p[0] for p in parts) + ")",
+                sum((p[1] for p in parts), []),
+                all(p[2] for p in parts),
+            )
+        return predicate
+
+    def and_expr(self):
+        terms = [self.not_expr()]
+        while True:
+            if self.keyword("and"):
+                terms.append(self.not_expr())
+            elif self.peek() == ("paren", "(") or (
+                self.peek()[0] == "word" and self.peek()[1].lower() != "or"
+            ):
+                # juxtaposition means "and": tag:a tag:b
+                terms.append(self.not_expr())
+            else:
+                break
+        if len(terms) == 1:
+            return terms[0]
+        predicate = lambda entry: all(term(entry) for term in terms)
+        parts = [self.sql[term] for term in terms if term in self.sql]
+        if parts:
+            # the translated terms alone select a superset of the matches
+            return self.translated(
+                predicate,
+                "(" + " AND ".join(p[0] for p in parts) + ")",
+                sum((p[1] for p in parts), []),
+                len(parts) == len(terms) and all(p[2] for p in parts),
+            )
+        return predicate
+
+    def not_expr(self):
+        if self.keyword("not"):
+            term = self.not_expr()
+            predicate = lambda entry: not term(entry)
+            clause, params, exact = self.sql.get(term, (None, None, False))
+            if exact:
+                # NULL comparisons are false in Python too
+                return self.translated(
+                    predicate, "NOT coalesce({}, 0)".format(clause), params
+                )
+            return predicate
+        return self.atom()
+
+    def atom(self):
+        kind, value = self.take()
+        if (kind, value) == ("paren", "("):
+            predicate = self.or_expr()
+            if self.take() != ("paren", ")"):
+                raise QueryError("missing )")
+            return predicate
+        if kind != "word" or value.lower() in _KEYWORDS:
+            raise QueryError("expected a field, got {!r}".format(value))
+
+        field = field_name(value)
+        op_kind, op = self.take()
+        if op_kind != "op":
+            raise QueryError("expected an operator after {!r}".format(value))
+        value_kind, operand = self.take()
+        if value_kind not in ("word", "value"):
+            raise QueryError("expected a value after {!r}".format(op))
+        self.fields.add(field)
+        return self.comparison(field, op, operand)
+
+    def comparison(self, field, op, operand):
+        if op == "~":
+            try:
+                pattern = re.compile(operand, re.IGNORECASE)
+            except re.error:
+                raise QueryError("invalid regex {!r}".format(operand))
+            return _text_test(field, pattern.search)
+
+        if op == ":" or field in LIST_FIELDS:
+            needle = operand.lower()
+            if op == ":":
+                return _text_test(field, lambda text: needle in text.lower())
+            if op not in ("=", "!="):
+                raise QueryError("{} only supports =, != and :".format(field))
+            test = _text_test(field, lambda text: needle == text.lower())
+            return test if op == "=" else lambda entry: not test(entry)
+
+        compare = _COMPARE[op]
+        if field in NUMERIC_FIELDS:
+            try:
+                number = float(operand)
+            except ValueError:
+                raise QueryError("{} expects a number".format(field))
+            predicate = _value_test(field, lambda v: compare(float(v), number))
+            return self.sql_comparison(predicate, field, op, number)
+
+        if field in DATE_FIELDS:
+            return self.date_comparison(field, compare, operand)
+
+        if field == "status":
+            operand = operand.replace(" ", "_")
+        operand = operand.lower()
+        predicate = _value_test(
+            field, lambda v: compare(str(v).lower(), operand)
+        )
+        return self.sql_comparison(predicate, field, op, operand)
+
+    def sql_comparison(self, predicate, field, op, operand):
+        """Attach the SQL of a comparison on a column, when there is one."""
+        if field not in SQL_FIELDS:
+            return predicate
+        column = "lower({})".format(field) if field == "status" else field
+        return self.translated(
+            predicate, "{} {} ?".format(column, op), [operand]
+        )
+
+    def date_comparison(self, field, compare, operand):
+        """Compare dates on the precision of the operand (year, month...)."""
+        date_format = self.date_format
+
+        def test(value):
+            value = _iso_date(value, date_format)
+            if value is None:
+                return False
+            return compare(value[: len(operand)], operand)
+
+        return _value_test(field, test)
+
+
+_COMPARE = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+def _value_test(field, test):
+    """Predicate applying test to a field, false when it is missing."""
+
+    def predicate(entry):
+        value = entry.get(field)
+        if value is None or value == "NA":
+            return False
+        try:
+            return test(value)
+        except (TypeError, ValueError):
+            return False
+
+    return predicate
+
+
+def _text_test(field, test):
+    """Predicate applying test to a text field or any item of a list."""
+
+    def predicate(entry):
+        value = entry.get(field)
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = value.split() if field == "tags" else [value]
+        return any(test(str(v)) for v in value)
+
+    return predicate
+
+
+def _iso_date(value, date_format="%Y-%m-%d"):
+    """Date as YYYY-MM-DD[...] whatever the configured format."""
+    if value is None or value == "NA":
+        return None
+    value = str(value)
+    try:
+        return datetime.strptime(value, date_format).strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+    # dates known to the year or month only are left as MAL gives them
+    if re.fullmatch(r"\d{4}(-\d\d){0,2}", value):
+        return value
+    return None
+
+
+class Query(object):
+    """A compiled filter expression."""
+
+    def __init__(self, text, date_format="%Y-%m-%d"):
+        self.text = text
+        parser = _Parser(tokenize(text), date_format)
+        if parser.tokens:
+            self.predicate = parser.parse()
+        else:
+            self.predicate = lambda entry: True
+        self.fields = parser.fields
+        # WHERE clause for the SQLite storage, see malpy3.storage
+        clause, params, exact = parser.sql.get(
+            self.predicate, (None, [], False)
+        )
+        self.sql = (clause, params) if clause else None
+        self.sql_exact = exact
+
+    def __call__(self, entry):
+        return self.predicate(entry)
+
+    @property
+    def needs_details(self):
+        """Tell if the query uses fields from the details cache."""
+        return bool(self.fields & DETAIL_FIELDS)
+
+    def filter(self, entries):
+        """Entries matching the query, in one pass."""
+        return [entry for entry in entries if self.predicate(entry)]
+
+
+def sort_key(field, date_format="%Y-%m-%d"):
+    """
+    Key function to sort entries by a field, missing values last.
+
+    Parameters:
+        field: field name, optionally prefixed with - (descending).
+        date_format: format the entries' dates were written in.
+
+    Returns:
+        (key function, reverse) tuple for sorted().
+    """
+    reverse = field.startswith("-")
+    field = field_name(field.lstrip("-+"))
+
+    def key(entry):
+        value = entry.get(field)
+        missing = value is None or value == "NA"
+        if missing:
+            # sorts last in both directions
+            return (not reverse, 0, "")
+        if field in NUMERIC_FIELDS:
+            return (reverse, float(value), "")
+        if field in DATE_FIELDS:
+            value = _iso_date(value, date_format) or value
+        if field in LIST_FIELDS and not isinstance(value, str):
+            value = " ".join(value)
+        return (reverse, 0, str(value).lower())
+
+    return key, reverse
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Recommendations from the user's list.
+
+Completed and well scored entries are the seeds of a weighted graph whose
+edges are the ``recommendations`` and ``related_anime``/``related_manga``
+of their details. Titles not in the list are ranked by the sum of the
+weights reaching them. Details come from :mod:`malpy3.details`, so only
+seeds never seen before cost a request, and those are sent concurrently.
+"""
+
+# stdlib
+import math
+from collections import defaultdict
+
+# self-package
+from malpy3 import catalogue
+from malpy3 import details
+
+# weight of a related entry, by relation type
+RELATION_WEIGHTS = {
+    "sequel": 1.0,
+    "prequel": 0.6,
+    "side_story": 0.5,
+    "parent_story": 0.5,
+    "alternative_version": 0.3,
+    "spin_off": 0.3,
+    "summary": 0.1,
+}
+DEFAULT_RELATION_WEIGHT = 0.2
+# weight of a completed entry without score
+UNSCORED_WEIGHT = 0.4
+
+
+def seed_weight(entry):
+    """
+    How much an entry of the list says about the user's taste.
+
+    Returns:
+        Number from -1 (disliked) to 1 (loved), 0 to ignore it.
+    """
+    score = entry.get("score") or 0
+    if score:
+        return (score - 5) / 5.0
+    if entry.get("status") == "completed":
+        return UNSCORED_WEIGHT
+    return 0
+
+
+def edges(data, category="anime"):
+    """
+    Weighted edges of a details response.
+
+    Parameters:
+        data: get_anime_details response.
+        category: Category of the entry: anime or manga.
+
+    Returns:
+        List of (node, weight) tuples.
+    """
+    result = []
+    for rec in data.get("recommendations") or []:
+        result.append(
+            (rec["node"], math.log1p(rec.get("num_recommendations", 1)))
+        )
+    for rel in data.get("related_" + category) or []:
+        weight = RELATION_WEIGHTS.get(
+            rel.get("relation_type"), DEFAULT_RELATION_WEIGHT
+        )
+        result.append((rel["node"], weight))
+    return result
+
+
+def recommend(mal, entries, category="anime", limit=20):
+    """
+    Rank titles not in the list.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance.
+        entries: Dictionary of id -> parsed anime/manga fields (the list).
+        category: Category to recommend: anime or manga.
+        limit: Number of returned results.
+
+    Returns:
+        List of dicts with id, title, score and because (titles of the
+        seeds contributing the most), best first.
+    """
+    seeds = {
+        _id: seed_weight(entry)
+        for _id, entry in entries.items()
+        if seed_weight(entry)
+    }
+    found = details.fetch(mal, list(seeds), category)
+
+    scores = defaultdict(float)
+    reasons = defaultdict(list)
+    nodes = dict()
+    for seed_id, data in found.items():
+        for node, weight in edges(data, category):
+            if node["id"] in entries:
+                continue
+            contribution = seeds[seed_id] * weight
+            scores[node["id"]] += contribution
+            reasons[node["id"]].append(
+                (contribution, entries[seed_id]["title"])
+            )
+            nodes[node["id"]] = node
+
+    catalogue.add(nodes.values(), category)
+    ranked = sorted(
+        (i for i in scores if scores[i] > 0),
+        key=lambda i: scores[i],
+        reverse=True,
+    )
+    return [
+        {
+            "id": i,
+            "title": nodes[i].get("title"),
+            "score": scores[i],
+            "because": [t for _, t in sorted(reasons[i], reverse=True)[:3]],
+        }
+        for i in ranked[: int(limit)]
+    ]
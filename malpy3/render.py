@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Buffered terminal output for long listings.
+
+Printing thousands of entries with one ``print`` and several ``colorize``
+calls each is slow, specially over SSH. A :class:`Renderer` precomputes the
+ANSI escape sequences once, collects the formatted text in memory and
+writes it to the stream (or a pager) in big chunks.
+"""
+
+# stdlib
+import os
+import sys
+import shlex
+import subprocess
+
+# 3rd party
+from decorating.color import COLOR_MAP, STYLE_MAP
+
+# self-package
+from malpy3 import setup
+
+DEFAULT_PAGER = "less -R"
+CHUNK_SIZE = 64 * 1024
+
+
+def use_pager(requested=False):
+    """Tell if output should go through a pager.
+
+    Parameters:
+        requested: pager explicitly asked for in the command line.
+
+    Returns:
+        Boolean.
+    """
+    if not sys.stdout.isatty():
+        return False
+    return requested or bool(setup.get_config()["config"].get("pager"))
+
+
+class Renderer(object):
+    """Collects formatted text and writes it out in chunks."""
+
+    def __init__(self, stream=None, colored=None, pager=False):
+        """
+        Parameters:
+            stream: file object to write to (default: sys.stdout).
+            colored: force colors on/off (default: only when a tty).
+            pager: pipe the output through $PAGER.
+        """
+        self.stream = stream or sys.stdout
+        if colored is None:
+            colored = self.stream.isatty() and sys.platform != "win32"
+        self.colored = colored
+        self._escapes = dict()
+        self._buffer = []
+        self._size = 0
+        self._pager = None
+
+        if pager:
+            command = os.environ.get("PAGER", DEFAULT_PAGER)
+            try:
+                self._pager = subprocess.Popen(
+                    shlex.split(command),
+                    stdin=subprocess.PIPE,
+                    universal_newlines=True,
+                )
+                self.stream = self._pager.stdin
+            except OSError:
+                self._pager = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def paint(self, printable, color, style="normal"):
+        """Same as color.colorize, but with cached escape sequences."""
+        if not self.colored:
+            return str(printable)
+        key = (color, style)
+        escape = self._escapes.get(key)
+        if escape is None:
+            escape = COLOR_MAP[color].format(style=STYLE_MAP[style])
+            self._escapes[key] = escape
+        return "{}{}{}".format(escape, printable, COLOR_MAP["reset"])
+
+    def write(self, text=""):
+        """Append a line to the buffer, flushing when it gets big."""
+        self._buffer.append(text)
+        self._buffer.append("\n")
+        self._size += len(text) + 1
+        if self._size >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far to the stream."""
+        if not self._buffer:
+            return
+        try:
+            self.stream.write("".join(self._buffer))
+            self.stream.flush()
+        except BrokenPipeError:
+            # the pager (or `head`) was closed, stop writing
+            self._buffer = []
+            raise SystemExit(0)
+        self._buffer = []
+        self._size = 0
+
+    def close(self):
+        """Flush the remaining output and wait for the pager."""
+        try:
+            self.flush()
+        finally:
+            if self._pager is not None:
+                self._pager.stdin.close()
+                self._pager.wait()
+                self._pager = None
@@ -5,50 +5,110 @@
 # stdlib
 from pathlib import Path
 import textwrap
-import toml
 
 # 3rd party
-from xdg import XDG_CONFIG_HOME
+from xdg import XDG_CACHE_HOME, XDG_CONFIG_HOME, XDG_DATA_HOME
 import decorating
+import toml
 
 # self-package
 from malpy3 import __name__ as APP_NAME
+from malpy3.utils import atomic_write, file_lock
 
 # variables for proper saving
 APP_FILE = "myanimelist.toml"
 CONFIG_PATH = Path(XDG_CONFIG_HOME) / APP_NAME / APP_FILE
+# local state: queued updates, caches, snapshots...
+DATA_PATH = Path(XDG_DATA_HOME) / APP_NAME
+# data that can be downloaded again at any time
+CACHE_PATH = Path(XDG_CACHE_HOME) / APP_NAME
+# tokens change on every login, they are kept apart from the settings
+TOKENS_PATH = DATA_PATH / "tokens.toml"
 
 DEFAULT_CONFIG = """
 [config]
     animation = true
     date_format = "%Y-%m-%d"
-[login]
-    access_token = ""
-    refresh_token = ""
+    pager = false
+    write_behind = false
+    storage = "json"
 """
+DEFAULT_TOKENS = {"access_token": "", "refresh_token": ""}
+
+# parsed once per process, see get_config
+_config = None
+
+
+def _read_toml(path):
+    try:
+        return toml.load(str(path))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        return dict()
 
 
-def get_config():
+def get_config(reload=False):
     """
-    Create a toml configuration file or read if it exists
+    Create a toml configuration file or read if it exists.
+
+    The files are only parsed on the first call (or with reload=True).
+    Tokens are read from TOKENS_PATH and exposed under "login"; tokens
+    still in an older config file are used until the next login.
 
     Returns:
         Dictionary with configuration options.
     """
-    if CONFIG_PATH.exists():
-        try:
-            config = toml.load(CONFIG_PATH.absolute())
-            return config
+    global _config
+    if _config is not None and not reload:
+        return _config
+
+    defaults = toml.loads(DEFAULT_CONFIG)
+    config = _read_toml(CONFIG_PATH)
+    if config is None:
+        with file_lock(CONFIG_PATH):
+            if not CONFIG_PATH.exists():
+                text = textwrap.dedent(DEFAULT_CONFIG).lstrip("\n")
+                atomic_write(CONFIG_PATH, text)
+        config = dict()
+
+    settings = dict(defaults["config"], **config.get("config", {}))
+    tokens = dict(DEFAULT_TOKENS, **config.get("login", {}))
+    tokens.update(_read_toml(TOKENS_PATH) or {})
+
+    _config = dict(config, config=settings, login=tokens)
+    return _config
 
-        except Exception as e:
-            return toml.loads(DEFAULT_CONFIG)
 
-    else:
-        CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with CONFIG_PATH.open("w") as f:
-            f.write(textwrap.dedent(DEFAULT_CONFIG).lstrip("\n"))
+def save_config(config):
+    """
+    Write the settings back, atomically and under a lock.
+
+    Parameters:
+        config: Dictionary with configuration options (tokens left out).
+    """
+    global _config
+    static = {k: v for k, v in config.items() if k != "login"}
+    with file_lock(CONFIG_PATH):
+        atomic_write(CONFIG_PATH, toml.dumps(static))
+    _config = dict(static, login=get_config()["login"])
+
+
+def save_tokens(access_token, refresh_token):
+    """
+    Store the login tokens, atomically and under a lock.
+
+    The tokens file is only readable by the user (see atomic_write).
+    Tokens left in the config file by older versions are removed.
+    """
+    tokens = {"access_token": access_token, "refresh_token": refresh_token}
+    with file_lock(TOKENS_PATH):
+        atomic_write(TOKENS_PATH, toml.dumps(tokens))
 
-        return toml.loads(DEFAULT_CONFIG)
+    config = get_config()
+    config["login"] = tokens
+    if (_read_toml(CONFIG_PATH) or {}).get("login"):
+        save_config(config)
 
 
 @decorating.cache
@@ -59,6 +119,7 @@ def date_format():
 
 def print_config():
     """Print current config and its PATH"""
-    print("\nFile on: {}\n".format(CONFIG_PATH))
+    print("\nFile on: {}".format(CONFIG_PATH))
+    print("Tokens on: {}\n".format(TOKENS_PATH))
     with open(CONFIG_PATH, "r") as f:
         print(f.read())
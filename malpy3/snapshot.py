@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Local copy of the user's lists.
+
+Every list downloaded by :meth:`MyAnimeList.list` is merged into a
+collection per category of the configured storage backend (see
+:mod:`malpy3.storage`), so the last known state can be used when MAL
+can't be reached (see :mod:`malpy3.offline`). Downloading the whole list
+replaces the copy instead, and is remembered in ``synced.json`` so
+:func:`complete` tells if the copy can stand for the whole list.
+"""
+
+# stdlib
+import json
+import time
+
+# self-package
+from malpy3 import setup
+from malpy3 import storage
+from malpy3.utils import atomic_write, file_lock
+
+SYNCED_PATH = setup.DATA_PATH / "synced.json"
+
+
+def _name(category):
+    return "lists/{}".format(category)
+
+
+def load(category="anime"):
+    """
+    Read the stored list of a category.
+
+    Returns:
+        Dictionary of id -> parsed anime/manga fields.
+    """
+    return storage.backend().read(_name(category))
+
+
+def _synced():
+    try:
+        with SYNCED_PATH.open() as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def complete(category="anime"):
+    """Tell if the whole list of a category was ever stored."""
+    return category in _synced()
+
+
+def _changed(stored, entries, prune=False):
+    """Tell if merging `entries` would change the stored list."""
+    ids = {int(entry_id) for entry_id in entries}
+    if prune and not ids.issuperset(stored):
+        return True
+    for entry_id, entry in entries.items():
+        current = stored.get(int(entry_id))
+        if current is None or dict(current, **entry) != current:
+            return True
+    return False
+
+
+def save(entries, category="anime", complete=False):
+    """
+    Merge freshly downloaded entries into the stored list.
+
+    Nothing is written when the stored list already holds them.
+
+    Parameters:
+        entries: Dictionary of id -> parsed anime/manga fields.
+        category: Category of the entries: anime or manga.
+        complete: `entries` is the whole list, entries missing from it
+            were removed from the list and are dropped.
+
+    Returns:
+        True if the stored list changed.
+    """
+    changed = _changed(load(category), entries, prune=complete)
+    if changed:
+        storage.backend().merge(_name(category), entries, prune=complete)
+    if complete and category not in _synced():
+        with file_lock(SYNCED_PATH):
+            synced = _synced()
+            synced[category] = time.time()
+            atomic_write(SYNCED_PATH, json.dumps(synced))
+    return changed
+
+
+def find(regex, category="anime", status=None, limit=None, alternatives=False):
+    """
+    Entries of the stored list matching a title regex and a status.
+
+    With the columnar storage the list is scanned in place and only the
+    matching entries are built.
+
+    Returns:
+        List of parsed anime/manga fields.
+    """
+    return storage.backend().find(
+        _name(category), regex, status, limit, alternatives
+    )
+
+
+def query(where, category="anime"):
+    """
+    Entries of the stored list matching a filter.
+
+    With the sqlite storage the filter runs as SQL (see Query.sql).
+
+    Parameters:
+        where: malpy3.query.Query instance.
+        category: Category of the list: anime or manga.
+
+    Returns:
+        List of parsed anime/manga fields.
+    """
+    return storage.backend().query(_name(category), where)
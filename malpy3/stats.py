@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Statistics computed locally over the user's list.
+
+The list is turned once into typed columns (:class:`Columns`, backed by
+``array.array``) and every statistic is a single pass over those columns,
+so no extra API request is needed and 10k+ entries take milliseconds.
+Genres, studios and episode durations come from the details cache
+(:mod:`malpy3.details`) when available.
+"""
+
+# stdlib
+from array import array
+from collections import Counter, defaultdict
+
+# self-package
+from malpy3 import details
+from malpy3.query import _iso_date
+
+STATUSES = {
+    "anime": [
+        "watching",
+        "completed",
+        "on_hold",
+        "dropped",
+        "plan_to_watch",
+    ],
+    "manga": [
+        "reading",
+        "completed",
+        "on_hold",
+        "dropped",
+        "plan_to_read",
+    ],
+}
+# minutes per episode assumed when the duration isn't cached
+DEFAULT_EPISODE_MINUTES = 24
+# minutes per chapter, to estimate time spent reading
+DEFAULT_CHAPTER_MINUTES = 5
+
+
+class Columns(object):
+    """Columnar representation of a list."""
+
+    def __init__(self, category="anime"):
+        self.category = category
+        self.statuses = STATUSES[category]
+        self.id = array("l")
+        self.status = array("b")
+        self.score = array("b")
+        self.progress = array("l")
+        self.total = array("l")
+        self.year = array("h")  # 0 when unknown
+        self.minutes = array("f")  # per episode/chapter
+        self.genres = []
+        self.studios = []
+
+    def __len__(self):
+        return len(self.id)
+
+    @classmethod
+    def from_entries(
+        cls,
+        entries,
+        category="anime",
+        use_details=True,
+        date_format="%Y-%m-%d",
+    ):
+        """
+        Build the columns from parsed list entries.
+
+        Parameters:
+            entries: iterable of parsed anime/manga fields.
+            category: Category of the entries: anime or manga.
+            use_details: read genres/studios/durations from the cache.
+            date_format: format the entries' dates were written in.
+
+        Returns:
+            Columns instance.
+        """
+        columns = cls(category)
+        default = (
+            DEFAULT_CHAPTER_MINUTES
+            if category == "manga"
+            else DEFAULT_EPISODE_MINUTES
+        )
+        status_code = {s: i for i, s in enumerate(columns.statuses)}
+        cached = details.cached_ids(category) if use_details else set()
+        for entry in entries:
+            data = None
+            if entry["id"] in cached:
+                data = details.get(entry["id"], category, ttl=None)
+            data = data or {}
+
+            columns.id.append(entry["id"])
+            columns.status.append(status_code.get(entry.get("status"), -1))
+            columns.score.append(entry.get("score") or 0)
+            columns.progress.append(entry.get("episode") or 0)
+            columns.total.append(entry.get("total_episodes") or 0)
+            columns.year.append(_year(entry.get("start_date"), date_format))
+            duration = data.get("average_episode_duration")
+            columns.minutes.append(duration / 60 if duration else default)
+            columns.genres.append([g["name"] for g in data.get("genres", [])])
+            columns.studios.append(
+                [s["name"] for s in data.get("studios", [])]
+            )
+        return columns
+
+    def extend(self, other):
+        """Append the columns of another list (e.g. another account)."""
+        for name in ("id", "status", "score", "progress", "total"):
+            getattr(self, name).extend(getattr(other, name))
+        self.year.extend(other.year)
+        self.minutes.extend(other.minutes)
+        self.genres.extend(other.genres)
+        self.studios.extend(other.studios)
+        return self
+
+
+def _year(date, date_format="%Y-%m-%d"):
+    date = _iso_date(date, date_format)
+    try:
+        return int(date[:4])
+    except (TypeError, ValueError):
+        return 0
+
+
+def compute(columns):
+    """
+    Compute the statistics of a list.
+
+    Parameters:
+        columns: Columns instance.
+
+    Returns:
+        Dictionary with:
+            entries, mean_score, scored, score_distribution (score -> n),
+            statuses (status -> {"entries", "progress"}), completion_rate,
+            minutes, days, years (year -> n), genres and studios
+            (name -> {"entries", "mean_score"}).
+    """
+    n = len(columns)
+    status_entries = [0] * len(columns.statuses)
+    status_progress = [0] * len(columns.statuses)
+    distribution = [0] * 11
+    minutes = 0.0
+    years = Counter()
+
+    for status, score, progress, per_unit, year in zip(
+        columns.status,
+        columns.score,
+        columns.progress,
+        columns.minutes,
+        columns.year,
+    ):
+        if status >= 0:
+            status_entries[status] += 1
+            status_progress[status] += progress
+        distribution[score] += 1
+        minutes += progress * per_unit
+        if year:
+            years[year] += 1
+
+    scored = n - distribution[0]
+    score_sum = sum(score * count for score, count in enumerate(distribution))
+    completed = status_entries[columns.statuses.index("completed")]
+    dropped = status_entries[columns.statuses.index("dropped")]
+
+    return {
+        "entries": n,
+        "scored": scored,
+        "mean_score": score_sum / scored if scored else 0.0,
+        "score_distribution": {
+            score: distribution[score] for score in range(1, 11)
+        },
+        "statuses": {
+            status: {
+                "entries": status_entries[i],
+                "progress": status_progress[i],
+            }
+            for i, status in enumerate(columns.statuses)
+        },
+        "progress": sum(status_progress),
+        # finished among the entries that were either finished or given up
+        "completion_rate": (
+            completed / (completed + dropped) if completed + dropped else 0.0
+        ),
+        "minutes": minutes,
+        "days": minutes / (60 * 24),
+        "years": dict(sorted(years.items())),
+        "genres": _breakdown(columns.genres, columns.score),
+        "studios": _breakdown(columns.studios, columns.score),
+    }
+
+
+def _breakdown(labels, scores):
+    """Entries and mean score per label (genre, studio...)."""
+    entries = Counter()
+    score_sums = defaultdict(int)
+    scored = Counter()
+    for names, score in zip(labels, scores):
+        for name in names:
+            entries[name] += 1
+            if score:
+                score_sums[name] += score
+                scored[name] += 1
+    return {
+        name: {
+            "entries": count,
+            "mean_score": (
+                score_sums[name] / scored[name] if scored[name] else 0.0
+            ),
+        }
+        for name, count in entries.most_common()
+    }
@@ -0,0 +1,720 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Interchangeable storage for the local copies of lists and catalogue.
+
+Data is kept as named collections of entries (``lists/anime``,
+``catalogue/manga``...), each one a dictionary of id -> entry. Every
+backend implements the same small API:
+
+- ``read(name)``: all the entries of a collection;
+- ``write(name, entries)``: replace a collection;
+- ``merge(name, entries)``: update entries, under a lock;
+- ``query(name, where)``: entries matching a :class:`malpy3.query.Query`;
+- ``find(name, regex, status)``: entries whose titles match a regex.
+
+Backends, chosen with ``storage = "..."`` in the config:
+
+- ``json``: one JSON object per collection (the original format);
+- ``jsonl``: one JSON entry per line;
+- ``sqlite``: one database, entries indexed by the fields filters use
+  most, so queries are pushed down to SQL;
+- ``columnar``: a binary file of fixed-width columns and string tables,
+  memory-mapped to read (see :class:`ColumnarSnapshot`). Titles are
+  searched in place, only the matching entries are rebuilt.
+"""
+
+# stdlib
+import re
+import sys
+import json
+import mmap
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+
+# self-package
+from malpy3 import setup
+from malpy3.fuzzy import entry_titles
+from malpy3.utils import atomic_write, file_lock
+
+DEFAULT_BACKEND = "json"
+
+
+class Backend(object):
+    """Common part of the backends: one file per collection."""
+
+    extension = ""
+
+    def __init__(self, root=setup.DATA_PATH):
+        self.root = root
+
+    def path(self, name):
+        """File holding a collection."""
+        return self.root / (name + self.extension)
+
+    def read(self, name):
+        """
+        Read a collection.
+
+        Returns:
+            Dictionary of id -> entry (empty if missing or unreadable).
+        """
+        raise NotImplementedError
+
+    def write(self, name, entries):
+        """
+        Replace a collection.
+
+        Parameters:
+            name: name of the collection.
+            entries: Dictionary of id -> entry.
+        """
+        raise NotImplementedError
+
+    def merge(self, name, entries, prune=False):
+        """
+        Update the entries of a collection, adding the new ones.
+
+        Parameters:
+            name: name of the collection.
+            entries: Dictionary of id -> entry (fields are merged).
+            prune: remove the stored entries missing from `entries`.
+        """
+        with file_lock(self.path(name)):
+            stored = self.read(name)
+            if prune:
+                ids = {int(entry_id) for entry_id in entries}
+                stored = {i: e for i, e in stored.items() if i in ids}
+            for entry_id, entry in entries.items():
+                stored.setdefault(int(entry_id), dict()).update(entry)
+            self.write(name, stored)
+
+    def find(self, name, regex, status=None, limit=None, alternatives=False):
+        """
+        Entries of a collection matching a title regex and a status.
+
+        Parameters:
+            name: name of the collection.
+            regex: regex matched against the title.
+            status: only entries with this status.
+            limit: only look at this many entries (with the status).
+            alternatives: match the alternative titles too.
+
+        Returns:
+            List of entries.
+        """
+        pattern = re.compile(regex or "", re.IGNORECASE)
+        candidates = [
+            entry
+            for entry in self.read(name).values()
+            if not status or entry.get("status") == status
+        ]
+        if limit:
+            candidates = candidates[: int(limit)]
+
+        def titles(entry):
+            if alternatives:
+                return entry_titles(entry)
+            return [entry.get("title") or ""]
+
+        return [
+            entry
+            for entry in candidates
+            if any(pattern.search(t) for t in titles(entry))
+        ]
+
+    def query(self, name, where=None):
+        """
+        Entries of a collection matching a filter.
+
+        Parameters:
+            name: name of the collection.
+            where: malpy3.query.Query (None for all entries).
+
+        Returns:
+            List of entries.
+        """
+        entries = self.read(name).values()
+        if where is None:
+            return list(entries)
+        return where.filter(entries)
+
+
+class JsonBackend(Backend):
+    """A JSON object of id -> entry per collection."""
+
+    extension = ".json"
+
+    def read(self, name):
+        try:
+            with self.path(name).open() as f:
+                return {int(k): v for k, v in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            return dict()
+
+    def write(self, name, entries):
+        atomic_write(self.path(name), json.dumps(entries))
+
+
+class JsonLinesBackend(Backend):
+    """One JSON entry per line."""
+
+    extension = ".jsonl"
+
+    def read(self, name):
+        entries = dict()
+        try:
+            with self.path(name).open() as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn line, skip it
+                    entries[int(entry["id"])] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def write(self, name, entries):
+        lines = (json.dumps(dict(e, id=int(i))) for i, e in entries.items())
+        atomic_write(self.path(name), "".join(l + "\n" for l in lines))
+
+
+class SqliteBackend(Backend):
+    """Every collection in one SQLite database."""
+
+    extension = ".sqlite3"
+    # columns copied out of the entries, see malpy3.query.SQL_FIELDS
+    COLUMNS = ["title", "status", "score", "episode", "total_episodes"]
+
+    def __init__(self, root=setup.DATA_PATH):
+        super().__init__(root)
+        self._local = threading.local()
+
+    def path(self, name=None):
+        return self.root / ("storage" + self.extension)
+
+    @property
+    def db(self):
+        """Connection of the current thread."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path()), timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " collection TEXT, id INTEGER, title TEXT, status TEXT,"
+                " score INTEGER, episode INTEGER, total_episodes INTEGER,"
+                " data TEXT, PRIMARY KEY (collection, id))"
+            )
+            self._local.db = db
+        return db
+
+    def _rows(self, name, entries):
+        for entry_id, entry in entries.items():
+            yield (name, int(entry_id)) + tuple(
+                entry.get(c) for c in self.COLUMNS
+            ) + (json.dumps(entry),)
+
+    def read(self, name):
+        rows = self.db.execute(
+            "SELECT id, data FROM entries WHERE collection = ?", (name,)
+        )
+        return {entry_id: json.loads(data) for entry_id, data in rows}
+
+    def write(self, name, entries):
+        with self.db:  # one transaction
+            self.db.execute(
+                "DELETE FROM entries WHERE collection = ?", (name,)
+            )
+            self.db.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self._rows(name, entries),
+            )
+
+    def merge(self, name, entries, prune=False):
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")  # the write lock
+            if prune:
+                self.db.execute(
+                    "DELETE FROM entries WHERE collection = ? AND id NOT IN "
+                    "(SELECT value FROM json_each(?))",
+                    (name, json.dumps([int(i) for i in entries])),
+                )
+            rows = self.db.execute(
+                "SELECT id, data FROM entries WHERE collection = ? AND id IN "
+                "(SELECT value FROM json_each(?))",
+                (name, json.dumps([int(i) for i in entries])),
+            )
+            stored = {entry_id: json.loads(data) for entry_id, data in rows}
+            for entry_id, entry in entries.items():
+                stored.setdefault(int(entry_id), dict()).update(entry)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entries VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?)",
+                self._rows(name, stored),
+            )
+
+    def query(self, name, where=None):
+        if where is None or where.sql is None:
+            return super().query(name, where)
+        clause, params = where.sql
+        rows = self.db.execute(
+            "SELECT data FROM entries WHERE collection = ? AND " + clause,
+            [name] + params,
+        )
+        entries = [json.loads(data) for data, in rows]
+        if where.sql_exact:
+            return entries
+        return where.filter(entries)
+
+
+def _date_number(value):
+    """YYYYMMDD number of an ISO date (0 when unknown)."""
+    try:
+        return int(str(value)[:10].replace("-", "").ljust(8, "0"))
+    except ValueError:
+        return 0
+
+
+def _timestamp(value):
+    """Seconds since the epoch of an ISO datetime (0 when unknown)."""
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def _text(values):
+    """Tell if `values` can go in a string table (strings, no newline)."""
+    return isinstance(values, list) and all(
+        isinstance(v, str) and "\n" not in v for v in values
+    )
+
+
+class ColumnarSnapshot(object):
+    """
+    A collection stored as fixed-width columns, read through mmap.
+
+    Layout: an 8 byte magic, a 4 byte header length and a JSON header
+    (entry count, status names, byte order and section offsets), then
+    the sections, 8 byte aligned:
+
+    - integer columns: id, status (index in the status names, -1 if
+      unknown), score, episode, total_episodes (-1 for None), start_date
+      and end_date (YYYYMMDD), updated_at (epoch);
+    - ``present``: bit mask of the fields held by the columns (absent
+      ones are left out when the entry is rebuilt);
+    - ``titles``: for each entry its title and alternative titles, one
+      per line, with ``title_start``/``title_length`` (in characters) to
+      find them; ``tags`` and ``tags_start`` likewise;
+    - ``rest``: the other fields of each entry as JSON, with
+      ``rest_start`` byte offsets.
+
+    Dates are indexed in the columns but kept as given in ``rest``.
+    """
+
+    MAGIC = b"MALCOL1\0"
+    INT_COLUMNS = [
+        ("id", "q"),
+        ("status", "h"),
+        ("score", "i"),
+        ("episode", "i"),
+        ("total_episodes", "i"),
+        ("start_date", "i"),
+        ("end_date", "i"),
+        ("updated_at", "q"),
+        ("present", "B"),
+    ]
+    # bits of the present mask
+    FIXED = ["score", "episode", "total_episodes", "status", "title"]
+    ALT_TITLES = 1 << 5
+    TAGS = 1 << 6
+
+    def __init__(self, path):
+        with open(str(path), "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != self.MAGIC:
+            raise ValueError("not a columnar snapshot")
+        size = int.from_bytes(self._mmap[8:12], "little")
+        header = json.loads(self._mmap[12 : 12 + size].decode("utf-8"))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("snapshot written on another architecture")
+        self.count = header["count"]
+        self.statuses = header["statuses"]
+        self._sections = header["sections"]
+        self._titles = None
+        self._tags = None
+
+        view = memoryview(self._mmap)
+        self.columns = dict()
+        for name, code in self.INT_COLUMNS + [
+            ("title_start", "I"),
+            ("title_length", "I"),
+            ("tags_start", "I"),
+            ("rest_start", "Q"),
+        ]:
+            offset, length = self._sections[name]
+            self.columns[name] = view[offset : offset + length].cast(code)
+
+    def __len__(self):
+        return self.count
+
+    def _section_text(self, name):
+        offset, length = self._sections[name]
+        return self._mmap[offset : offset + length].decode("utf-8")
+
+    @property
+    def titles(self):
+        """All titles as one string (decoded once)."""
+        if self._titles is None:
+            self._titles = self._section_text("titles")
+        return self._titles
+
+    @property
+    def tags(self):
+        """All tags as one string (decoded once)."""
+        if self._tags is None:
+            self._tags = self._section_text("tags")
+        return self._tags
+
+    def title_range(self, index):
+        """(start, end) of the titles of an entry in `titles`."""
+        start = self.columns["title_start"][index]
+        return start, self.columns["title_start"][index + 1] - 1
+
+    def entry(self, index):
+        """Rebuild the dictionary of an entry."""
+        c = self.columns
+        offset, _ = self._sections["rest"]
+        rest = self._mmap[
+            offset
+            + c["rest_start"][index] : offset
+            + c["rest_start"][index + 1]
+        ]
+        entry = {"id": c["id"][index]}
+        entry.update(json.loads(rest.decode("utf-8")))
+
+        present = c["present"][index]
+        for bit, field in enumerate(self.FIXED):
+            if not present & (1 << bit):
+                continue
+            if field == "status":
+                status = c["status"][index]
+                entry[field] = self.statuses[status] if status >= 0 else None
+            elif field == "title":
+                start = c["title_start"][index]
+                entry[field] = self.titles[
+                    start : start + c["title_length"][index]
+                ]
+            else:
+                value = c[field][index]
+                entry[field] = value if value >= 0 else None
+
+        if present & self.ALT_TITLES:
+            start, end = self.title_range(index)
+            titles = self.titles[start:end].split("\n")[1:]
+            entry["alternative_titles"] = titles
+        if present & self.TAGS:
+            start = c["tags_start"][index]
+            end = c["tags_start"][index + 1] - 1
+            tags = self.tags[start:end]
+            entry["tags"] = tags.split("\n") if tags else []
+        return entry
+
+    def scan(self, regex=None, status=None, limit=None, alternatives=False):
+        """
+        Find entries by title and status without rebuilding them.
+
+        The regex runs over the titles string, which holds the title and
+        alternative titles of every entry one per line, so ``^``/``$``
+        anchor to a title as with a per-title search.
+
+        Parameters:
+            regex: regex matched against the titles (case insensitive).
+            status: only entries with this status.
+            limit: only look at this many entries (with the status).
+            alternatives: match the alternative titles too, not only
+                the first line of each entry.
+
+        Returns:
+            List of entry indexes, in storage order.
+        """
+        codes = self.columns["status"]
+        code = None
+        if status:
+            if status not in self.statuses:
+                return []
+            code = self.statuses.index(status)
+
+        if limit:
+            candidates = [
+                i
+                for i in range(self.count)
+                if code is None or codes[i] == code
+            ][: int(limit)]
+        elif code is not None:
+            candidates = [i for i in range(self.count) if codes[i] == code]
+        else:
+            candidates = None  # every entry
+
+        if not regex:
+            return (
+                list(range(self.count)) if candidates is None else candidates
+            )
+        pattern = re.compile(regex, re.IGNORECASE | re.MULTILINE)
+        text = self.titles
+        starts = self.columns["title_start"]
+        lengths = self.columns["title_length"]
+
+        def end_of(i):
+            if alternatives:
+                return starts[i + 1] - 1
+            return starts[i] + lengths[i]
+
+        if candidates is not None:
+            return [
+                i
+                for i in candidates
+                if pattern.search(text, starts[i], end_of(i))
+            ]
+
+        # one search over the whole string, jumping to the next entry
+        # after every hit
+        hits = []
+        position = 0
+        while True:
+            match = pattern.search(text, position)
+            if match is None:
+                return hits
+            index = bisect_right(starts, match.start()) - 1
+            if index >= self.count:
+                return hits
+            end = end_of(index)
+            if match.end() <= end or pattern.search(text, starts[index], end):
+                hits.append(index)
+            position = starts[index + 1]
+
+    def entries(self, indexes=None):
+        """
+        Rebuild entries.
+
+        Parameters:
+            indexes: iterable of entry indexes (None for all).
+
+        Returns:
+            Dictionary of id -> entry.
+        """
+        if indexes is None:
+            indexes = range(self.count)
+        return {self.columns["id"][i]: self.entry(i) for i in indexes}
+
+    @classmethod
+    def build(cls, entries):
+        """
+        Serialize entries.
+
+        Parameters:
+            entries: Dictionary of id -> entry.
+
+        Returns:
+            bytes of the snapshot.
+        """
+        columns = {name: array(code) for name, code in cls.INT_COLUMNS}
+        statuses = []
+        titles, title_start, title_length = [], array("I"), array("I")
+        tags, tags_start = [], array("I")
+        rest, rest_start = [], array("Q")
+        title_chars = tags_chars = rest_bytes = 0
+
+        for entry_id, entry in entries.items():
+            entry = dict(entry)
+            entry.pop("id", None)
+            present = 0
+            columns["id"].append(int(entry_id))
+
+            status = entry.get("status")
+            code = -1
+            if "status" in entry and (
+                status is None or isinstance(status, str)
+            ):
+                if status is not None:
+                    if status not in statuses:
+                        statuses.append(status)
+                    code = statuses.index(status)
+                present |= 1 << cls.FIXED.index("status")
+                del entry["status"]
+            columns["status"].append(code)
+
+            for field in ("score", "episode", "total_episodes"):
+                value = entry.get(field)
+                stored = -1
+                if field in entry and (
+                    value is None
+                    or (type(value) is int and 0 <= value < 2**31)
+                ):
+                    stored = -1 if value is None else value
+                    present |= 1 << cls.FIXED.index(field)
+                    del entry[field]
+                columns[field].append(stored)
+
+            columns["start_date"].append(_date_number(entry.get("start_date")))
+            columns["end_date"].append(_date_number(entry.get("end_date")))
+            columns["updated_at"].append(_timestamp(entry.get("updated_at")))
+
+            names = []
+            title = entry.get("title")
+            if isinstance(title, str) and "\n" not in title:
+                names.append(title)
+                present |= 1 << cls.FIXED.index("title")
+                del entry["title"]
+            else:
+                names.append("")
+            alternative = entry.get("alternative_titles")
+            if _text(alternative):
+                names += alternative
+                present |= cls.ALT_TITLES
+                del entry["alternative_titles"]
+            text = "\n".join(names) + "\n"
+            title_start.append(title_chars)
+            title_length.append(len(names[0]))
+            titles.append(text)
+            title_chars += len(text)
+
+            entry_tags = entry.get("tags")
+            text = "\n"
+            if _text(entry_tags):
+                text = "\n".join(entry_tags) + "\n"
+                present |= cls.TAGS
+                del entry["tags"]
+            tags_start.append(tags_chars)
+            tags.append(text)
+            tags_chars += len(text)
+
+            data = json.dumps(entry).encode("utf-8")
+            rest_start.append(rest_bytes)
+            rest.append(data)
+            rest_bytes += len(data)
+
+            columns["present"].append(present)
+
+        title_start.append(title_chars)
+        tags_start.append(tags_chars)
+        rest_start.append(rest_bytes)
+
+        sections = [
+            (name, columns[name].tobytes()) for name, _ in cls.INT_COLUMNS
+        ]
+        sections += [
+            ("title_start", title_start.tobytes()),
+            ("title_length", title_length.tobytes()),
+            ("tags_start", tags_start.tobytes()),
+            ("rest_start", rest_start.tobytes()),
+            ("titles", "".join(titles).encode("utf-8")),
+            ("tags", "".join(tags).encode("utf-8")),
+            ("rest", b"".join(rest)),
+        ]
+        return cls._assemble(len(entries), statuses, sections)
+
+    @classmethod
+    def _assemble(cls, count, statuses, sections):
+        # offsets depend on the header size, which depends on the offsets
+        header_size = 4096
+        while True:
+            offset = _align(12 + header_size)
+            table = dict()
+            for name, data in sections:
+                table[name] = [offset, len(data)]
+                offset = _align(offset + len(data))
+            header = json.dumps(
+                {
+                    "count": count,
+                    "statuses": statuses,
+                    "byteorder": sys.byteorder,
+                    "sections": table,
+                }
+            ).encode("utf-8")
+            if len(header) <= header_size:
+                break
+            header_size *= 2
+
+        blob = bytearray(offset)
+        blob[:8] = cls.MAGIC
+        blob[8:12] = header_size.to_bytes(4, "little")
+        blob[12 : 12 + len(header)] = header
+        blob[12 + len(header) : 12 + header_size] = b" " * (
+            header_size - len(header)
+        )
+        for name, data in sections:
+            start, length = table[name]
+            blob[start : start + length] = data
+        return bytes(blob)
+
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+
+class ColumnarBackend(Backend):
+    """Collections stored as memory-mapped columnar snapshots."""
+
+    extension = ".col"
+
+    def open(self, name):
+        """
+        Map a collection.
+
+        Returns:
+            ColumnarSnapshot or None if missing or unreadable.
+        """
+        try:
+            return ColumnarSnapshot(self.path(name))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read(self, name):
+        snapshot = self.open(name)
+        return snapshot.entries() if snapshot is not None else dict()
+
+    def find(self, name, regex, status=None, limit=None, alternatives=False):
+        snapshot = self.open(name)
+        if snapshot is None:
+            return []
+        hits = snapshot.scan(regex, status, limit, alternatives)
+        return list(snapshot.entries(hits).values())
+
+    def write(self, name, entries):
+        atomic_write(self.path(name), ColumnarSnapshot.build(entries))
+
+
+BACKENDS = {
+    "json": JsonBackend,
+    "jsonl": JsonLinesBackend,
+    "sqlite": SqliteBackend,
+    "columnar": ColumnarBackend,
+}
+_backends = dict()
+
+
+def backend(name=None):
+    """
+    Storage backend instance (one per process and name).
+
+    Parameters:
+        name: backend name (default: "storage" setting of the config).
+
+    Returns:
+        Backend instance.
+    """
+    if name is None:
+        name = setup.get_config()["config"].get("storage", DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError("unknown storage backend {!r}".format(name))
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
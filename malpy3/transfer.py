@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Bytes transferred per API endpoint.
+
+Responses are negotiated compressed (gzip, and brotli when a decoder is
+installed). :class:`TransferStats` is hooked on the session and records,
+for every endpoint, the bytes received on the wire and once decoded, so
+the gain of compression can be checked with ``mal --transfer-stats``.
+"""
+
+# stdlib
+import re
+import sys
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+try:
+    # includes br when urllib3 can decode brotli
+    from urllib3.util.request import ACCEPT_ENCODING
+except ImportError:
+    ACCEPT_ENCODING = "gzip,deflate"
+
+
+def endpoint(method, url):
+    """
+    Name of the endpoint of a request, ids replaced by {id}.
+
+    Returns:
+        String like "GET /v2/anime/{id}".
+    """
+    path = re.sub(r"/\d+(?=/|$)", "/{id}", urlsplit(url).path)
+    return "{} {}".format(method, path)
+
+
+class TransferStats(object):
+    """Counters of requests and bytes per endpoint, safe across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.wire = defaultdict(int)
+        self.decoded = defaultdict(int)
+
+    def record(self, response, *args, **kwargs):
+        """Response hook (see requests' hooks) recording its sizes."""
+        decoded = len(response.content)
+        wire = decoded
+        if response.raw is not None and hasattr(response.raw, "tell"):
+            # bytes read from the socket, before decompression
+            wire = response.raw.tell() or decoded
+        name = endpoint(response.request.method, response.request.url)
+        with self._lock:
+            self.requests[name] += 1
+            self.wire[name] += wire
+            self.decoded[name] += decoded
+        return response
+
+    def report(self, out=sys.stderr):
+        """Print a table of the bytes received per endpoint."""
+        with self._lock:
+            names = sorted(self.requests, key=lambda n: -self.decoded[n])
+            if not names:
+                return
+            print(
+                "{:<40} {:>5} {:>10} {:>10} {:>6}".format(
+                    "endpoint", "calls", "wire", "decoded", "ratio"
+                ),
+                file=out,
+            )
+            for name in names:
+                ratio = 100.0
+                if self.decoded[name]:
+                    ratio = self.wire[name] / self.decoded[name] * 100
+                print(
+                    "{:<40} {:>5} {:>10} {:>10} {:>5.0f}%".format(
+                        name,
+                        self.requests[name],
+                        self.wire[name],
+                        self.decoded[name],
+                        ratio,
+                    ),
+                    file=out,
+                )
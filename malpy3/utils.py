@@ -5,12 +5,14 @@
 # stdlib
 import sys
 import os
+import fcntl
+import tempfile
+from contextlib import contextmanager
 from functools import wraps
 from sre_constants import error as BadRegexError
 import xml.etree
 
 # 3rd party
-from decorating.animation import AnimatedDecorator
 from requests.exceptions import ConnectionError
 
 # self-package
@@ -42,6 +44,46 @@ def print_error(error_name, status, reason, kill=False):
         os._exit(1)
 
 
+def atomic_write(path, text):
+    """
+    Replace a file's content so readers never see it half written.
+
+    Parameters:
+        path: pathlib.Path of the file to write.
+        text: new content of the file (str or bytes).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp")
+    mode = "wb" if isinstance(text, bytes) else "w"
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock on `path`.lock while inside the block.
+
+    Parameters:
+        path: pathlib.Path of the file being protected.
+    """
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
 # THIS IS A LOL ZONE
 
 #    /\O    |    _O    |      O
@@ -71,8 +113,6 @@ def checked_regex(func):
         try:
             result = func(*args, **kwargs)
         except BadRegexError:
-            if AnimatedDecorator.spinner.running:
-                AnimatedDecorator.stop()
             print_error("BadRegexError", "invalid regex", "reason: you")
             sys.exit(1)
 
@@ -90,8 +130,6 @@ def checked_cancer(func):
         try:
             result = func(*args, **kwargs)
         except Exception as error:
-            if AnimatedDecorator.spinner.running:
-                AnimatedDecorator.stop()
             print_error("Error", "Invalid API Response", error)
             sys.exit(1)
 
@@ -109,8 +147,6 @@ def checked_connection(func):
         try:
             result = func(*args, **kwargs)
         except ConnectionError as e:
-            if AnimatedDecorator.spinner.running:
-                AnimatedDecorator.stop()
             error_name = e.__class__.__name__
             status = e.args[0].__class__.__name__
             reason = e.args[0].reason.__class__.__name__
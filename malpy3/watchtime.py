@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+"""Time spent watching/reading, from the history journal.
+
+Every journaled progress increase (see :mod:`malpy3.journal`) is worth
+the episodes/chapters gained times their duration, read from the details
+cache (``average_episode_duration``, fetched when missing). The totals per
+day and per genre are kept in ``watchtime/<category>.json`` in the cache
+along with the journal position they were computed up to, so each run
+only reads the records added since. They are rebuilt from the start when
+the journal was compacted in the meantime.
+"""
+
+# stdlib
+import os
+import json
+from datetime import date, timedelta
+
+# self-package
+from malpy3 import details
+from malpy3 import journal
+from malpy3 import setup
+from malpy3.stats import DEFAULT_CHAPTER_MINUTES, DEFAULT_EPISODE_MINUTES
+from malpy3.utils import atomic_write, file_lock
+
+WATCHTIME_PATH = setup.CACHE_PATH / "watchtime"
+
+
+def _path(category):
+    return WATCHTIME_PATH / "{}.json".format(category)
+
+
+def _empty():
+    return {"seq": 0, "offset": 0, "days": dict(), "genres": dict()}
+
+
+def load(category="anime"):
+    """
+    Read the totals computed so far.
+
+    Returns:
+        Dictionary with seq and offset (journal position), days
+        (date -> {"minutes", "units"}) and genres (name -> minutes).
+    """
+    try:
+        with _path(category).open() as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return _empty()
+
+
+def units(record):
+    """Episodes/chapters gained by a journal record (0 if none)."""
+    before = record["before"].get("progress")
+    after = record["after"].get("progress")
+    if before is None or after is None:
+        return 0
+    return max(after - before, 0)
+
+
+def minutes_per_unit(data, category="anime"):
+    """Minutes per episode/chapter, from cached details or a default."""
+    if category == "manga":
+        return DEFAULT_CHAPTER_MINUTES
+    duration = (data or {}).get("average_episode_duration")
+    return duration / 60 if duration else DEFAULT_EPISODE_MINUTES
+
+
+def _new_records(log, totals):
+    """
+    Records after the ones counted in `totals`.
+
+    Returns:
+        (records, offset after them), or None when the journal doesn't
+        continue where the totals stopped (it was compacted).
+    """
+    try:
+        size = os.path.getsize(str(log.path))
+    except FileNotFoundError:
+        size = 0
+    if size < totals["offset"]:
+        return None
+
+    records = []
+    offset = totals["offset"]
+    try:
+        for record, offset in log.records(totals["offset"]):
+            if not records and record["seq"] != totals["seq"] + 1:
+                return None
+            records.append(record)
+    except ValueError:
+        return None  # the offset fell inside a record
+    return records, offset
+
+
+def update(mal=None, category="anime"):
+    """
+    Add the journal records made since the last run to the totals.
+
+    Parameters:
+        mal: An authenticated MyAnimeList class instance, to fetch the
+            durations not cached yet (None to use the cache only).
+        category: Category of the list: anime or manga.
+
+    Returns:
+        The totals (see load).
+    """
+    log = journal.Journal(category)
+    path = _path(category)
+    with file_lock(path):
+        totals = load(category)
+        found = _new_records(log, totals)
+        if found is None:
+            totals = _empty()
+            found = _new_records(log, totals)
+        records, offset = found
+        if not records:
+            return totals
+
+        watched = [(r, units(r)) for r in records if units(r)]
+        ids = {record["id"] for record, _ in watched}
+        if mal is not None:
+            data = details.fetch(mal, ids, category, ttl=None)
+        else:
+            data = {_id: details.get(_id, category, ttl=None) for _id in ids}
+
+        days, genres = totals["days"], totals["genres"]
+        for record, count in watched:
+            info = data.get(record["id"]) or dict()
+            minutes = count * minutes_per_unit(info, category)
+            moment = journal.parse_time(record["at"]).astimezone()
+            day = days.setdefault(
+                moment.date().isoformat(), {"minutes": 0.0, "units": 0}
+            )
+            day["minutes"] += minutes
+            day["units"] += count
+            for genre in info.get("genres", []):
+                genres[genre["name"]] = genres.get(genre["name"], 0) + minutes
+
+        totals["seq"] = records[-1]["seq"]
+        totals["offset"] = offset
+        atomic_write(path, json.dumps(totals, sort_keys=True))
+    return totals
+
+
+def _streaks(active, today):
+    """(current, longest) runs of consecutive active days."""
+    longest = run = 0
+    previous = None
+    for day in sorted(active):
+        run = run + 1 if previous == day - timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    # the current streak is still alive if yesterday was active
+    current = run if previous and previous >= today - timedelta(1) else 0
+    return current, longest
+
+
+def summarize(totals, today=None, weeks=8, days=14):
+    """
+    Watch-time analytics from the totals.
+
+    Parameters:
+        totals: Dictionary returned by update/load.
+        today: date the report ends at (default: today).
+        weeks: number of weeks of the weekly breakdown.
+        days: number of days of the daily breakdown.
+
+    Returns:
+        Dictionary with:
+            minutes, units, active_days, current_streak, longest_streak,
+            days (date -> minutes, last `days` days), weeks (Monday ->
+            {"minutes", "units"}, last `weeks` weeks), genres (name ->
+            minutes, most watched first) and trend (change of the units
+            per week between the older and the newer half of the weeks).
+    """
+    today = today or date.today()
+    per_day = {
+        date(*map(int, day.split("-"))): values
+        for day, values in totals["days"].items()
+    }
+    active = [day for day, values in per_day.items() if values["units"]]
+    current, longest = _streaks(active, today)
+
+    recent_days = dict()
+    for back in range(days - 1, -1, -1):
+        day = today - timedelta(days=back)
+        recent_days[day] = per_day.get(day, {}).get("minutes", 0.0)
+
+    monday = today - timedelta(days=today.weekday())
+    per_week = {
+        monday - timedelta(weeks=back): {"minutes": 0.0, "units": 0}
+        for back in range(weeks - 1, -1, -1)
+    }
+    for day, values in per_day.items():
+        week = day - timedelta(days=day.weekday())
+        if week in per_week:
+            per_week[week]["minutes"] += values["minutes"]
+            per_week[week]["units"] += values["units"]
+
+    counts = [values["units"] for values in per_week.values()]
+    half = len(counts) // 2
+    older = sum(counts[:half]) / half if half else 0
+    newer = sum(counts[half:]) / (len(counts) - half) if counts else 0
+    trend = (newer - older) / older if older else None
+
+    return {
+        "minutes": sum(v["minutes"] for v in per_day.values()),
+        "units": sum(v["units"] for v in per_day.values()),
+        "active_days": len(active),
+        "current_streak": current,
+        "longest_streak": longest,
+        "days": recent_days,
+        "weeks": per_week,
+        "genres": dict(sorted(totals["genres"].items(), key=lambda g: -g[1])),
+        "trend": trend,
+    }
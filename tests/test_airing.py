@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+# stdlib
+from datetime import datetime
+
+# self-package
+from malpy3 import airing
+from malpy3.airing import JST
+
+# 2024-01-04 is a Thursday
+ENTRY = {
+    "status": "currently_airing",
+    "num_episodes": 12,
+    "start_date": "2024-01-04",
+    "broadcast": {"day_of_the_week": "saturday", "start_time": "23:30"},
+}
+
+
+def test_first_broadcast_is_on_the_broadcast_day():
+    assert airing.first_broadcast(ENTRY) == datetime(
+        2024, 1, 6, 23, 30, tzinfo=JST
+    )
+
+
+def test_before_the_first_episode():
+    now = datetime(2024, 1, 6, 12, tzinfo=JST)
+    assert airing.aired(ENTRY, now) == (0, airing.first_broadcast(ENTRY))
+
+
+def test_episodes_aired_weekly():
+    now = datetime(2024, 1, 20, 23, 29, tzinfo=JST)
+    assert airing.aired(ENTRY, now) == (
+        2,
+        datetime(2024, 1, 20, 23, 30, tzinfo=JST),
+    )
+    now = datetime(2024, 1, 20, 23, 30, tzinfo=JST)
+    assert airing.aired(ENTRY, now)[0] == 3
+
+
+def test_episodes_stop_at_the_total():
+    now = datetime(2025, 1, 1, tzinfo=JST)
+    assert airing.aired(ENTRY, now) == (12, None)
+    entry = dict(ENTRY, status="finished_airing")
+    assert airing.aired(entry) == (12, None)
+
+
+def test_unknown_start():
+    entry = dict(ENTRY, start_date=None)
+    assert airing.aired(entry) == (0, None)
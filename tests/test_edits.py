@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+# 3rd party
+import pytest
+
+# self-package
+from malpy3 import edits
+
+
+def test_diff_keeps_changed_fields_only():
+    before = {"status": "watching", "score": 7, "progress": 3, "tags": []}
+    after = dict(before, score=8, tags=["a"], unknown=1)
+    assert edits.diff(before, after) == {"score": 8, "tags": ["a"]}
+    assert edits.diff(before, dict(before)) == {}
+
+
+def test_validate_accepts_valid_changes():
+    changes = {
+        "status": "reading",
+        "score": 10,
+        "progress": 12,
+        "rewatching": False,
+        "tags": ["x"],
+    }
+    assert edits.validate(changes, "manga", total=12) == []
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"status": "reading"},
+        {"score": 11},
+        {"score": True},
+        {"score": "8"},
+        {"progress": -1},
+        {"progress": False},
+        {"progress": 30},
+        {"rewatching": "yes"},
+        {"tags": "a, b"},
+        {"episodes": 1},
+    ],
+)
+def test_validate_rejects(changes):
+    assert edits.validate(changes, "anime", total=24)
+
+
+def test_parse_tags():
+    assert edits.parse_tags("a, b ,c") == ["a", "b", "c"]
+    assert edits.parse_tags("a b") == ["a", "b"]
+    assert edits.parse_tags(None) == []
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+# self-package
+from malpy3 import fuzzy
+
+ENTRIES = [
+    {"id": 1, "title": "Steins;Gate", "alternative_titles": ["Shutainzu"]},
+    {"id": 2, "title": "Naruto"},
+    {"id": 3, "title": "Naruto: Shippuuden"},
+]
+
+
+def ranked(*scores):
+    return [{"id": i, "match_score": s} for i, s in enumerate(scores)]
+
+
+def test_dominant():
+    assert fuzzy.dominant(ranked(0.9, 0.5))
+    assert fuzzy.dominant(ranked(fuzzy.DOMINANT_SCORE))
+
+
+def test_not_dominant():
+    assert not fuzzy.dominant([])
+    assert not fuzzy.dominant([{"id": 1, "title": "unranked"}])
+    # too close to the second one
+    assert not fuzzy.dominant(ranked(0.9, 0.8))
+    # too weak
+    assert not fuzzy.dominant(ranked(0.4))
+
+
+def test_match_title_only_without_fuzzy():
+    assert fuzzy.match("shutainzu", ENTRIES) == []
+    assert [e["id"] for e in fuzzy.match("naruto", ENTRIES)] == [2, 3]
+
+
+def test_fuzzy_match_ranks_and_falls_back():
+    found = fuzzy.match("shutainzu", ENTRIES, fuzzy=True)
+    assert [e["id"] for e in found] == [1]
+
+    found = fuzzy.match("narutp", ENTRIES, fuzzy=True)
+    assert found[0]["id"] == 2
+    assert found[0]["match_score"] >= found[-1]["match_score"]
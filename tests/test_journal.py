@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+# stdlib
+from datetime import datetime, timedelta, timezone
+
+# 3rd party
+import pytest
+
+# self-package
+from malpy3 import journal
+
+START = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    """Journal in a temporary directory, with a clock set by the test."""
+    now = [START]
+    monkeypatch.setattr(journal, "HISTORY_PATH", tmp_path)
+    monkeypatch.setattr(journal, "_now", lambda: now[0])
+    return now
+
+
+def record(item_id, **fields):
+    return journal.Journal("anime").record([(item_id, "T", fields)])
+
+
+def test_entries_at_replays_the_journal(clock):
+    record(1, status="watching", progress=1)
+    clock[0] = START + timedelta(days=1)
+    record(1, progress=5)
+    record(2, status="completed")
+
+    current = {1: {"id": 1, "title": "T", "total_episodes": 12}}
+    before = journal.entries_at(START, current=current)
+    assert sorted(before) == [1]
+    assert before[1]["episode"] == 1
+    assert before[1]["total_episodes"] == 12
+
+    after = journal.entries_at(START + timedelta(days=2))
+    assert after[1]["episode"] == 5
+    assert after[2]["status"] == "completed"
+
+
+def test_unchanged_fields_are_not_recorded(clock):
+    assert len(record(1, score=7)) == 1
+    assert record(1, score=7) == []
+
+
+def test_entries_at_uses_snapshots(clock, monkeypatch):
+    monkeypatch.setattr(journal, "SNAPSHOT_EVERY", 2)
+    for progress in range(1, 6):
+        clock[0] = START + timedelta(hours=progress)
+        record(1, progress=progress)
+    assert journal.Journal("anime")._index()
+
+    moment = START + timedelta(hours=3)
+    assert journal.entries_at(moment)[1]["episode"] == 3
+
+
+def test_compact_merges_old_records(clock):
+    for progress in range(1, 4):
+        record(1, progress=progress)
+    clock[0] = START + timedelta(days=journal.KEEP_DAYS + 1)
+    record(1, progress=4)
+
+    assert journal.Journal("anime").compact() == (4, 2)
+    records = journal.Journal("anime").history(ids=[1])
+    assert [r["after"]["progress"] for r in records] == [3, 4]
+    assert journal.entries_at(clock[0])[1]["episode"] == 4
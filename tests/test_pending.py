@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+# self-package
+from malpy3 import pending
+
+
+def test_increments_are_summed(tmp_path):
+    path = tmp_path / "pending.json"
+    entry = {"num_watched_episodes": 4, "media_type": "anime"}
+    pending.enqueue(1, entry, delta=1, base=3, path=path)
+    entry = {"num_watched_episodes": 5, "media_type": "anime"}
+    queued = pending.enqueue(1, entry, delta=1, base=4, path=path)
+
+    assert queued["delta"] == 2
+    assert queued["base"] == 3
+    assert pending.payload(queued) == {
+        "num_watched_episodes": 5,
+        "media_type": "anime",
+    }
+
+
+def test_fields_are_last_write_wins(tmp_path):
+    path = tmp_path / "pending.json"
+    pending.enqueue(1, {"score": 7, "media_type": "manga"}, path=path)
+    pending.enqueue(1, {"score": 9, "media_type": "manga"}, path=path)
+    pending.enqueue(2, {"status": "dropped", "media_type": "manga"}, path=path)
+
+    queue = pending.load(path)
+    assert sorted(queue) == ["manga:1", "manga:2"]
+    assert queue["manga:1"]["fields"] == {"score": 9}
+
+
+def test_absolute_progress_replaces_increments(tmp_path):
+    path = tmp_path / "pending.json"
+    entry = {"num_chapters_read": 11, "media_type": "manga"}
+    pending.enqueue(1, entry, delta=1, base=10, path=path)
+    entry = {"num_chapters_read": 20, "media_type": "manga"}
+    queued = pending.enqueue(1, entry, path=path)
+
+    assert queued["delta"] == 0
+    assert pending.payload(queued)["num_chapters_read"] == 20
+
+
+def test_new_change_is_untried(tmp_path):
+    path = tmp_path / "pending.json"
+    assert not pending.untried(path)
+    pending.enqueue(1, {"score": 7, "media_type": "anime"}, path=path)
+    assert pending.untried(path)
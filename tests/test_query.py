@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+# 3rd party
+import pytest
+
+# self-package
+from malpy3 import query
+
+ENTRIES = [
+    {
+        "id": 1,
+        "title": "Cowboy Bebop",
+        "status": "completed",
+        "score": 9,
+        "episode": 26,
+        "start_date": "1998-04-03",
+        "tags": ["space", "jazz"],
+    },
+    {
+        "id": 2,
+        "title": "Naruto",
+        "status": "dropped",
+        "score": 5,
+        "episode": 30,
+        "start_date": "2002-10-03",
+        "tags": [],
+    },
+    {
+        "id": 3,
+        "title": "Frieren",
+        "status": "watching",
+        "score": 0,
+        "episode": 10,
+        "start_date": "NA",
+        "tags": ["fantasy"],
+    },
+]
+
+
+def ids(text, entries=ENTRIES, **kwargs):
+    return [e["id"] for e in query.Query(text, **kwargs).filter(entries)]
+
+
+def test_tokenize():
+    assert query.tokenize('score>=8 and title:"a b"') == [
+        ("word", "score"),
+        ("op", ">="),
+        ("word", "8"),
+        ("word", "and"),
+        ("word", "title"),
+        ("op", ":"),
+        ("value", "a b"),
+    ]
+
+
+def test_comparisons_and_keywords():
+    assert ids("score>=8") == [1]
+    assert ids("score>=5 and not status=dropped") == [1]
+    assert ids("(status=dropped or tag:fantasy) and episode<20") == [3]
+    assert ids("title~'^n'") == [2]
+    assert ids("") == [1, 2, 3]
+
+
+def test_dates_compare_on_the_given_precision():
+    assert ids("start_date>=2000") == [2]
+    assert ids("start_date<1998-05") == [1]
+    entries = [dict(ENTRIES[0], start_date="03/04/1998")]
+    assert ids("start_date=1998-04", entries, date_format="%d/%m/%Y") == [1]
+
+
+@pytest.mark.parametrize("text", ["score>=", "(score=1", "score=1 )"])
+def test_errors(text):
+    with pytest.raises(query.QueryError):
+        query.Query(text)
+
+
+def test_sort_key_puts_missing_values_last():
+    key, reverse = query.sort_key("-score")
+    entries = ENTRIES + [{"id": 4, "title": "Unscored"}]
+    result = sorted(entries, key=key, reverse=reverse)
+    assert [e["id"] for e in result] == [1, 2, 3, 4]
+
+    key, reverse = query.sort_key("start_date")
+    result = sorted(ENTRIES, key=key, reverse=reverse)
+    assert [e["id"] for e in result] == [1, 2, 3]
+
+
+def test_sort_key_reads_the_date_format():
+    entries = [
+        {"id": 1, "start_date": "01/02/2020"},
+        {"id": 2, "start_date": "31/01/2019"},
+    ]
+    key, reverse = query.sort_key("start_date", date_format="%d/%m/%Y")
+    assert [e["id"] for e in sorted(entries, key=key)] == [2, 1]
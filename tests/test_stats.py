@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+
+# 3rd party
+import pytest
+
+# self-package
+from malpy3 import stats
+
+ENTRIES = [
+    {
+        "id": 1,
+        "status": "completed",
+        "score": 8,
+        "episode": 12,
+        "total_episodes": 12,
+        "start_date": "2020-01-05",
+    },
+    {
+        "id": 2,
+        "status": "dropped",
+        "score": 4,
+        "episode": 3,
+        "total_episodes": 24,
+        "start_date": "NA",
+    },
+    {"id": 3, "status": "watching", "score": 0, "episode": 5},
+]
+
+
+def compute(entries=ENTRIES, **kwargs):
+    columns = stats.Columns.from_entries(entries, use_details=False, **kwargs)
+    return stats.compute(columns)
+
+
+def test_compute():
+    result = compute()
+    assert result["entries"] == 3
+    assert result["scored"] == 2
+    assert result["mean_score"] == 6
+    assert result["score_distribution"][8] == 1
+    assert result["statuses"]["completed"] == {"entries": 1, "progress": 12}
+    assert result["progress"] == 20
+    assert result["completion_rate"] == 0.5
+    assert result["minutes"] == 20 * stats.DEFAULT_EPISODE_MINUTES
+    assert result["days"] == pytest.approx(result["minutes"] / 1440)
+    assert result["years"] == {2020: 1}
+
+
+def test_compute_empty_list():
+    result = compute([])
+    assert result["entries"] == 0
+    assert result["mean_score"] == 0.0
+    assert result["completion_rate"] == 0.0
+
+
+def test_years_in_the_configured_date_format():
+    entries = [dict(ENTRIES[0], start_date="05/01/2020")]
+    assert compute(entries, date_format="%d/%m/%Y")["years"] == {2020: 1}